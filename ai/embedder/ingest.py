@@ -63,6 +63,12 @@ def init_schema(cur):
 
     CREATE INDEX IF NOT EXISTS idx_chunks_vec
       ON chunks USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+
+    -- Metadata predicates used by filtered search in the orchestrator
+    CREATE INDEX IF NOT EXISTS idx_chunks_source
+      ON chunks ((meta->>'source'));
+    CREATE INDEX IF NOT EXISTS idx_chunks_uri
+      ON chunks (uri text_pattern_ops);
     """)
 
 def load_files() -> List[Tuple[str,str,str]]:
@@ -78,13 +84,30 @@ def load_files() -> List[Tuple[str,str,str]]:
                     continue
     return files
 
-def main():
-    emb = TextEmbedding(model_name=MODEL_ID)
-    splitter = RecursiveCharacterTextSplitter(
+def make_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
         chunk_size=2000, chunk_overlap=300,
         separators=["\n\n","```","###","##","\n","."," "]
     )
 
+def chunk_rows(emb, splitter, doc_id: str, source: str, uri: str, raw: str) -> List[tuple]:
+    """Split one document and embed its chunks -> rows for the chunks table."""
+    chunks = splitter.split_text(raw)
+    if not chunks:
+        return []
+    vecs = list(emb.embed(chunks))
+    rows = []
+    meta = json.dumps({"source": source})
+    for i, (ch, vec) in enumerate(zip(chunks, vecs)):
+        vec_py = [float(x) for x in vec]  # cast to plain floats
+        chunk_id = f"{doc_id}_{i:04d}"
+        rows.append((doc_id, chunk_id, ch, vec_py, uri, meta))
+    return rows
+
+def main():
+    emb = TextEmbedding(model_name=MODEL_ID)
+    splitter = make_splitter()
+
     conn = connect()
     cur  = conn.cursor()
     init_schema(cur)
@@ -101,19 +124,11 @@ def main():
             (doc_id, source, uri)
         )
 
-        chunks = splitter.split_text(raw)
-        if not chunks:
+        rows = chunk_rows(emb, splitter, doc_id, source, uri, raw)
+        if not rows:
             print(f"[INGEST] {uri}: 0 chunks")
             continue
 
-        vecs = list(emb.embed(chunks))
-        rows = []
-        for i, (ch, vec) in enumerate(zip(chunks, vecs)):
-            vec_py = [float(x) for x in vec]  # cast to plain floats
-            chunk_id = f"{doc_id}_{i:04d}"
-            meta = json.dumps({"source": source})
-            rows.append((doc_id, chunk_id, ch, vec_py, uri, meta))
-
         execute_values(
             cur,
             "INSERT INTO chunks(doc_id,chunk_id,text,embedding,uri,meta) "
@@ -121,11 +136,18 @@ def main():
             rows
         )
         conn.commit()
-        print(f"[INGEST] {uri}: {len(chunks)} chunks")
+        print(f"[INGEST] {uri}: {len(rows)} chunks")
 
     cur.close()
     conn.close()
     print("[INGEST] complete")
 
 if __name__ == "__main__":
-    main()
+    # INGEST_PROFILE=/path/ingest.prof: cProfile the whole run (snakeviz, pstats)
+    profile_out = os.environ.get("INGEST_PROFILE")
+    if profile_out:
+        import cProfile
+        cProfile.run("main()", profile_out)
+        print(f"[INGEST] profile written to {profile_out}")
+    else:
+        main()
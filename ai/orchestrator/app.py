@@ -1,13 +1,27 @@
-import os
-from typing import List, Dict, Any
-from fastapi import FastAPI, Body
+import os, re, json, math, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from fastapi import FastAPI, Body, Query
 from pydantic import BaseModel
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 from psycopg2.extras import RealDictCursor
 from pgvector.psycopg2 import register_vector
 from fastembed import TextEmbedding
 
+from filters import POSTFILTER_OVERFETCH, build_filter, choose_plan
+from metrics import SIZE_BUCKETS, counter, histogram, instrument, timed
+from profiling import enable_profiling
+from tracing import annotate, setup_tracing, span
+
 TOPK = int(os.environ.get("RAG_TOPK","5"))
+POOL_MAX = int(os.environ.get("PG_POOL_MAX","8"))
+EVAL_CONCURRENCY = int(os.environ.get("EVAL_CONCURRENCY","8"))
+EVAL_DIR = Path(os.environ.get("EVAL_DIR","/app/logs/eval"))
+# run tags become part of the file name
+EVAL_TAG_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
 
 PG = dict(
     host=os.environ.get("POSTGRES_HOST","ai_pgvector"),
@@ -18,7 +32,17 @@ PG = dict(
 )
 
 app = FastAPI(title="AIOps RAG Orchestrator", version="1.0")
+instrument(app, "ai-orchestrator")
+setup_tracing("ai-orchestrator", app)
+enable_profiling(app)
 _emb = None
+_pool: Optional[ThreadedConnectionPool] = None
+
+EMBEDDED = counter("orchestrator_embeddings_total", "Texts embedded")
+EMBED_SECONDS = histogram("orchestrator_embed_seconds", "Embedding time per batch")
+EMBED_BATCH = histogram("orchestrator_embed_batch_size", "Texts per embedding batch", buckets=SIZE_BUCKETS)
+SEARCH_SECONDS = histogram("orchestrator_search_seconds", "pgvector search time")
+DB_WAIT = histogram("orchestrator_db_conn_wait_seconds", "Time to obtain a DB connection", ["source"])
 
 def emb():
     global _emb
@@ -26,30 +50,105 @@ def emb():
         _emb = TextEmbedding(model_name="BAAI/bge-small-en-v1.5")
     return _emb
 
+def embed(texts: List[str]) -> list:
+    EMBED_BATCH.observe(len(texts))
+    with timed(EMBED_SECONDS), span("embed", texts=len(texts)):
+        vecs = list(emb().embed(texts))
+    EMBEDDED.inc(len(texts))
+    return vecs
+
 def connect():
-    conn = psycopg2.connect(**PG)
+    with timed(DB_WAIT, "connect"), span("db.connect", kind="client"):
+        conn = psycopg2.connect(**PG)
     register_vector(conn)
     return conn
 
-def search(conn, query: str, k: int) -> List[Dict[str,Any]]:
+def pool() -> ThreadedConnectionPool:
+    global _pool
+    if _pool is None:
+        _pool = ThreadedConnectionPool(1, max(1, POOL_MAX), **PG)
+    return _pool
+
+@app.on_event("shutdown")
+def close_pool():
+    if _pool is not None:
+        _pool.closeall()
+
+def vec_literal(qvec) -> str:
     # Build pgvector literal string and cast in SQL
-    qvec = list(emb().embed([query]))[0]
-    vec_str = "[" + ",".join(f"{float(x):.6f}" for x in qvec) + "]"
+    return "[" + ",".join(f"{float(x):.6f}" for x in qvec) + "]"
+
+# --- Filtered search (filters.py picks the plan) ------------------------------
+
+def search_vec(conn, qvec, k: int, sources: Optional[List[str]] = None,
+               uri_prefix: Optional[str] = None) -> List[Dict[str,Any]]:
+    k = max(1, k)
+    where, fparams = build_filter(sources, uri_prefix)
+    v = vec_literal(qvec)
+    plan = choose_plan(conn, where, fparams)
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("""
-            WITH q AS (SELECT %s::vector AS v)
+        if plan == "ann":
+            annotate(plan="ann")
+            cur.execute("""
+                WITH q AS (SELECT %s::vector AS v)
+                SELECT doc_id, text, uri, meta,
+                       1.0 - (embedding <=> q.v) AS score
+                FROM chunks, q
+                ORDER BY embedding <=> q.v
+                LIMIT %s
+            """, (v, k))
+            return [dict(r) for r in cur.fetchall()]
+
+        if plan == "postfilter":
+            # post-filter: ANN over-fetch, then apply the predicate
+            annotate(plan="postfilter")
+            cur.execute(f"""
+                WITH q AS (SELECT %s::vector AS v),
+                c AS MATERIALIZED (
+                    SELECT doc_id, text, uri, meta, embedding <=> q.v AS dist
+                    FROM chunks, q
+                    ORDER BY embedding <=> q.v
+                    LIMIT %s
+                )
+                SELECT doc_id, text, uri, meta, 1.0 - dist AS score
+                FROM c
+                WHERE {where}
+                ORDER BY dist
+                LIMIT %s
+            """, [v, k * max(1, POSTFILTER_OVERFETCH)] + fparams + [k])
+            rows = cur.fetchall()
+            if len(rows) >= k:
+                return [dict(r) for r in rows]
+
+        # pre-filter: exact ranking over the (indexed) matching subset
+        annotate(plan="prefilter")
+        cur.execute(f"""
+            WITH q AS (SELECT %s::vector AS v),
+            f AS MATERIALIZED (
+                SELECT doc_id, text, uri, meta, embedding
+                FROM chunks
+                WHERE {where}
+            )
             SELECT doc_id, text, uri, meta,
                    1.0 - (embedding <=> q.v) AS score
-            FROM chunks, q
+            FROM f, q
             ORDER BY embedding <=> q.v
             LIMIT %s
-        """, (vec_str, max(1, k)))
+        """, [v] + fparams + [k])
         rows = cur.fetchall()
     return [dict(r) for r in rows]
 
+def search(conn, query: str, k: int, sources: Optional[List[str]] = None,
+           uri_prefix: Optional[str] = None) -> List[Dict[str,Any]]:
+    qvec = embed([query])[0]
+    with timed(SEARCH_SECONDS), span("db.search", kind="client", k=k, filtered=bool(sources or uri_prefix)):
+        return search_vec(conn, qvec, k, sources, uri_prefix)
+
 class QueryReq(BaseModel):
     q: str
     k: int = 5
+    source: Optional[List[str]] = None   # e.g. ["runbooks"], ["grafana_json","onos_logs"]
+    uri_prefix: Optional[str] = None     # e.g. "runbooks/"
 
 @app.get("/health")
 def health():
@@ -60,29 +159,152 @@ def query(req: QueryReq):
     k = max(1, min(req.k, TOPK))
     conn = connect()
     try:
-        hits = search(conn, req.q, k)
+        hits = search(conn, req.q, k, req.source, req.uri_prefix)
         return {"ok": True, "hits": hits}
     finally:
         conn.close()
 
+# --- Retrieval evaluation ---------------------------------------------------
+
 class EvalItem(BaseModel):
     q: str
     expect_uris: List[str]
+    source: Optional[List[str]] = None
+    uri_prefix: Optional[str] = None
 
-@app.post("/eval")
-def eval(items: List[EvalItem] = Body(...)):
-    conn = connect()
+def _uris_ranked(hits: List[Dict[str,Any]]) -> List[str]:
+    # Several chunks of one document can be returned; rank each uri once.
+    seen, out = set(), []
+    for h in hits:
+        u = h["uri"]
+        if u not in seen:
+            seen.add(u)
+            out.append(u)
+    return out
+
+def score_ranking(uris: List[str], expect: List[str], k: int) -> Dict[str,float]:
+    """recall@k, reciprocal rank and nDCG@k for one query (binary relevance)."""
+    relevant = set(expect)
+    top = uris[:k]
+    hits = [1 if u in relevant else 0 for u in top]
+    recall = (sum(hits) / len(relevant)) if relevant else 0.0
+    rr = 0.0
+    for i, h in enumerate(hits):
+        if h:
+            rr = 1.0 / (i + 1)
+            break
+    dcg = sum(h / math.log2(i + 2) for i, h in enumerate(hits))
+    idcg = sum(1.0 / math.log2(i + 2) for i in range(min(len(relevant), k)))
+    ndcg = (dcg / idcg) if idcg else 0.0
+    return {"hit": float(any(hits)), "recall": recall, "rr": rr, "ndcg": ndcg}
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    idx = min(len(s) - 1, max(0, int(math.ceil(p / 100.0 * len(s))) - 1))
+    return s[idx]
+
+def _timed_search(qvec, k: int, it: EvalItem):
+    p = pool()
+    with timed(DB_WAIT, "pool"):
+        conn = p.getconn()
     try:
-        total = len(items)
-        found = 0
-        details = []
-        for it in items:
-            hits = search(conn, it.q, TOPK)
-            uri_list = [h["uri"] for h in hits]
-            ok = any(u in uri_list for u in it.expect_uris)
-            if ok: found += 1
-            details.append({"q": it.q, "ok": ok, "uris": uri_list})
-        acc = (found / total) if total else 0.0
-        return {"ok": True, "n": total, "acc": acc, "details": details}
+        t0 = time.perf_counter()
+        hits = search_vec(conn, qvec, k, it.source, it.uri_prefix)
+        elapsed = time.perf_counter() - t0
+        SEARCH_SECONDS.observe(elapsed)
+        return hits, elapsed * 1000.0
     finally:
-        conn.close()
+        p.putconn(conn)
+
+def save_eval_run(result: Dict[str,Any], tag: Optional[str]) -> str:
+    if tag is not None and not re.match(EVAL_TAG_PATTERN, tag):
+        raise ValueError(f"invalid eval tag {tag!r}")
+    EVAL_DIR.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    name = f"{ts}_{tag}.json" if tag else f"{ts}.json"
+    path = EVAL_DIR / name
+    path.write_text(json.dumps(result, default=str))
+    return str(path)
+
+@app.post("/eval")
+def eval(
+    items: List[EvalItem] = Body(...),
+    k: int = Query(TOPK, ge=1),
+    concurrency: int = Query(EVAL_CONCURRENCY, ge=1),
+    tag: Optional[str] = Query(None, pattern=EVAL_TAG_PATTERN,
+                               description="label stored with the saved run (letters, digits, _ and -)"),
+    save: bool = Query(True),
+    details: bool = Query(True),
+):
+    """
+    Embed every question in one batch, run the searches concurrently over the
+    connection pool and report recall@k, MRR, nDCG@k and latency percentiles.
+    """
+    total = len(items)
+    if not total:
+        return {"ok": True, "n": 0, "acc": 0.0, "metrics": {}, "details": []}
+
+    t0 = time.perf_counter()
+    qvecs = embed([it.q for it in items])
+    embed_ms = (time.perf_counter() - t0) * 1000.0
+
+    t1 = time.perf_counter()
+    workers = max(1, min(concurrency, POOL_MAX, total))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        results = list(ex.map(lambda v, it: _timed_search(v, k, it), qvecs, items))
+    search_ms = (time.perf_counter() - t1) * 1000.0
+
+    sums = {"hit": 0.0, "recall": 0.0, "rr": 0.0, "ndcg": 0.0}
+    lat: List[float] = []
+    rows = []
+    for it, (hits, ms) in zip(items, results):
+        uris = _uris_ranked(hits)
+        m = score_ranking(uris, it.expect_uris, k)
+        for key in sums:
+            sums[key] += m[key]
+        lat.append(ms)
+        rows.append({"q": it.q, "ok": bool(m["hit"]), "uris": uris[:k],
+                     "recall": m["recall"], "rr": m["rr"], "ndcg": m["ndcg"],
+                     "latency_ms": round(ms, 3)})
+
+    metrics = {
+        "k": k,
+        f"recall@{k}": sums["recall"] / total,
+        "mrr": sums["rr"] / total,
+        f"ndcg@{k}": sums["ndcg"] / total,
+        "latency_ms": {
+            "p50": percentile(lat, 50),
+            "p95": percentile(lat, 95),
+            "p99": percentile(lat, 99),
+            "max": max(lat),
+        },
+        "embed_ms": embed_ms,
+        "search_ms": search_ms,
+        "total_ms": (time.perf_counter() - t0) * 1000.0,
+        "concurrency": workers,
+    }
+    result: Dict[str,Any] = {"ok": True, "n": total, "acc": sums["hit"] / total,
+                             "metrics": metrics}
+    if save:
+        result["saved_to"] = save_eval_run(
+            {**result, "tag": tag, "details": rows}, tag)
+    if details:
+        result["details"] = rows
+    return result
+
+@app.get("/eval/runs")
+def eval_runs(limit: int = Query(20, ge=1)):
+    """List saved evaluation runs (newest first) for side-by-side comparison."""
+    if not EVAL_DIR.exists():
+        return {"ok": True, "runs": []}
+    runs = []
+    for p in sorted(EVAL_DIR.glob("*.json"), reverse=True)[:limit]:
+        try:
+            data = json.loads(p.read_text())
+        except Exception:
+            continue
+        runs.append({"file": p.name, "tag": data.get("tag"), "n": data.get("n"),
+                     "acc": data.get("acc"), "metrics": data.get("metrics")})
+    return {"ok": True, "runs": runs}
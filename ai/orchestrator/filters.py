@@ -0,0 +1,64 @@
+"""
+Metadata filters for vector search.
+
+Filters narrow the candidate set by meta->>'source' and/or uri prefix.
+Selective filters are applied first (exact distance over the indexed subset);
+broad ones run the ANN scan with an over-fetch and filter afterwards.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from tracing import span
+
+PREFILTER_MAX_ROWS = int(os.environ.get("PREFILTER_MAX_ROWS","20000"))
+POSTFILTER_OVERFETCH = int(os.environ.get("POSTFILTER_OVERFETCH","10"))
+FILTER_COUNT_TTL = float(os.environ.get("FILTER_COUNT_TTL","300"))
+FILTER_COUNT_MAX = int(os.environ.get("FILTER_COUNT_MAX","1024"))
+
+# filter key -> (row count, monotonic time); LRU, bounded by FILTER_COUNT_MAX
+_filter_counts: "OrderedDict[tuple, tuple]" = OrderedDict()
+_filter_lock = threading.Lock()  # /eval searches from several threads
+
+def build_filter(sources: Optional[List[str]], uri_prefix: Optional[str]):
+    clauses, params = [], []
+    if sources:
+        clauses.append("meta->>'source' = ANY(%s)")
+        params.append(list(sources))
+    if uri_prefix:
+        esc = uri_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append("uri LIKE %s")
+        params.append(esc + "%")
+    return " AND ".join(clauses), params
+
+def filter_rows(conn, where: str, params: list) -> int:
+    """Row count behind a filter, cached briefly (served by the btree indexes)."""
+    key = (where, tuple(tuple(p) if isinstance(p, list) else p for p in params))
+    now = time.monotonic()
+    with _filter_lock:
+        hit = _filter_counts.get(key)
+        if hit and now - hit[1] < FILTER_COUNT_TTL:
+            _filter_counts.move_to_end(key)
+            return hit[0]
+    with conn.cursor() as cur, span("db.filter_count", kind="client"):
+        cur.execute(f"SELECT count(*) FROM chunks WHERE {where}", params)
+        n = int(cur.fetchone()[0])
+    with _filter_lock:
+        _filter_counts[key] = (n, now)
+        _filter_counts.move_to_end(key)
+        while len(_filter_counts) > FILTER_COUNT_MAX:
+            _filter_counts.popitem(last=False)
+    return n
+
+def choose_plan(conn, where: str, params: list) -> str:
+    """
+    "ann" without a filter, "postfilter" when more than PREFILTER_MAX_ROWS
+    rows match, else "prefilter". search_vec still pre-filters when the
+    post-filter comes up short.
+    """
+    if not where:
+        return "ann"
+    return "postfilter" if filter_rows(conn, where, params) > PREFILTER_MAX_ROWS else "prefilter"
+
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+
+import pytest
+
+import filters
+from filters import build_filter, choose_plan, filter_rows
+
+
+class FakeConn:
+    """Answers the count(*) query with `rows` and records what ran."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.queries.append((sql, params))
+
+    def fetchone(self):
+        return (self.rows,)
+
+
+@pytest.fixture(autouse=True)
+def fresh_counts(monkeypatch):
+    monkeypatch.setattr(filters, "_filter_counts", OrderedDict())
+
+
+# --- build_filter ---------------------------------------------------------------
+
+def test_no_filter_is_empty():
+    assert build_filter(None, None) == ("", [])
+    assert build_filter([], "") == ("", [])
+
+
+def test_sources_and_prefix_are_parameters():
+    where, params = build_filter(["runbooks", "onos_logs"], "runbooks/")
+    assert where == "meta->>'source' = ANY(%s) AND uri LIKE %s"
+    assert params == [["runbooks", "onos_logs"], "runbooks/%"]
+
+
+def test_prefix_wildcards_are_escaped():
+    _, params = build_filter(None, "a_b%c\\d")
+    assert params == ["a\\_b\\%c\\\\d%"]
+
+
+# --- plan choice ----------------------------------------------------------------
+
+def test_no_filter_runs_ann_without_counting():
+    conn = FakeConn(rows=10**6)
+    assert choose_plan(conn, "", []) == "ann"
+    assert conn.queries == []
+
+
+@pytest.mark.parametrize("rows, plan", [(99, "prefilter"), (100, "prefilter"), (101, "postfilter")])
+def test_plan_switches_above_prefilter_max_rows(monkeypatch, rows, plan):
+    monkeypatch.setattr(filters, "PREFILTER_MAX_ROWS", 100)
+    where, params = build_filter(["runbooks"], None)
+    conn = FakeConn(rows)
+    assert choose_plan(conn, where, params) == plan
+    assert conn.queries == [(f"SELECT count(*) FROM chunks WHERE {where}", params)]
+
+
+def test_counts_are_cached_per_filter():
+    where, params = build_filter(["runbooks"], None)
+    conn = FakeConn(rows=5)
+    assert filter_rows(conn, where, params) == 5
+    conn.rows = 50
+    assert filter_rows(conn, where, params) == 5
+    other, oparams = build_filter(["onos_logs"], None)
+    assert filter_rows(conn, other, oparams) == 50
+    assert len(conn.queries) == 2
+
+
+def test_expired_counts_are_queried_again(monkeypatch):
+    monkeypatch.setattr(filters, "FILTER_COUNT_TTL", 0)
+    where, params = build_filter(["runbooks"], None)
+    conn = FakeConn(rows=5)
+    filter_rows(conn, where, params)
+    filter_rows(conn, where, params)
+    assert len(conn.queries) == 2
+
+
+def test_count_cache_is_bounded_lru(monkeypatch):
+    monkeypatch.setattr(filters, "FILTER_COUNT_MAX", 2)
+    conn = FakeConn(rows=1)
+    keys = [build_filter([s], None) for s in ("a", "b", "c")]
+    filter_rows(conn, *keys[0])
+    filter_rows(conn, *keys[1])
+    filter_rows(conn, *keys[0])  # a is now most recent
+    filter_rows(conn, *keys[2])  # evicts b
+    assert len(filters._filter_counts) == 2
+    filter_rows(conn, *keys[0])
+    assert len(conn.queries) == 3
+    filter_rows(conn, *keys[1])
+    assert len(conn.queries) == 4
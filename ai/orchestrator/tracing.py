@@ -0,0 +1,192 @@
+"""
+Distributed tracing (OpenTelemetry) shared by the AIOps services and the Rasa
+action server.
+
+Each service builds from its own directory, so this file is copied verbatim
+into every service; aiops_shared_modules_check.sh fails if the copies drift.
+
+    from tracing import annotate, setup_tracing, span, trace_hooks
+
+    setup_tracing("aiops-ml-gateway", app)       # server span per request, continuing the caller's trace
+    client = httpx.AsyncClient(event_hooks=trace_hooks())   # traceparent on every outgoing call
+    with span("rag.retrieve", top_k=3):
+        ...
+    annotate(cache_hit=True)                     # attributes on the current span
+
+Configuration (environment):
+    TRACE_EXPORTER       none (default) | otlp | file | console
+                         otlp posts to OTEL_EXPORTER_OTLP_ENDPOINT
+                         (default http://localhost:4318, OTLP/HTTP)
+    TRACE_FILE           JSON-lines file for the file exporter
+                         (default /tmp/traces-<service>.jsonl)
+    TRACE_SAMPLE_RATIO   share of new traces that are recorded (default 1.0).
+                         Only the edge (the action server) decides; every
+                         downstream hop follows the caller's decision, so a
+                         trace is either complete or not recorded at all.
+                         Unsampled spans are not timed or exported, which is
+                         the low-overhead mode (e.g. 0.01 in production).
+
+opentelemetry-api/-sdk are optional. Without the SDK (or with
+TRACE_EXPORTER=none) nothing is recorded but an incoming traceparent is still
+passed on to the next hop; without the API every helper is a no-op.
+"""
+import os
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    from opentelemetry import propagate, trace
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:  # optional: no tracing at all
+    trace = None
+
+# health checks and scrapes would only add noise
+UNTRACED_PATHS = {"/health", "/metrics"}
+
+_tracer: Any = None
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _attrs(attrs: Dict[str, Any]) -> Dict[str, Any]:
+    # OpenTelemetry only accepts primitives (and lists of them); drop None
+    out = {}
+    for k, v in attrs.items():
+        if v is None:
+            continue
+        out[k] = v if isinstance(v, (bool, int, float, str)) else str(v)
+    return out
+
+
+def _exporter(kind: str, service: str) -> Any:
+    if kind == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+    if kind == "file":
+        path = os.getenv("TRACE_FILE", f"/tmp/traces-{service}.jsonl")
+        out = open(path, "a", buffering=1, encoding="utf-8")
+        return ConsoleSpanExporter(out=out, formatter=lambda s: s.to_json(indent=None) + "\n")
+    return ConsoleSpanExporter()
+
+
+def setup_tracing(service: str, app: Any = None) -> None:
+    """Configure the tracer for `service`; with `app`, also trace every request it serves."""
+    global _tracer
+    if trace is None:
+        return
+    kind = os.getenv("TRACE_EXPORTER", "none").strip().lower()
+    if kind not in ("", "none"):
+        try:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+            ratio = float(os.getenv("TRACE_SAMPLE_RATIO", "1.0"))
+            provider = TracerProvider(
+                resource=Resource.create({"service.name": service}),
+                sampler=ParentBased(TraceIdRatioBased(ratio)),
+            )
+            # batched export off the request path
+            provider.add_span_processor(BatchSpanProcessor(_exporter(kind, service)))
+            trace.set_tracer_provider(provider)
+        except ImportError as e:
+            print(f"tracing: TRACE_EXPORTER={kind} but {e.name} is not installed; spans are not exported")
+    _tracer = trace.get_tracer(service)
+    if app is not None:
+        # newer FastAPI releases emit their own server spans once an SDK is
+        # configured; keep one server span per request on every version
+        native = getattr(app, "_telemetry", None)
+        if isinstance(native, dict):
+            native["tracing"] = False
+        app.add_middleware(_TraceMiddleware)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attrs: Any) -> Iterator[Any]:
+    """Child span of the current one for the duration of the block (exceptions are recorded)."""
+    if _tracer is None:
+        yield _NOOP_SPAN
+        return
+    with _tracer.start_as_current_span(name, kind=getattr(SpanKind, kind.upper()),
+                                       attributes=_attrs(attrs)) as s:
+        yield s
+
+
+def annotate(**attrs: Any) -> None:
+    """Set attributes on the current span (no-op when not recording)."""
+    if trace is not None:
+        trace.get_current_span().set_attributes(_attrs(attrs))
+
+
+def trace_id() -> Optional[str]:
+    """Hex id of the current trace, if any (for logs and error replies)."""
+    if trace is None:
+        return None
+    ctx = trace.get_current_span().get_span_context()
+    return format(ctx.trace_id, "032x") if ctx.is_valid else None
+
+
+async def _inject(request: Any) -> None:
+    propagate.inject(request.headers)
+
+
+def trace_hooks() -> Dict[str, List[Callable[..., Any]]]:
+    """event_hooks for an httpx.AsyncClient that send the current trace context along."""
+    return {"request": [_inject]} if trace is not None else {}
+
+
+class _TraceMiddleware:
+    """
+    Pure ASGI middleware: one SERVER span per request, parented on the
+    caller's traceparent and named after the route template once routing is
+    done. The trace id is returned in an X-Trace-Id response header.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or scope.get("path") in UNTRACED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers") or ()}
+        method = scope.get("method", "GET")
+        status = {"code": 500}
+
+        with _tracer.start_as_current_span(
+            f"{method} {scope.get('path')}", context=propagate.extract(carrier), kind=SpanKind.SERVER,
+        ) as s:
+            ctx = s.get_span_context()
+
+            async def send_wrapper(message: Dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    status["code"] = message["status"]
+                    if ctx.is_valid:
+                        headers = list(message.get("headers") or [])
+                        headers.append((b"x-trace-id", format(ctx.trace_id, "032x").encode()))
+                        message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    s.update_name(f"{method} {route}")
+                    s.set_attribute("http.route", route)
+                s.set_attribute("http.request.method", method)
+                s.set_attribute("http.response.status_code", status["code"])
+                if status["code"] >= 500:
+                    s.set_status(Status(StatusCode.ERROR))
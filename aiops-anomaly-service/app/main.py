@@ -1,16 +1,29 @@
 import os
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 import joblib
 import numpy as np
 from sklearn.ensemble import IsolationForest
 
+from metrics import SIZE_BUCKETS, counter, histogram, instrument, timed
+from profiling import enable_profiling
+from tracing import setup_tracing, span
+
 app = FastAPI(title="AIOps Anomaly Service (Scikit-learn)")
+instrument(app, "aiops-anomaly-service")
+setup_tracing("aiops-anomaly-service", app)
+enable_profiling(app)
+
+SCORE_BATCH_SIZE = histogram("anomaly_score_batch_size", "Items per scoring call", buckets=SIZE_BUCKETS)
+SCORE_SECONDS = histogram("anomaly_model_score_seconds", "IsolationForest decision_function time per batch")
+SCORED = counter("anomaly_scored_total", "Items scored", ["method", "risk_label"])
 
 MODEL_PATH = os.getenv("MODEL_PATH", "/app/models/anomaly_model.joblib")
+# must be at least the gateway's ANOMALY_BATCH_MAX
+BATCH_MAX = int(os.getenv("ANOMALY_BATCH_MAX", "500"))
 _model: Optional[IsolationForest] = None
 
 
@@ -22,6 +35,10 @@ class ScorePayload(BaseModel):
     value: Optional[float] = None  # numeric metric value (e.g., CPU %)
 
 
+class ScoreBatchPayload(BaseModel):
+    items: List[ScorePayload] = Field(..., max_length=BATCH_MAX)
+
+
 @app.on_event("startup")
 def load_model_on_startup():
     global _model
@@ -89,53 +106,77 @@ def heuristic_risk(device: str, metric: str) -> (float, str, str):
     return base_score, label, note
 
 
-@app.post("/score")
-async def score(payload: ScorePayload):
+def risk_label(score: float) -> str:
+    if score >= 0.8:
+        return "high"
+    if score >= 0.5:
+        return "medium"
+    return "low"
+
+
+def score_items(items: List[ScorePayload]) -> List[Dict[str, Any]]:
     """
-    Risk scoring:
-    - If a trained model exists AND value is provided -> use IsolationForest.
-    - Otherwise -> use the original heuristic based on device name.
+    Risk scoring for a batch:
+    - items with a numeric value (and a trained model) are scored together in
+      one IsolationForest.decision_function call;
+    - the rest use the original heuristic based on device name.
     """
-    global _model
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    SCORE_BATCH_SIZE.observe(len(items))
 
     # Case 1: model + numeric value available
-    if _model is not None and payload.value is not None:
-        X = np.array([[payload.value]], dtype=float)
+    ml_idx = [i for i, it in enumerate(items) if it.value is not None]
+    if _model is not None and ml_idx:
+        X = np.array([[items[i].value] for i in ml_idx], dtype=float)
 
         # IsolationForest: smaller (more negative) score = more anomalous
-        raw_score = _model.decision_function(X)[0]
+        with timed(SCORE_SECONDS), span("anomaly.model_score", items=len(ml_idx)):
+            raw = _model.decision_function(X)
         # Map to a 0..1 anomaly score (inverted: 1 = most risky)
-        anomaly_score = float(1.0 - (raw_score + 1.0) / 2.0)
-        anomaly_score = max(0.0, min(1.0, anomaly_score))
-
-        if anomaly_score >= 0.8:
-            label = "high"
-        elif anomaly_score >= 0.5:
-            label = "medium"
-        else:
-            label = "low"
-
-        note = "[ANOMALY-ML] Scored using IsolationForest on metric value."
-
-        return {
-            "device": payload.device,
-            "metric": payload.metric,
-            "time_window": payload.time_window,
-            "value": payload.value,
-            "risk_score": anomaly_score,
+        scores = np.clip(1.0 - (raw + 1.0) / 2.0, 0.0, 1.0)
+
+        for i, sc in zip(ml_idx, scores):
+            it = items[i]
+            results[i] = {
+                "device": it.device,
+                "metric": it.metric,
+                "time_window": it.time_window,
+                "value": it.value,
+                "risk_score": float(sc),
+                "risk_label": risk_label(float(sc)),
+                "note": "[ANOMALY-ML] Scored using IsolationForest on metric value.",
+            }
+            SCORED.labels("model", results[i]["risk_label"]).inc()
+
+    # Case 2: fallback to heuristic
+    for i, it in enumerate(items):
+        if results[i] is not None:
+            continue
+        base_score, label, note = heuristic_risk(it.device, it.metric)
+        results[i] = {
+            "device": it.device,
+            "metric": it.metric,
+            "time_window": it.time_window,
+            "value": it.value,
+            "risk_score": base_score,
             "risk_label": label,
             "note": note,
         }
+        SCORED.labels("heuristic", label).inc()
+    return results
 
-    # Case 2: fallback to heuristic
-    base_score, label, note = heuristic_risk(payload.device, payload.metric)
 
-    return {
-        "device": payload.device,
-        "metric": payload.metric,
-        "time_window": payload.time_window,
-        "value": payload.value,
-        "risk_score": base_score,
-        "risk_label": label,
-        "note": note,
-    }
+@app.post("/score")
+async def score(payload: ScorePayload):
+    """
+    Risk scoring:
+    - If a trained model exists AND value is provided -> use IsolationForest.
+    - Otherwise -> use the original heuristic based on device name.
+    """
+    return score_items([payload])[0]
+
+
+@app.post("/score_batch")
+async def score_batch(payload: ScoreBatchPayload):
+    """Score many device/metric/value items in one request (same rules as /score)."""
+    return {"results": score_items(payload.items)}
@@ -0,0 +1,117 @@
+"""
+On-demand sampling profiler for a running service (no restart, no extra
+dependency). Each service builds from its own directory, so this file is
+copied verbatim into every service; aiops_shared_modules_check.sh fails if
+the copies drift.
+
+    from profiling import enable_profiling
+    enable_profiling(app)
+
+    curl 'http://<svc>/debug/profile?seconds=10'              # collapsed stacks (flamegraph.pl, speedscope)
+    curl 'http://<svc>/debug/profile?seconds=10&format=json'  # top functions by self / total samples
+
+While a profile runs, one background thread snapshots every thread's Python
+stack every `interval_ms` (default 5 ms); nothing is collected otherwise.
+Threads parked in the event loop or an idle worker pool are left out unless
+idle=true.
+
+The endpoint exposes stack contents, so it is off unless PROFILING=1; with
+PROFILING_TOKEN set, requests must also send it as X-Profiling-Token.
+"""
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+# (file, function) at the top of a stack that means "waiting for work"
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+    ("_base.py", "wait"),
+}
+MAX_SECONDS = 120.0
+
+
+def _frame_name(frame: Any) -> Tuple[str, str]:
+    code = frame.f_code
+    return os.path.basename(code.co_filename), code.co_name
+
+
+def sample(seconds: float, interval: float = 0.005, idle: bool = False) -> Tuple[Counter, int]:
+    """Sample all other threads' stacks for `seconds`; -> (Counter of "a;b;c" stacks, rounds)."""
+    stacks: Counter = Counter()
+    me = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    rounds = 0
+    while time.monotonic() < deadline:
+        for tid, frame in sys._current_frames().items():
+            if tid == me:
+                continue
+            if not idle and _frame_name(frame) in IDLE_FRAMES:
+                continue
+            names: List[str] = []
+            while frame is not None:
+                fname, func = _frame_name(frame)
+                names.append(f"{func} ({fname})")
+                frame = frame.f_back
+            stacks[";".join(reversed(names))] += 1
+        rounds += 1
+        time.sleep(interval)
+    return stacks, rounds
+
+
+def summarize(stacks: Counter, rounds: int, top: int = 25) -> Dict[str, Any]:
+    total = sum(stacks.values())
+    self_counts: Counter = Counter()
+    total_counts: Counter = Counter()
+    for stack, n in stacks.items():
+        frames = stack.split(";")
+        self_counts[frames[-1]] += n
+        for f in set(frames):
+            total_counts[f] += n
+
+    def table(c: Counter) -> List[Dict[str, Any]]:
+        return [{"function": f, "samples": n, "share": round(n / total, 4) if total else 0.0}
+                for f, n in c.most_common(top)]
+
+    return {"samples": total, "rounds": rounds, "top_self": table(self_counts), "top_total": table(total_counts)}
+
+
+_busy = threading.Lock()
+
+
+def enable_profiling(app: Any) -> None:
+    """Add GET /debug/profile (one profile at a time) when PROFILING=1."""
+    if os.getenv("PROFILING", "0").strip().lower() not in ("1", "true", "yes", "on"):
+        return
+    token = os.getenv("PROFILING_TOKEN", "")
+    from fastapi import Header, HTTPException, Query
+    from fastapi.responses import PlainTextResponse
+
+    @app.get("/debug/profile", include_in_schema=False)
+    async def debug_profile(
+        seconds: float = Query(10.0, gt=0, le=MAX_SECONDS),
+        interval_ms: float = Query(5.0, ge=1.0, le=1000.0),
+        format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+        idle: bool = False,
+        x_profiling_token: str = Header(None),
+    ):
+        if token and not (x_profiling_token and hmac.compare_digest(x_profiling_token, token)):
+            raise HTTPException(status_code=403, detail="invalid_profiling_token")
+        if not _busy.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="A profile is already running")
+        try:
+            # sample from a worker thread so the event loop keeps serving (and gets profiled)
+            stacks, rounds = await asyncio.to_thread(sample, seconds, interval_ms / 1000.0, idle)
+        finally:
+            _busy.release()
+        if format == "json":
+            return summarize(stacks, rounds)
+        body = "".join(f"{stack} {n}\n" for stack, n in stacks.most_common())
+        return PlainTextResponse(body)
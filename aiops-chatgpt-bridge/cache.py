@@ -0,0 +1,398 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # semantic lookup falls back to pure Python
+    np = None
+
+log = logging.getLogger(__name__)
+
+_WS = re.compile(r"\s+")
+
+
+def normalize(s: Optional[str]) -> str:
+    return _WS.sub(" ", (s or "").strip()).casefold()
+
+
+def _sha(*parts: str) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def scope_key(model: str, system_prompt: Optional[str], context: Optional[str]) -> str:
+    """Everything except the user message: answers are only reusable within a scope."""
+    return _sha(model, normalize(system_prompt), normalize(context))
+
+
+def prompt_key(scope: str, user_message: str) -> str:
+    return _sha(scope, normalize(user_message))
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = sum(x * x for x in a) ** 0.5
+    nb = sum(y * y for y in b) ** 0.5
+    return dot / (na * nb) if na and nb else 0.0
+
+
+class _VectorIndex:
+    """
+    Unit-normalised embeddings of one scope, kept as the rows of a matrix that
+    is updated in place as entries come and go (no rebuild per lookup).
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.keys: List[str] = []
+        self.pos: Dict[str, int] = {}
+        self.m = np.empty((16, dim), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: str, vec: "np.ndarray") -> None:
+        i = self.pos.get(key)
+        if i is None:
+            i = len(self.keys)
+            if i == len(self.m):
+                grown = np.empty((2 * len(self.m), self.dim), dtype=np.float32)
+                grown[:i] = self.m
+                self.m = grown
+            self.keys.append(key)
+            self.pos[key] = i
+        self.m[i] = vec
+
+    def remove(self, key: str) -> None:
+        i = self.pos.pop(key, None)
+        if i is None:
+            return
+        last = len(self.keys) - 1
+        if i != last:  # move the last row into the hole
+            moved = self.keys[last]
+            self.m[i] = self.m[last]
+            self.keys[i] = moved
+            self.pos[moved] = i
+        self.keys.pop()
+
+    def above(self, q: "np.ndarray", threshold: float) -> List[Tuple[str, float]]:
+        """(key, similarity) of rows at or above `threshold`, best first."""
+        sims = self.m[:len(self.keys)] @ q
+        idx = np.flatnonzero(sims >= threshold)
+        return [(self.keys[i], float(sims[i])) for i in idx[np.argsort(-sims[idx])]]
+
+
+def _unit(vec: List[float]) -> Optional["np.ndarray"]:
+    v = np.asarray(vec, dtype=np.float32)
+    n = float(np.linalg.norm(v))
+    return v / n if n else None
+
+
+class ResponseCache:
+    """
+    Two-tier LLM response cache.
+
+    Memory tier: LRU bounded by `maxsize`, entries expire after `ttl` seconds.
+    Disk tier:   SQLite (WAL) at `path`, survives restarts, same TTL, trimmed to
+                 `disk_maxsize` rows. Writes go through a queue to one writer
+                 thread (batched commits); disk reads run in a worker thread, so
+                 SQLite never blocks the event loop.
+    Lookups try the exact prompt hash first; with embeddings enabled, entries in
+    the same scope whose message embedding is within `threshold` cosine
+    similarity are returned as near-duplicate hits.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 3600.0,
+        maxsize: int = 2048,
+        path: Optional[str] = None,
+        disk_maxsize: int = 50000,
+        threshold: float = 0.95,
+        write_queue: int = 10000,
+    ):
+        self.ttl = ttl
+        self.maxsize = max(1, maxsize)
+        self.disk_maxsize = disk_maxsize
+        self.threshold = threshold
+        self._mem: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._index: Dict[str, _VectorIndex] = {}  # scope -> embeddings (numpy only)
+        self._lock = threading.Lock()      # memory tier + index
+        self._db_lock = threading.Lock()   # the SQLite connection
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=write_queue)
+        self._writer: Optional[threading.Thread] = None
+        self._puts = 0
+        self._disk_rows: Optional[int] = None
+        self.dropped_writes = 0
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses("
+                " key TEXT PRIMARY KEY, scope TEXT, created REAL,"
+                " answer TEXT, usage TEXT, embedding TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_created ON responses(created)")
+            self._db.commit()
+            self._disk_rows = self._db.execute("SELECT count(*) FROM responses").fetchone()[0]
+            self._writer = threading.Thread(target=self._write_loop, name="bridge-cache-writer", daemon=True)
+            self._writer.start()
+
+        self._warm()
+
+        self.hits = {"memory": 0, "disk": 0, "semantic": 0}
+        self.misses = 0
+        self.saved_tokens = 0
+
+    # -- internals --------------------------------------------------------
+
+    def _fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["created"] < self.ttl
+
+    def _index_add(self, key: str, entry: Dict[str, Any]) -> None:
+        if np is None or not entry.get("embedding"):
+            return
+        vec = _unit(entry["embedding"])
+        if vec is None:
+            return
+        idx = self._index.get(entry["scope"])
+        if idx is None or idx.dim != len(vec):  # new scope, or the embedding model changed
+            idx = self._index[entry["scope"]] = _VectorIndex(len(vec))
+        idx.add(key, vec)
+
+    def _forget(self, key: str, entry: Dict[str, Any]) -> None:
+        idx = self._index.get(entry["scope"])
+        if idx is not None:
+            idx.remove(key)
+            if not len(idx):
+                del self._index[entry["scope"]]
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        old = self._mem.get(key)
+        if old is not None and old["scope"] != entry["scope"]:
+            self._forget(key, old)
+        self._mem[key] = entry
+        self._mem.move_to_end(key)
+        self._index_add(key, entry)
+        while len(self._mem) > self.maxsize:
+            k, e = self._mem.popitem(last=False)
+            self._forget(k, e)
+
+    def _drop(self, key: str) -> None:
+        entry = self._mem.pop(key, None)
+        if entry is not None:
+            self._forget(key, entry)
+
+    def _warm(self) -> None:
+        """Load the newest fresh disk rows so semantic lookups work after a restart."""
+        if self._db is None:
+            return
+        rows = self._db.execute(
+            "SELECT key, scope, created, answer, usage, embedding FROM responses"
+            " WHERE created >= ? ORDER BY created DESC LIMIT ?",
+            (time.time() - self.ttl, self.maxsize),
+        ).fetchall()
+        for key, scope, created, answer, usage, embedding in reversed(rows):
+            self._remember(key, {
+                "scope": scope,
+                "created": created,
+                "answer": answer,
+                "usage": json.loads(usage) if usage else None,
+                "embedding": json.loads(embedding) if embedding else None,
+            })
+
+    def _disk_get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT scope, created, answer, usage, embedding FROM responses WHERE key=?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        scope, created, answer, usage, embedding = row
+        return {
+            "scope": scope,
+            "created": created,
+            "answer": answer,
+            "usage": json.loads(usage) if usage else None,
+            "embedding": json.loads(embedding) if embedding else None,
+        }
+
+    def _write_loop(self) -> None:
+        """Writer thread: drain the queue, one transaction per batch."""
+        while True:
+            item = self._writes.get()
+            if item is None:
+                self._writes.task_done()
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < 500:
+                try:
+                    nxt = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                batch.append(nxt)
+            try:
+                self._write(batch)
+            except sqlite3.Error as e:
+                log.warning("bridge cache: dropping %d disk writes: %s", len(batch), e)
+            finally:
+                for _ in range(len(batch) + stop):
+                    self._writes.task_done()
+            if stop:
+                return
+
+    def _write(self, rows: List[tuple]) -> None:
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO responses(key, scope, created, answer, usage, embedding)"
+                " VALUES (?,?,?,?,?,?)",
+                rows,
+            )
+            before = self._puts
+            self._puts += len(rows)
+            if self._puts // 100 != before // 100:
+                # trim expired rows and cap the table size now and then
+                self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_maxsize,),
+                )
+            self._db.commit()
+            self._disk_rows = self._db.execute("SELECT count(*) FROM responses").fetchone()[0]
+
+    def _semantic(self, scope: str, embedding: List[float]) -> Tuple[Optional[str], float]:
+        if np is not None:
+            idx = self._index.get(scope)
+            q = _unit(embedding)
+            if idx is None or q is None or len(q) != idx.dim:
+                return None, 0.0
+            for key, sim in idx.above(q, self.threshold):
+                if self._fresh(self._mem[key]):
+                    return key, sim
+                self._drop(key)  # expired
+            return None, 0.0
+        best_key, best = None, 0.0
+        for k, e in self._mem.items():
+            if e["scope"] == scope and e.get("embedding") and self._fresh(e):
+                s = _cosine(embedding, e["embedding"])
+                if s > best:
+                    best_key, best = k, s
+        return best_key, best
+
+    def _count_hit(self, kind: str, entry: Dict[str, Any]) -> None:
+        self.hits[kind] += 1
+        usage = entry.get("usage") or {}
+        self.saved_tokens += int(usage.get("total_tokens") or 0)
+
+    def _hit(self, kind: str, entry: Dict[str, Any], **extra: Any) -> Dict[str, Any]:
+        self._count_hit(kind, entry)
+        return {"answer": entry["answer"], "usage": entry["usage"], "cache": kind, **extra}
+
+    # -- public API -------------------------------------------------------
+
+    async def get(self, scope: str, key: str, embedding: Optional[List[float]] = None,
+                  exact_only: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Return {"answer", "usage", "cache": <tier>} or None. With exact_only,
+        a miss is not counted: the caller follows up with get_similar(),
+        which records the request's outcome.
+        """
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None and self._fresh(entry):
+                self._mem.move_to_end(key)
+                return self._hit("memory", entry)
+
+        if self._db is not None:
+            entry = await asyncio.to_thread(self._disk_get, key)
+            if entry is not None and self._fresh(entry):
+                with self._lock:
+                    self._remember(key, entry)
+                    return self._hit("disk", entry)
+
+        if exact_only:
+            return None
+        return self.get_similar(scope, embedding)
+
+    def get_similar(self, scope: str, embedding: Optional[List[float]]) -> Optional[Dict[str, Any]]:
+        """Semantic tier only (memory); counts a miss when nothing is close enough."""
+        with self._lock:
+            if embedding is not None:
+                near, sim = self._semantic(scope, embedding)
+                if near is not None and sim >= self.threshold:
+                    entry = self._mem[near]
+                    self._mem.move_to_end(near)
+                    return self._hit("semantic", entry, similarity=sim)
+            self.misses += 1
+            return None
+
+    def put(self, scope: str, key: str, answer: str, usage: Optional[Dict[str, Any]],
+            embedding: Optional[List[float]] = None) -> None:
+        """Store in memory now; the disk write is queued for the writer thread."""
+        if self.ttl <= 0 or not answer:
+            return
+        entry = {"scope": scope, "created": time.time(), "answer": answer,
+                 "usage": usage, "embedding": embedding}
+        with self._lock:
+            self._remember(key, entry)
+        if self._writer is None:
+            return
+        row = (key, scope, entry["created"], answer,
+               json.dumps(usage) if usage else None,
+               json.dumps(embedding) if embedding else None)
+        try:
+            self._writes.put_nowait(row)
+        except queue.Full:
+            self.dropped_writes += 1
+
+    def flush(self) -> None:
+        """Block until queued disk writes are committed."""
+        if self._writer is not None:
+            self._writes.join()
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writes.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(self.hits.values())
+        total = hits + self.misses
+        return {
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "hit_rate": (hits / total) if total else 0.0,
+            "saved_tokens": self.saved_tokens,
+            "memory_entries": len(self._mem),
+            "disk_entries": self._disk_rows,
+            "pending_writes": self._writes.qsize(),
+            "dropped_writes": self.dropped_writes,
+            "ttl": self.ttl,
+            "semantic_threshold": self.threshold,
+        }
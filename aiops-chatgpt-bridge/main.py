@@ -1,73 +1,423 @@
+import asyncio
+import json
+import logging
 import os
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, AsyncIterator
 
 import httpx
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from openai import OpenAI
+from openai import AsyncOpenAI
 from openai import RateLimitError, AuthenticationError, BadRequestError
 
+from cache import ResponseCache, scope_key, prompt_key, normalize
+from memory import Conversation, ConversationStore, count_tokens, clip_tokens, select_history
+from scheduler import LLMScheduler, QueueFull, QueueTimeout
+from metrics import counter, expose_stats, instrument
+from profiling import enable_profiling
+from tracing import annotate, setup_tracing, span
+
+log = logging.getLogger("aiops-chatgpt-bridge")
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-5.1")
 OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "25"))
+# Point at a local stub server for tests, e.g. http://127.0.0.1:8999/v1
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Max completions in flight; callers beyond this wait up to BRIDGE_QUEUE_TIMEOUT
+BRIDGE_MAX_CONCURRENCY = int(os.getenv("BRIDGE_MAX_CONCURRENCY", "64"))
+BRIDGE_QUEUE_TIMEOUT = float(os.getenv("BRIDGE_QUEUE_TIMEOUT", "5"))
+
+# Response cache: exact prompt-hash hits, optional embedding near-duplicates
+# (set BRIDGE_CACHE_EMBED_MODEL, e.g. text-embedding-3-small), SQLite disk tier.
+BRIDGE_CACHE_TTL = float(os.getenv("BRIDGE_CACHE_TTL", "3600"))
+BRIDGE_CACHE_SIZE = int(os.getenv("BRIDGE_CACHE_SIZE", "2048"))
+BRIDGE_CACHE_PATH = os.getenv("BRIDGE_CACHE_PATH", "/data/bridge_cache.sqlite")
+BRIDGE_CACHE_DISK_SIZE = int(os.getenv("BRIDGE_CACHE_DISK_SIZE", "50000"))
+BRIDGE_CACHE_EMBED_MODEL = os.getenv("BRIDGE_CACHE_EMBED_MODEL", "")
+BRIDGE_CACHE_SIMILARITY = float(os.getenv("BRIDGE_CACHE_SIMILARITY", "0.95"))
+
+# Conversation memory: recent turns per conversation_id plus a rolling summary,
+# assembled into the prompt under BRIDGE_PROMPT_TOKEN_BUDGET tokens.
+BRIDGE_MEMORY_CONVERSATIONS = int(os.getenv("BRIDGE_MEMORY_CONVERSATIONS", "5000"))
+BRIDGE_MEMORY_TURNS = int(os.getenv("BRIDGE_MEMORY_TURNS", "12"))
+BRIDGE_MEMORY_SUMMARY_TOKENS = int(os.getenv("BRIDGE_MEMORY_SUMMARY_TOKENS", "300"))
+BRIDGE_MEMORY_IDLE_TTL = float(os.getenv("BRIDGE_MEMORY_IDLE_TTL", str(6 * 3600)))
+BRIDGE_PROMPT_TOKEN_BUDGET = int(os.getenv("BRIDGE_PROMPT_TOKEN_BUDGET", "3000"))
+
+# Client-side rate limiting: stay under the provider's per-minute request and
+# token quotas by queueing calls (high > normal > low priority) instead of
+# letting the provider reject them.
+BRIDGE_RPM = float(os.getenv("BRIDGE_RPM", "500"))
+BRIDGE_TPM = float(os.getenv("BRIDGE_TPM", "200000"))
+BRIDGE_SCHED_MAX_QUEUE = int(os.getenv("BRIDGE_SCHED_MAX_QUEUE", "1000"))
+BRIDGE_EST_COMPLETION_TOKENS = int(os.getenv("BRIDGE_EST_COMPLETION_TOKENS", "500"))
+# Shortest deadline of the callers (gateway CHATGPT_TIMEOUT, Rasa CHATGPT_TIMEOUT).
+# A call must leave the queue with time to spare for the completion itself, so
+# no priority may wait more than half of it; waiting longer only spends tokens
+# on answers nobody is waiting for any more.
+BRIDGE_CALLER_TIMEOUT = float(os.getenv("BRIDGE_CALLER_TIMEOUT", "25"))
 
 if not OPENAI_API_KEY:
     raise RuntimeError("OPENAI_API_KEY is not set")
 
-client = OpenAI(
+client = AsyncOpenAI(
     api_key=OPENAI_API_KEY,
+    base_url=OPENAI_BASE_URL,
     timeout=httpx.Timeout(OPENAI_TIMEOUT),
+    max_retries=0,
+)
+
+app = FastAPI(title="AIOps ChatGPT Bridge", version="1.3")
+instrument(app, "aiops-chatgpt-bridge")
+setup_tracing("aiops-chatgpt-bridge", app)
+enable_profiling(app)
+
+LLM_TOKENS = counter("bridge_llm_tokens_total", "Provider-reported tokens", ["kind"])
+LLM_ERRORS = counter("bridge_llm_errors_total", "Provider call failures", ["error"])
+EMBEDDED = counter("bridge_embeddings_total", "Cache-lookup embeddings requested")
+
+cache = ResponseCache(
+    ttl=BRIDGE_CACHE_TTL,
+    maxsize=BRIDGE_CACHE_SIZE,
+    path=BRIDGE_CACHE_PATH or None,
+    disk_maxsize=BRIDGE_CACHE_DISK_SIZE,
+    threshold=BRIDGE_CACHE_SIMILARITY,
 )
 
-app = FastAPI(title="AIOps ChatGPT Bridge", version="1.2")
+def max_waits() -> Dict[str, float]:
+    waits = {
+        "high": float(os.getenv("BRIDGE_MAX_WAIT_HIGH", "10")),
+        "normal": float(os.getenv("BRIDGE_MAX_WAIT_NORMAL", "5")),
+        "low": float(os.getenv("BRIDGE_MAX_WAIT_LOW", "2")),
+    }
+    cap = BRIDGE_CALLER_TIMEOUT / 2
+    for p, w in waits.items():
+        if w > cap:
+            log.warning("BRIDGE_MAX_WAIT_%s=%s exceeds half of BRIDGE_CALLER_TIMEOUT; using %s", p.upper(), w, cap)
+            waits[p] = cap
+    return waits
+
+scheduler = LLMScheduler(
+    rpm=BRIDGE_RPM,
+    tpm=BRIDGE_TPM,
+    max_queue=BRIDGE_SCHED_MAX_QUEUE,
+    max_wait=max_waits(),
+)
+
+memory = ConversationStore(
+    max_conversations=BRIDGE_MEMORY_CONVERSATIONS,
+    max_turns=BRIDGE_MEMORY_TURNS,
+    summary_tokens=BRIDGE_MEMORY_SUMMARY_TOKENS,
+    idle_ttl=BRIDGE_MEMORY_IDLE_TTL,
+)
+
+_slots = asyncio.Semaphore(BRIDGE_MAX_CONCURRENCY)
+_in_flight = 0
+_rejected = 0
 
 class ChatRequest(BaseModel):
     user_message: str = Field(..., min_length=1)
     conversation_id: Optional[str] = None
     context: Optional[str] = None
     system_prompt: Optional[str] = None
+    priority: str = "normal"  # high (incident/anomaly chat) | normal (portal chat) | low (background)
 
 class ChatResponse(BaseModel):
     answer: str
     model: str
     usage: Optional[Dict[str, Any]] = None
+    cached: Optional[str] = None  # cache tier that served the answer, if any
+
+# cache hit rates, scheduler queue depth / waits, conversation counts
+expose_stats("bridge_cache", cache.stats)
+expose_stats("bridge_scheduler", scheduler.stats)
+expose_stats("bridge_memory", memory.stats)
+
+
+@app.on_event("shutdown")
+def close_cache():
+    cache.close()  # commits queued disk writes
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "model": OPENAI_MODEL}
+    return {
+        "status": "ok",
+        "model": OPENAI_MODEL,
+        "in_flight": _in_flight,
+        "max_concurrency": BRIDGE_MAX_CONCURRENCY,
+        "rejected": _rejected,
+    }
+
+@app.get("/stats/cache")
+def cache_stats():
+    return cache.stats()
+
+@app.get("/stats/memory")
+def memory_stats():
+    return memory.stats()
+
+@app.get("/stats/scheduler")
+def scheduler_stats():
+    return scheduler.stats()
 
-def build_messages(system_prompt: Optional[str], user_message: str, context: Optional[str]):
+def build_messages(system_prompt: Optional[str], user_message: str, context: Optional[str],
+                   conversation: Optional[Conversation] = None,
+                   budget: int = BRIDGE_PROMPT_TOKEN_BUDGET):
+    """
+    system prompt, rolling summary, context and as many recent turns as fit in
+    `budget` tokens, then the user message. The system prompt and user message
+    are always kept; the summary gets at most a quarter of what is left, the
+    context half of the remainder when there is history, the turns the rest.
+    """
     sys_msg = system_prompt or (
         "You are a helpful AIOps assistant for network operations. "
         "Be concise, technical, and actionable."
     )
     msgs = [{"role": "system", "content": sys_msg}]
-    if context:
-        msgs.append({"role": "system", "content": f"Context:\n{context}"})
+    remaining = budget - count_tokens(sys_msg) - count_tokens(user_message)
+    turns = list(conversation.turns) if conversation else []
+
+    # the headings count against the budget too
+    if conversation and conversation.summary and remaining > 0:
+        head = "Earlier in this conversation:\n"
+        summary = clip_tokens(conversation.summary, remaining // 4 - count_tokens(head))
+        if summary:
+            msgs.append({"role": "system", "content": head + summary})
+            remaining -= count_tokens(head + summary)
+    if context and remaining > 0:
+        head = "Context:\n"
+        ctx = clip_tokens(context, (remaining // 2 if turns else remaining) - count_tokens(head))
+        if ctx:
+            msgs.append({"role": "system", "content": head + ctx})
+            remaining -= count_tokens(head + ctx)
+    for user, assistant in select_history(turns, remaining):
+        msgs.append({"role": "user", "content": user})
+        msgs.append({"role": "assistant", "content": assistant})
     msgs.append({"role": "user", "content": user_message})
     return msgs
 
-@app.post("/respond", response_model=ChatResponse)
-def respond(req: ChatRequest):
-    try:
-        messages = build_messages(req.system_prompt, req.user_message, req.context)
-        r = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=messages,
+def to_http_error(e: Exception) -> HTTPException:
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, RateLimitError):
+        return HTTPException(
+            status_code=429,
+            detail="OpenAI rate limit / quota hit. Check billing, project limits, or switch to gpt-5-mini."
         )
-        answer = r.choices[0].message.content or ""
-        usage = getattr(r, "usage", None)
-        usage_dict = usage.model_dump() if usage else None
-        return ChatResponse(answer=answer, model=OPENAI_MODEL, usage=usage_dict)
+    if isinstance(e, AuthenticationError):
+        return HTTPException(status_code=401, detail="Invalid/disabled OPENAI_API_KEY.")
+    if isinstance(e, BadRequestError):
+        return HTTPException(status_code=400, detail=str(e))
+    return HTTPException(status_code=502, detail=str(e))
 
-    except RateLimitError as e:
+async def acquire_slot():
+    """Wait for a completion slot; shed the request if none frees up in time."""
+    global _in_flight, _rejected
+    try:
+        await asyncio.wait_for(_slots.acquire(), timeout=BRIDGE_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        _rejected += 1
+        raise HTTPException(status_code=503, detail="Bridge busy: too many concurrent completions.")
+    _in_flight += 1
+
+def release_slot():
+    global _in_flight
+    _in_flight -= 1
+    _slots.release()
+
+def estimate_tokens(messages) -> int:
+    return sum(count_tokens(m["content"]) + 4 for m in messages) + BRIDGE_EST_COMPLETION_TOKENS
+
+async def admit(priority: str, est_tokens: int, slot: bool = True):
+    """
+    Wait for rate-limit budget (by priority), then for a completion slot.
+    slot=False leaves the slot to the caller (streams take it in the generator).
+    """
+    with span("bridge.admit", priority=priority, est_tokens=est_tokens):
+        await _admit(priority, est_tokens, slot)
+
+async def _admit(priority: str, est_tokens: int, slot: bool):
+    try:
+        await scheduler.acquire(priority, est_tokens)
+    except QueueTimeout as e:
         raise HTTPException(
             status_code=429,
-            detail="OpenAI rate limit / quota hit. Check billing, project limits, or switch to gpt-5-mini."
+            detail="Bridge rate limit queue wait exceeded; retry later.",
+            headers={"Retry-After": str(max(1, int(e.retry_after)))},
         )
-    except AuthenticationError:
-        raise HTTPException(status_code=401, detail="Invalid/disabled OPENAI_API_KEY.")
-    except BadRequestError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Bridge rate limit queue full.")
+    if slot:
+        try:
+            await acquire_slot()
+        except HTTPException:
+            scheduler.refund(est_tokens)
+            raise
+
+def settle(est_tokens: int, usage_dict: Optional[Dict[str, Any]]):
+    for kind in ("prompt_tokens", "completion_tokens"):
+        LLM_TOKENS.labels(kind.split("_")[0]).inc(int((usage_dict or {}).get(kind) or 0))
+    total = (usage_dict or {}).get("total_tokens")
+    scheduler.settle(est_tokens, int(total) if total is not None else None)
+
+def fail(e: Exception, est_tokens: int, refund: bool = True) -> HTTPException:
+    """Provider call failed: count it, then give back its reservation or back off."""
+    LLM_ERRORS.labels(type(e).__name__).inc()
+    if isinstance(e, RateLimitError):
+        scheduler.penalize()
+    elif refund:
+        scheduler.refund(est_tokens)
+    return to_http_error(e)
+
+async def embed(text: str) -> Optional[list]:
+    """Embedding of the normalized message for near-duplicate lookups (None if off/failed)."""
+    if not BRIDGE_CACHE_EMBED_MODEL:
+        return None
+    EMBEDDED.inc()
+    try:
+        with span("llm.embed", model=BRIDGE_CACHE_EMBED_MODEL):
+            r = await client.embeddings.create(model=BRIDGE_CACHE_EMBED_MODEL, input=normalize(text))
+        return list(r.data[0].embedding)
+    except Exception as e:
+        log.warning("bridge cache embedding error: %s", e)
+        return None
+
+async def cache_lookup(req: ChatRequest, conv: Optional[Conversation]):
+    """
+    -> (scope, key, embedding, hit or None). Answers inside a conversation
+    depend on its history, so they are neither served from nor stored in the
+    cache (scope is None).
+    """
+    if conv is not None and conv.turns:
+        return None, None, None, None
+    scope = scope_key(OPENAI_MODEL, req.system_prompt, req.context)
+    key = prompt_key(scope, req.user_message)
+    with span("bridge.cache_get"):
+        hit = await cache.get(scope, key, exact_only=True)
+    vec = None
+    if hit is None:
+        # exact tiers missed: embed once, then try the semantic tier (which counts the outcome)
+        vec = await embed(req.user_message)
+        with span("bridge.cache_get", semantic=True):
+            hit = cache.get_similar(scope, vec)
+    annotate(cache=hit["cache"] if hit is not None else "miss")
+    return scope, key, vec, hit
+
+def remember(req: ChatRequest, scope: Optional[str], key: Optional[str], answer: str,
+             usage: Optional[Dict[str, Any]], vec: Optional[list]) -> None:
+    memory.append(req.conversation_id, req.user_message, answer)
+    if scope is not None:
+        cache.put(scope, key, answer, usage, embedding=vec)
+
+@app.post("/respond", response_model=ChatResponse)
+async def respond(req: ChatRequest):
+    conv = memory.get(req.conversation_id)
+    scope, key, vec, hit = await cache_lookup(req, conv)
+    if hit is not None:
+        memory.append(req.conversation_id, req.user_message, hit["answer"])
+        return ChatResponse(answer=hit["answer"], model=OPENAI_MODEL, usage=hit["usage"], cached=hit["cache"])
+
+    messages = build_messages(req.system_prompt, req.user_message, req.context, conv)
+    est = estimate_tokens(messages)
+    await admit(req.priority, est)
+    try:
+        with span("llm.chat", model=OPENAI_MODEL, est_tokens=est) as s:
+            r = await client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+            )
+            answer = r.choices[0].message.content or ""
+            usage = getattr(r, "usage", None)
+            usage_dict = usage.model_dump() if usage else None
+            s.set_attributes({f"llm.{k}": v for k, v in (usage_dict or {}).items() if isinstance(v, int)})
     except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+        raise fail(e, est)
+    finally:
+        release_slot()
+    settle(est, usage_dict)
+
+    remember(req, scope, key, answer, usage_dict, vec)
+    return ChatResponse(answer=answer, model=OPENAI_MODEL, usage=usage_dict)
+
+def sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+async def stream_cached(req: ChatRequest, hit: Dict[str, Any]) -> AsyncIterator[str]:
+    memory.append(req.conversation_id, req.user_message, hit["answer"])
+    yield sse({"delta": hit["answer"]})
+    yield sse({"answer": hit["answer"], "model": OPENAI_MODEL, "usage": hit["usage"],
+               "cached": hit["cache"]}, event="done")
+
+async def stream_completion(req: ChatRequest, messages: list, est: int, scope: Optional[str],
+                            key: Optional[str], vec: Optional[list]) -> AsyncIterator[str]:
+    """
+    Server-sent events:
+      data: {"delta": "..."}                        one per token chunk
+      event: done   data: {"answer", "model", "usage"}
+      event: error  data: {"status_code", "detail"}
+
+    The completion slot is taken here rather than before the response is
+    returned: a generator that never starts (client gone before the body)
+    would never reach its finally and the slot would be lost.
+    """
+    try:
+        await acquire_slot()
+    except HTTPException as e:
+        scheduler.refund(est)
+        yield sse({"status_code": e.status_code, "detail": e.detail}, event="error")
+        return
+    with span("llm.chat_stream", model=OPENAI_MODEL, est_tokens=est) as s:
+        t0 = time.perf_counter()
+        parts = []
+        try:
+            stream = await client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            usage_dict = None
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage_dict = chunk.usage.model_dump()
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        s.set_attribute("llm.first_token_s", round(time.perf_counter() - t0, 4))
+                    parts.append(delta)
+                    yield sse({"delta": delta})
+            answer = "".join(parts)
+            settle(est, usage_dict)
+            remember(req, scope, key, answer, usage_dict, vec)
+            yield sse({"answer": answer, "model": OPENAI_MODEL, "usage": usage_dict}, event="done")
+        except Exception as e:
+            # once tokens were streamed the provider has billed for them
+            err = fail(e, est, refund=not parts)
+            s.set_attribute("error.type", type(e).__name__)
+            yield sse({"status_code": err.status_code, "detail": err.detail}, event="error")
+        finally:
+            release_slot()
+
+@app.post("/respond/stream")
+async def respond_stream(req: ChatRequest):
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    conv = memory.get(req.conversation_id)
+    scope, key, vec, hit = await cache_lookup(req, conv)
+    if hit is not None:
+        return StreamingResponse(stream_cached(req, hit), media_type="text/event-stream", headers=headers)
+
+    messages = build_messages(req.system_prompt, req.user_message, req.context, conv)
+    est = estimate_tokens(messages)
+    await admit(req.priority, est, slot=False)
+    return StreamingResponse(
+        stream_completion(req, messages, est, scope, key, vec),
+        media_type="text/event-stream",
+        headers=headers,
+    )
@@ -0,0 +1,142 @@
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+    _enc = tiktoken.get_encoding("cl100k_base")
+except Exception:  # optional: fall back to a chars/4 estimate
+    _enc = None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _enc is not None:
+        return len(_enc.encode(text))
+    return len(text) // 4 + 1
+
+
+def clip_tokens(text: str, budget: int) -> str:
+    """Trim text to at most `budget` tokens, the " …" marker included (keeps the head)."""
+    if budget <= 0:
+        return ""
+    if count_tokens(text) <= budget:
+        return text
+    if _enc is not None:
+        head = _enc.encode(text)[:budget]
+        while head and count_tokens(_enc.decode(head) + " …") > budget:
+            head = head[:-1]
+        return _enc.decode(head) + " …"
+    return text[: (budget - 1) * 4] + " …"
+
+
+# Acknowledgements and chit-chat that add nothing to later answers
+_LOW_VALUE = re.compile(
+    r"^\s*(ok(ay)?|k|thanks?( you)?|thx|cool|great|nice|got it|yes|no|sure|hi|hello|hey)[\s.!?]*$",
+    re.IGNORECASE,
+)
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+Turn = Tuple[str, str]  # (user, assistant)
+
+
+def is_low_value(turn: Turn) -> bool:
+    return bool(_LOW_VALUE.match(turn[0] or ""))
+
+
+def _gist(text: str, max_chars: int = 160) -> str:
+    first = _SENTENCE.split((text or "").strip().replace("\n", " "), 1)[0]
+    return first if len(first) <= max_chars else first[:max_chars].rstrip() + "…"
+
+
+class Conversation:
+    __slots__ = ("turns", "summary", "updated")
+
+    def __init__(self, max_turns: int):
+        self.turns: Deque[Turn] = deque(maxlen=max_turns)
+        self.summary = ""
+        self.updated = time.time()
+
+
+class ConversationStore:
+    """
+    Per-conversation history kept in memory.
+
+    Each conversation holds at most `max_turns` recent turns; older turns are
+    folded into a rolling extractive summary capped at `summary_tokens`.
+    At most `max_conversations` are kept (least recently used evicted) and
+    conversations idle for `idle_ttl` seconds are dropped.
+    """
+
+    def __init__(self, max_conversations: int = 5000, max_turns: int = 12,
+                 summary_tokens: int = 300, idle_ttl: float = 6 * 3600):
+        self.max_conversations = max(1, max_conversations)
+        self.max_turns = max(1, max_turns)
+        self.summary_tokens = summary_tokens
+        self.idle_ttl = idle_ttl
+        self._convs: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def get(self, conversation_id: Optional[str]) -> Optional[Conversation]:
+        if not conversation_id:
+            return None
+        with self._lock:
+            conv = self._convs.get(conversation_id)
+            if conv is None:
+                return None
+            if time.time() - conv.updated > self.idle_ttl:
+                del self._convs[conversation_id]
+                return None
+            self._convs.move_to_end(conversation_id)
+            return conv
+
+    def append(self, conversation_id: Optional[str], user: str, assistant: str) -> None:
+        if not conversation_id:
+            return
+        with self._lock:
+            conv = self._convs.get(conversation_id)
+            if conv is None:
+                conv = self._convs[conversation_id] = Conversation(self.max_turns)
+            self._convs.move_to_end(conversation_id)
+            if len(conv.turns) == conv.turns.maxlen:
+                oldest = conv.turns[0]
+                if not is_low_value(oldest):
+                    line = f"- user asked: {_gist(oldest[0])} / answer: {_gist(oldest[1])}"
+                    summary = (conv.summary + "\n" + line).strip()
+                    # keep the newest part of the summary within its budget
+                    while count_tokens(summary) > self.summary_tokens and "\n" in summary:
+                        summary = summary.split("\n", 1)[1]
+                    conv.summary = clip_tokens(summary, self.summary_tokens)
+            conv.turns.append((user, assistant))
+            conv.updated = time.time()
+            while len(self._convs) > self.max_conversations:
+                self._convs.popitem(last=False)
+                self.evicted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "conversations": len(self._convs),
+            "max_conversations": self.max_conversations,
+            "max_turns": self.max_turns,
+            "evicted": self.evicted,
+        }
+
+
+def select_history(turns: List[Turn], budget: int) -> List[Turn]:
+    """Newest-first fill of `budget` tokens, skipping low-value turns."""
+    picked: List[Turn] = []
+    used = 0
+    for turn in reversed(turns):
+        if is_low_value(turn):
+            continue
+        cost = count_tokens(turn[0]) + count_tokens(turn[1]) + 8
+        if used + cost > budget:
+            break
+        picked.append(turn)
+        used += cost
+    picked.reverse()
+    return picked
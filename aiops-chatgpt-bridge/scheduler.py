@@ -0,0 +1,174 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class QueueTimeout(Exception):
+    """The call waited longer than its priority's max wait."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("LLM scheduler queue wait exceeded")
+        self.retry_after = retry_after
+
+
+class QueueFull(Exception):
+    """Too many calls already waiting."""
+
+
+class TokenBucket:
+    """Continuous-refill bucket: `rate_per_min` units per minute, burst = one minute."""
+
+    def __init__(self, rate_per_min: float):
+        self.capacity = float(rate_per_min)
+        self.rate = float(rate_per_min) / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount: float) -> None:
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self) -> None:
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class LLMScheduler:
+    """
+    Client-side admission for provider calls.
+
+    Calls wait in a priority queue (high < normal < low, FIFO within a level)
+    until both the requests-per-minute and tokens-per-minute buckets can cover
+    them. Only the head of the queue is admitted, so a burst of low-priority
+    calls never delays an operator's incident chat. After the call the token
+    estimate is settled against the provider's reported usage.
+    """
+
+    def __init__(self, rpm: float, tpm: float, max_queue: int = 1000,
+                 max_wait: Optional[Dict[str, float]] = None):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_queue = max_queue
+        self.max_wait = max_wait or {"high": 120.0, "normal": 30.0, "low": 10.0}
+        self._heap: List[Tuple[int, int, float, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.granted = {p: 0 for p in PRIORITIES}
+        self.timeouts = {p: 0 for p in PRIORITIES}
+        self.rejected_full = 0
+        self.refunded = 0
+        self._waits: Dict[str, Deque[float]] = {p: deque(maxlen=500) for p in PRIORITIES}
+
+    # -- queue pump -------------------------------------------------------
+
+    def _pump(self) -> None:
+        self._timer = None
+        while self._heap:
+            prio, _, amount, fut = self._heap[0]
+            if fut.done():  # timed out / cancelled while waiting
+                heapq.heappop(self._heap)
+                continue
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(amount))
+            if wait > 0:
+                loop = asyncio.get_running_loop()
+                self._timer = loop.call_later(wait, self._pump)
+                return
+            heapq.heappop(self._heap)
+            self.requests.take(1)
+            self.tokens.take(amount)
+            fut.set_result(None)
+
+    # -- public API -------------------------------------------------------
+
+    async def acquire(self, priority: str, est_tokens: int) -> None:
+        priority = priority if priority in PRIORITIES else "normal"
+        if len(self._heap) >= self.max_queue:
+            self.rejected_full += 1
+            raise QueueFull()
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (PRIORITIES[priority], next(self._seq), float(est_tokens), fut))
+        if self._timer is not None:
+            self._timer.cancel()
+        self._pump()
+
+        t0 = time.monotonic()
+        try:
+            await asyncio.wait_for(fut, timeout=self.max_wait.get(priority, 30.0))
+        except asyncio.TimeoutError:
+            self.timeouts[priority] += 1
+            raise QueueTimeout(retry_after=max(self.requests.wait_time(1), self.tokens.wait_time(est_tokens), 1.0))
+        finally:
+            # a cancelled waiter may have been at the head: let the next one in
+            if self._heap and self._timer is None:
+                self._pump()
+        self.granted[priority] += 1
+        self._waits[priority].append(time.monotonic() - t0)
+
+    def settle(self, est_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Correct the token bucket once the real usage is known."""
+        if actual_tokens is None:
+            return
+        diff = actual_tokens - est_tokens
+        if diff > 0:
+            self.tokens.take(diff)
+        elif diff < 0:
+            self.tokens.give(-diff)
+
+    def refund(self, est_tokens: int) -> None:
+        """The admitted call never produced a completion: return its token estimate."""
+        self.refunded += 1
+        self.tokens.give(est_tokens)
+
+    def penalize(self) -> None:
+        """Provider said 429: stop admitting until the buckets refill."""
+        self.requests.drain()
+        self.tokens.drain()
+
+    def stats(self) -> Dict[str, Any]:
+        depth = {p: 0 for p in PRIORITIES}
+        names = {v: k for k, v in PRIORITIES.items()}
+        for prio, _, _, fut in self._heap:
+            if not fut.done():
+                depth[names[prio]] += 1
+
+        def wait_summary(samples: Deque[float]) -> Dict[str, float]:
+            if not samples:
+                return {"avg": 0.0, "p95": 0.0, "max": 0.0}
+            s = sorted(samples)
+            return {"avg": sum(s) / len(s), "p95": s[min(len(s) - 1, int(0.95 * len(s)))], "max": s[-1]}
+
+        return {
+            "queue_depth": depth,
+            "granted": dict(self.granted),
+            "timeouts": dict(self.timeouts),
+            "rejected_full": self.rejected_full,
+            "refunded": self.refunded,
+            "wait_seconds": {p: wait_summary(w) for p, w in self._waits.items()},
+            "buckets": {
+                "requests": {"available": round(self.requests.tokens, 2), "per_min": self.requests.capacity},
+                "tokens": {"available": round(self.tokens.tokens, 2), "per_min": self.tokens.capacity},
+            },
+        }
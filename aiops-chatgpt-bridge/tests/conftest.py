@@ -0,0 +1,38 @@
+import importlib.util
+import os
+import sys
+
+import httpx
+import pytest
+
+HERE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(HERE, ".."))
+# bench/stubs.py doubles as the fake OpenAI (deterministic embeddings)
+sys.path.insert(0, os.path.join(HERE, "..", "..", "bench"))
+
+
+@pytest.fixture(scope="session")
+def bridge():
+    """
+    main.py with bench/stubs.py as the OpenAI provider. Loaded once: its
+    Prometheus collectors register globally.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        # main reads its settings at import; the env is put back right after
+        with pytest.MonkeyPatch.context() as env:
+            env.setenv("OPENAI_API_KEY", os.environ.get("OPENAI_API_KEY", "test"))
+            env.setenv("BRIDGE_CACHE_PATH", "")
+            env.setenv("BRIDGE_CACHE_EMBED_MODEL", "")
+            # by path: other services' tests put their own main.py on sys.path
+            spec = importlib.util.spec_from_file_location("bridge_main", os.path.join(HERE, "..", "main.py"))
+            main = importlib.util.module_from_spec(spec)
+            mp.setitem(sys.modules, "bridge_main", main)
+            spec.loader.exec_module(main)
+        from openai import AsyncOpenAI
+        import stubs
+
+        mp.setattr(main, "client", AsyncOpenAI(
+            api_key="test", base_url="http://openai-stub/v1",
+            http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=stubs.openai_app)),
+        ))
+        yield main
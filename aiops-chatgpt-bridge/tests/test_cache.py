@@ -0,0 +1,111 @@
+import asyncio
+
+from cache import ResponseCache, prompt_key, scope_key
+from stubs import _embedding
+
+MODEL = "gpt-test"
+
+
+def get(cache, scope, key, embedding=None):
+    return asyncio.run(cache.get(scope, key, embedding=embedding))
+
+
+def test_keys_ignore_case_and_whitespace():
+    scope = scope_key(MODEL, "You are an AIOps assistant.", "device=rb1")
+    assert scope == scope_key(MODEL, "  you are an   AIOps assistant. ", "DEVICE=rb1")
+    assert prompt_key(scope, "Why is CPU high?") == prompt_key(scope, "why is  cpu high?\n")
+
+
+def test_scope_covers_model_system_prompt_and_context():
+    base = scope_key(MODEL, "sys", "ctx")
+    assert scope_key("other-model", "sys", "ctx") != base
+    assert scope_key(MODEL, "other", "ctx") != base
+    assert scope_key(MODEL, "sys", "other") != base
+    # the same question in two scopes is two different entries
+    assert prompt_key(base, "q") != prompt_key(scope_key(MODEL, "sys", "other"), "q")
+
+
+def test_scope_parts_do_not_run_together():
+    assert scope_key(MODEL, "ab", "c") != scope_key(MODEL, "a", "bc")
+
+
+def test_exact_hit_and_miss():
+    cache = ResponseCache(ttl=60)
+    scope = scope_key(MODEL, None, None)
+    cache.put(scope, prompt_key(scope, "restart the switch?"), "yes", {"total_tokens": 10})
+    hit = get(cache, scope, prompt_key(scope, "Restart the switch?"))
+    assert hit["answer"] == "yes" and hit["cache"] == "memory"
+    assert get(cache, scope, prompt_key(scope, "restart the router?")) is None
+    assert cache.stats()["saved_tokens"] == 10
+
+
+def test_semantic_hit_stays_inside_its_scope():
+    cache = ResponseCache(ttl=60, threshold=0.95)
+    scope = scope_key(MODEL, None, "rb1")
+    vec = _embedding("why is cpu high on rb1")
+    cache.put(scope, prompt_key(scope, "why is cpu high on rb1"), "busy", None, embedding=vec)
+
+    hit = get(cache, scope, prompt_key(scope, "cpu high on rb1, why?"), embedding=vec)
+    assert hit["cache"] == "semantic" and hit["similarity"] >= 0.95
+
+    other = scope_key(MODEL, None, "core2")
+    assert get(cache, other, prompt_key(other, "why is cpu high on rb1"), embedding=vec) is None
+    # unrelated text embeds far away
+    assert get(cache, scope, prompt_key(scope, "disk full"), embedding=_embedding("disk full")) is None
+
+
+def test_expired_entries_are_misses():
+    cache = ResponseCache(ttl=60)
+    scope = scope_key(MODEL, None, None)
+    key = prompt_key(scope, "q")
+    cache.put(scope, key, "a", None)
+    cache._mem[key]["created"] -= 61
+    assert get(cache, scope, key) is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    scope = scope_key(MODEL, None, None)
+    key = prompt_key(scope, "q")
+    cache = ResponseCache(ttl=60, path=path)
+    cache.put(scope, key, "a", None)
+    cache.close()
+
+    again = ResponseCache(ttl=60, maxsize=1, path=path)
+    try:
+        assert get(again, scope, key)["answer"] == "a"
+    finally:
+        again.close()
+
+
+def test_one_outcome_per_lookup(tmp_path):
+    cache = ResponseCache(ttl=60, threshold=0.95, path=str(tmp_path / "cache.db"))
+    disk_reads = []
+    real = cache._disk_get
+    cache._disk_get = lambda key: disk_reads.append(key) or real(key)
+    scope = scope_key(MODEL, None, None)
+    vec = _embedding("why is cpu high")
+    cache.put(scope, prompt_key(scope, "why is cpu high"), "busy", None, embedding=vec)
+
+    def lookup(text, embedding):
+        # what the bridge does: exact tiers first, then the semantic tier once
+        hit = asyncio.run(cache.get(scope, prompt_key(scope, text), exact_only=True))
+        return hit if hit is not None else cache.get_similar(scope, embedding)
+
+    try:
+        assert lookup("cpu high, why?", vec)["cache"] == "semantic"
+        assert lookup("disk full", _embedding("disk full")) is None
+        assert lookup("disk full", None) is None  # embeddings off or failed
+        stats = cache.stats()
+        assert stats["hits"]["semantic"] == 1 and stats["misses"] == 2
+        assert stats["hit_rate"] == 1 / 3
+        assert len(disk_reads) == 3  # one disk lookup per request
+    finally:
+        cache.close()
+
+
+def test_full_get_counts_a_single_miss():
+    cache = ResponseCache(ttl=60)
+    scope = scope_key(MODEL, None, None)
+    assert get(cache, scope, prompt_key(scope, "q"), embedding=_embedding("q")) is None
+    assert cache.stats()["misses"] == 1 and sum(cache.stats()["hits"].values()) == 0
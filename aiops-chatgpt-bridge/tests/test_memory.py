@@ -0,0 +1,99 @@
+import pytest
+
+from memory import Conversation, ConversationStore, clip_tokens, count_tokens, select_history
+
+
+def prompt_tokens(messages):
+    return sum(count_tokens(m["content"]) for m in messages)
+
+
+# --- ConversationStore ----------------------------------------------------------
+
+def test_least_recently_used_conversation_is_evicted():
+    store = ConversationStore(max_conversations=2)
+    store.append("a", "q", "a")
+    store.append("b", "q", "a")
+    assert store.get("a") is not None  # a is now the most recent
+    store.append("c", "q", "a")
+    assert store.get("b") is None
+    assert store.get("a") is not None and store.get("c") is not None
+    assert store.stats()["evicted"] == 1
+
+
+def test_idle_conversations_expire():
+    store = ConversationStore(idle_ttl=60)
+    store.append("a", "q", "a")
+    store.get("a").updated -= 61
+    assert store.get("a") is None
+    assert store.stats()["conversations"] == 0
+
+
+def test_no_conversation_id_keeps_nothing():
+    store = ConversationStore()
+    store.append(None, "q", "a")
+    assert store.get(None) is None and store.stats()["conversations"] == 0
+
+
+def test_summary_starts_when_the_turn_window_is_full():
+    store = ConversationStore(max_turns=2)
+    store.append("a", "Why is CPU high on rb1? It spiked at noon.", "A backup job. It runs daily.")
+    store.append("a", "second", "answer")
+    assert store.get("a").summary == ""
+    store.append("a", "third", "answer")
+    conv = store.get("a")
+    # the turn that fell out of the window, first sentence of each side
+    assert conv.summary == "- user asked: Why is CPU high on rb1? / answer: A backup job."
+    assert [t[0] for t in conv.turns] == ["second", "third"]
+
+
+def test_low_value_turns_are_not_summarised():
+    store = ConversationStore(max_turns=1)
+    store.append("a", "thanks!", "you're welcome")
+    store.append("a", "next", "answer")
+    assert store.get("a").summary == ""
+
+
+def test_summary_keeps_its_newest_lines_within_budget():
+    store = ConversationStore(max_turns=1, summary_tokens=40)
+    for i in range(20):
+        store.append("a", f"question {i} about device rb{i}", f"answer {i}")
+    summary = store.get("a").summary
+    assert count_tokens(summary) <= 40
+    assert "question 18" in summary and "question 0 " not in summary
+
+
+# --- history selection and token budget -----------------------------------------
+
+def test_select_history_is_newest_first_and_skips_low_value():
+    turns = [("old question", "old answer"), ("ok", "sure"), ("new question", "new answer")]
+    assert select_history(turns, 1000) == [turns[0], turns[2]]
+    one = count_tokens("new question") + count_tokens("new answer") + 8
+    assert select_history(turns, one) == [turns[2]]
+    assert select_history(turns, one - 1) == []
+
+
+@pytest.mark.parametrize("budget", [1, 2, 5, 50])
+def test_clip_tokens_stays_within_budget(budget):
+    clipped = clip_tokens("word " * 1000, budget)
+    assert count_tokens(clipped) <= budget and clipped.endswith("…")
+
+
+@pytest.mark.parametrize("budget", [120, 300, 1000, 3000])
+def test_build_messages_fits_the_budget(bridge, budget):
+    conv = Conversation(12)
+    conv.summary = "\n".join(f"- user asked: q{i} about rb{i} / answer: a{i}" for i in range(40))
+    for i in range(12):
+        conv.turns.append((f"why is cpu high on rb{i} " * 20, f"load from backup {i} " * 40))
+    msgs = bridge.build_messages(None, "and now?", "inventory line " * 2000, conv, budget=budget)
+    assert prompt_tokens(msgs) <= budget
+    assert msgs[0]["role"] == "system" and msgs[-1] == {"role": "user", "content": "and now?"}
+
+
+def test_turn_larger_than_the_budget_is_left_out(bridge):
+    conv = Conversation(12)
+    conv.turns.append(("small", "reply"))
+    conv.turns.append(("dump the logs", "log line " * 5000))
+    msgs = bridge.build_messages("sys", "and now?", None, conv, budget=300)
+    # newest-first: the oversized turn ends the history, older turns are not reordered past it
+    assert msgs == [{"role": "system", "content": "sys"}, {"role": "user", "content": "and now?"}]
+    assert prompt_tokens(msgs) <= 300
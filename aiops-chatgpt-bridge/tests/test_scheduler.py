@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from scheduler import LLMScheduler, QueueFull, QueueTimeout
+
+
+def test_priority_order_then_fifo():
+    async def run():
+        sched = LLMScheduler(rpm=60, tpm=1_000_000)
+        sched.requests.drain()  # no request budget: every call has to queue
+        order = []
+
+        async def call(name, priority):
+            await sched.acquire(priority, 10)
+            order.append(name)
+
+        tasks = [asyncio.ensure_future(call(n, p)) for n, p in
+                 [("low", "low"), ("normal-1", "normal"), ("high", "high"), ("normal-2", "normal")]]
+        await asyncio.sleep(0)
+        sched.requests.tokens = sched.requests.capacity  # budget frees up for everyone
+        sched._pump()
+        await asyncio.gather(*tasks)
+        assert order == ["high", "normal-1", "normal-2", "low"]
+
+    asyncio.run(run())
+
+
+def test_wait_longer_than_max_wait_times_out():
+    async def run():
+        sched = LLMScheduler(rpm=1, tpm=1_000_000, max_wait={"high": 5.0, "normal": 0.05, "low": 0.05})
+        await sched.acquire("high", 1)
+        with pytest.raises(QueueTimeout) as e:
+            await sched.acquire("normal", 1)
+        assert e.value.retry_after >= 1.0
+        assert sched.timeouts["normal"] == 1
+        assert sched.stats()["queue_depth"]["normal"] == 0
+
+    asyncio.run(run())
+
+
+def test_queue_full_is_rejected():
+    async def run():
+        sched = LLMScheduler(rpm=1, tpm=1_000_000, max_queue=1, max_wait={"normal": 1.0})
+        await sched.acquire("normal", 1)
+        waiting = asyncio.ensure_future(sched.acquire("normal", 1))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFull):
+            await sched.acquire("normal", 1)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def test_token_budget_gates_admission():
+    async def run():
+        sched = LLMScheduler(rpm=1000, tpm=600, max_wait={"normal": 0.05})
+        await sched.acquire("normal", 600)
+        with pytest.raises(QueueTimeout):
+            await sched.acquire("normal", 100)
+
+    asyncio.run(run())
+
+
+def test_settle_and_refund_return_unused_tokens():
+    async def run():
+        sched = LLMScheduler(rpm=1000, tpm=1000)
+        await sched.acquire("normal", 500)
+        sched.settle(500, 200)
+        assert sched.tokens.tokens == pytest.approx(800, abs=1)
+        await sched.acquire("normal", 300)
+        sched.refund(300)
+        assert sched.tokens.tokens == pytest.approx(800, abs=1)
+        assert sched.stats()["refunded"] == 1
+
+    asyncio.run(run())
+
+
+def test_penalize_drains_both_buckets():
+    sched = LLMScheduler(rpm=1000, tpm=1000)
+    sched.penalize()
+    assert sched.requests.wait_time(1) > 0
+    assert sched.tokens.wait_time(1) > 0
+
+
+# --- bridge admission (conftest `bridge`: bench/stubs.py as the OpenAI provider) -
+
+def test_max_waits_stay_under_the_caller_deadline(bridge, monkeypatch):
+    monkeypatch.setenv("BRIDGE_MAX_WAIT_HIGH", "120")
+    monkeypatch.setattr(bridge, "BRIDGE_CALLER_TIMEOUT", 25.0)
+    waits = bridge.max_waits()
+    assert waits["high"] == 12.5
+    assert all(w <= 12.5 for w in waits.values())
+
+
+def test_failed_completion_refunds_its_tokens(bridge, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    async def boom(*args, **kwargs):
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(bridge.client.chat.completions, "create", boom)
+    before = bridge.scheduler.refunded
+    resp = TestClient(bridge.app).post("/respond", json={"user_message": "refund me", "priority": "high"})
+    assert resp.status_code == 502
+    assert bridge.scheduler.refunded == before + 1
+    assert bridge.scheduler.granted["high"] >= 1
+
+
+def test_completion_through_the_stub(bridge, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setenv("STUB_LATENCY_MS", "0")
+    resp = TestClient(bridge.app).post("/respond", json={"user_message": "check the core switch"})
+    assert resp.status_code == 200
+    assert resp.json()["answer"]
@@ -1,19 +1,77 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Any, Dict, Optional
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Any, AsyncIterator, Dict, List, Optional
 import httpx
+import json
 import os
 
+from coalesce import SingleFlight, TTLCache, normalize_text, payload_key
+from metrics import SIZE_BUCKETS, expose_stats, histogram, instrument
+from notify import EventForwarder
+from tracing import annotate, setup_tracing
+from upstream import Upstream, UpstreamUnavailable, error_detail
+
 
 # Internal URLs (Docker network)
-RAG_URL = "http://aiops-rag-service:8000/query"
-ANOMALY_URL = "http://aiops-anomaly-service:8100/score"
+RAG_URL = os.getenv("RAG_URL", "http://aiops-rag-service:8000/query")
+ANOMALY_URL = os.getenv("ANOMALY_URL", "http://aiops-anomaly-service:8100/score")
+ANOMALY_BATCH_URL = os.getenv("ANOMALY_BATCH_URL", "http://aiops-anomaly-service:8100/score_batch")
+ANOMALY_BATCH_MAX = int(os.getenv("ANOMALY_BATCH_MAX", "500"))
 
 app = FastAPI(title="AIOps ML Gateway")
+instrument(app, "aiops-ml-gateway")
+setup_tracing("aiops-ml-gateway", app)
+
+BATCH_SIZE = histogram("gateway_anomaly_batch_size", "Items per /ai/anomaly/score_batch call", buckets=SIZE_BUCKETS)
+BATCH_FORWARDED = histogram("gateway_anomaly_batch_forwarded", "Uncached items sent upstream per batch call", buckets=(0,) + SIZE_BUCKETS)
+
+# One persistent, pooled client per upstream (created on startup).
+# RAG queries are read-only, so they may be hedged (RAG_HEDGE_AFTER=<seconds>).
+# A slow RAG reply is not retried: that would multiply the caller's wait and
+# add load to an already busy service; hedging covers slow replies instead.
+rag_upstream = Upstream.from_env("rag", "RAG", RAG_URL, timeout=30.0, retries=2, retry_on_read=False,
+                                 max_concurrent=32)
+anomaly_upstream = Upstream.from_env("anomaly", "ANOMALY", ANOMALY_URL, timeout=10.0, retries=2, max_concurrent=64)
+
+# Identical concurrent RAG/anomaly requests share one upstream call; anomaly
+# scores are also cached briefly (ANOMALY_CACHE_TTL=0 disables the cache).
+singleflight = SingleFlight()
+anomaly_cache = TTLCache(
+    ttl=float(os.getenv("ANOMALY_CACHE_TTL", "10")),
+    maxsize=int(os.getenv("ANOMALY_CACHE_SIZE", "2048")),
+)
+
+
+# Scored anomaly results are pushed to the UI gateway in the background
+# (UI_EVENTS_URL, e.g. http://<ui-host>:8089/aiops/events; empty disables).
+# UI_EVENTS_TOKEN must match the UI gateway's.
+ui_events = EventForwarder(os.getenv("UI_EVENTS_URL", ""), token=os.getenv("UI_EVENTS_TOKEN", ""))
+
+
+def degraded_score(device: str, metric: str) -> Dict[str, Any]:
+    return {
+        "device": device,
+        "metric": metric,
+        "risk_score": None,
+        "risk_label": "unknown",
+        "note": "[ANOMALY-DEGRADED] Anomaly service temporarily unavailable.",
+    }
+
+
+def degraded(e: UpstreamUnavailable, body: Dict[str, Any]) -> JSONResponse:
+    """Fast 503 returned instead of queueing behind a failing/saturated upstream."""
+    body.update({"degraded": True, "upstream": e.upstream, "reason": e.reason})
+    return JSONResponse(
+        status_code=503,
+        content=body,
+        headers={"Retry-After": str(max(1, int(round(e.retry_after))))},
+    )
 
 class RAGQuery(BaseModel):
     question: str
     context: Optional[Dict[str, Any]] = None
+    compact: bool = False
 
 class AnomalyScoreRequest(BaseModel):
     device: str
@@ -22,65 +80,241 @@ class AnomalyScoreRequest(BaseModel):
     time_window: str = "15m"
     value: Optional[float] = None  # numeric metric value (e.g., CPU %)
 
+class AnomalyScoreBatchRequest(BaseModel):
+    items: List[AnomalyScoreRequest] = Field(..., max_length=ANOMALY_BATCH_MAX)
+
 
 @app.get("/health")
 async def health():
     return {"status": "ok", "service": "aiops-ml-gateway"}
 
 
+async def _post_json(upstream: Upstream, body: Dict[str, Any], url: Optional[str] = None) -> Any:
+    resp = await upstream.post(body, url=url)
+    resp.raise_for_status()
+    return resp.json()
+
+
 @app.post("/ai/rag/query")
 async def rag_query(payload: RAGQuery):
     """Proxy to the RAG brain (aiops-rag-service)."""
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        try:
-            resp = await client.post(RAG_URL, json=payload.dict())
-            resp.raise_for_status()
-            return resp.json()
-        except httpx.HTTPError as e:
-            detail = getattr(e.response, "text", str(e))
-            raise HTTPException(status_code=502, detail=f"RAG service error: {detail}")
+    body = payload.dict()
+    key = payload_key("rag", {
+        "question": normalize_text(payload.question),
+        "context": payload.context,
+        "compact": payload.compact,
+    })
+    try:
+        return await singleflight.do(key, lambda: _post_json(rag_upstream, body))
+    except UpstreamUnavailable as e:
+        return degraded(e, {
+            "answer": "The AIOps knowledge base is temporarily unavailable. Please retry shortly.",
+            "confidence": {"score": 0.0, "max": 0.0, "mean": 0.0, "gap": 0.0, "n": 0},
+            "debug": {"question": payload.question, "matches": []},
+        })
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"RAG service error: {error_detail(e)}")
+
+
+def anomaly_key(payload: AnomalyScoreRequest) -> str:
+    # alert_id is not part of the score, so it does not split the key
+    return payload_key("anomaly", {
+        "device": normalize_text(payload.device),
+        "metric": payload.metric,
+        "time_window": payload.time_window,
+        "value": payload.value,
+    })
 
 
 @app.post("/ai/anomaly/score")
 async def anomaly_score(payload: AnomalyScoreRequest):
     """Proxy to the anomaly brain (aiops-anomaly-service)."""
-    async with httpx.AsyncClient(timeout=30.0) as client:
+    # Forward ALL fields, including 'value'
+    body = payload.dict()
+    key = anomaly_key(payload)
+    hit, cached = anomaly_cache.get(key)
+    annotate(cache_hit=hit)
+    if hit:
+        ui_events.add([cached], [body])
+        return cached
+
+    async def call() -> Any:
+        data = await _post_json(anomaly_upstream, body)
+        anomaly_cache.set(key, data)
+        return data
+
+    try:
+        data = await singleflight.do(key, call)
+    except UpstreamUnavailable as e:
+        return degraded(e, degraded_score(payload.device, payload.metric))
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Anomaly service error: {error_detail(e)}")
+    ui_events.add([data], [body])
+    return data
+
+@app.post("/ai/anomaly/score_batch")
+async def anomaly_score_batch(payload: AnomalyScoreBatchRequest):
+    """
+    Score several device/metric/value items with one upstream call.
+    Cached items are answered locally; only the rest are sent.
+    """
+    keys = [anomaly_key(it) for it in payload.items]
+    BATCH_SIZE.observe(len(keys))
+    results: List[Any] = [None] * len(keys)
+    todo: List[int] = []
+    for i, key in enumerate(keys):
+        hit, cached = anomaly_cache.get(key)
+        if hit:
+            results[i] = cached
+        else:
+            todo.append(i)
+
+    BATCH_FORWARDED.observe(len(todo))
+    annotate(batch_size=len(keys), batch_forwarded=len(todo))
+    if todo:
+        body = {"items": [payload.items[i].dict() for i in todo]}
         try:
-            # Forward ALL fields, including 'value'
-            resp = await client.post(ANOMALY_URL, json=payload.dict())
-            resp.raise_for_status()
-            return resp.json()
+            data = await _post_json(anomaly_upstream, body, url=ANOMALY_BATCH_URL)
+        except UpstreamUnavailable as e:
+            return degraded(e, {"results": [
+                results[i] if results[i] is not None else degraded_score(it.device, it.metric)
+                for i, it in enumerate(payload.items)
+            ]})
         except httpx.HTTPError as e:
-            detail = getattr(e.response, "text", str(e))
-            raise HTTPException(status_code=502, detail=f"Anomaly service error: {detail}")
+            raise HTTPException(status_code=502, detail=f"Anomaly service error: {error_detail(e)}")
+        scored = data.get("results") if isinstance(data, dict) else None
+        # results are matched to items by position, so a short list cannot be trusted
+        if not isinstance(scored, list) or len(scored) != len(todo):
+            got = len(scored) if isinstance(scored, list) else "no"
+            raise HTTPException(
+                status_code=502,
+                detail=f"Anomaly service error: sent {len(todo)} items, got {got} results",
+            )
+        for i, res in zip(todo, scored):
+            results[i] = res
+            anomaly_cache.set(keys[i], res)
+
+    ui_events.add(results, [it.dict() for it in payload.items])
+    return {"results": results}
 
 # --- ChatGPT Bridge Proxy (auto-added) ---
 CHATGPT_BRIDGE_URL = os.getenv("CHATGPT_BRIDGE_URL", "http://aiops-chatgpt-bridge:9100/respond")
+CHATGPT_BRIDGE_STREAM_URL = os.getenv("CHATGPT_BRIDGE_STREAM_URL", CHATGPT_BRIDGE_URL.rstrip("/") + "/stream")
 CHATGPT_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "25"))
 
-@app.post("/ai/chatgpt")
-async def chatgpt_proxy(req: dict):
-    """
-    Proxy requests to ChatGPT bridge.
-    Input: {message/user_message, context?, conversation_id?, system_prompt?}
-    """
+# LLM calls are not cheap to repeat: only retry failures before the request was sent
+chatgpt_upstream = Upstream.from_env(
+    "chatgpt", "CHATGPT", CHATGPT_BRIDGE_URL,
+    timeout=CHATGPT_TIMEOUT, retries=1, retry_statuses=(), retry_on_read=False,
+    max_concurrent=16,
+)
+
+UPSTREAMS = {u.name: u for u in (rag_upstream, anomaly_upstream, chatgpt_upstream)}
+
+# Pool occupancy, breaker state, cache hit rates... read from the stats() dicts at scrape time
+expose_stats("gateway_upstream", lambda: {name: u.stats() for name, u in UPSTREAMS.items()})
+expose_stats("gateway_singleflight", singleflight.stats)
+expose_stats("gateway_anomaly_cache", anomaly_cache.stats)
+expose_stats("gateway_ui_events", ui_events.stats)
+
+
+@app.on_event("startup")
+async def start_upstreams():
+    for u in UPSTREAMS.values():
+        await u.start()
+    await ui_events.start()
+
+
+@app.on_event("shutdown")
+async def close_upstreams():
+    for u in UPSTREAMS.values():
+        await u.close()
+    await ui_events.close()
+
+
+@app.get("/stats/upstreams")
+async def upstream_stats():
+    """Request/retry counters and connection-pool occupancy per upstream."""
+    return {name: u.stats() for name, u in UPSTREAMS.items()}
+
+
+@app.get("/stats/coalescing")
+async def coalescing_stats():
+    """Single-flight (shared in-flight calls) and anomaly cache hit counters."""
+    return {"singleflight": singleflight.stats(), "anomaly_cache": anomaly_cache.stats()}
+
+
+@app.get("/stats/ui_events")
+async def ui_events_stats():
+    """Anomaly results forwarded to the UI gateway push channel."""
+    return ui_events.stats()
+
+
+def bridge_payload(req: dict) -> Optional[Dict[str, Any]]:
     user_msg = req.get("message") or req.get("user_message")
     if not user_msg:
-        return {"error": "message is required"}
-
-    payload = {
+        return None
+    return {
         "user_message": user_msg,
         "conversation_id": req.get("conversation_id"),
         "context": req.get("context"),
         "system_prompt": req.get("system_prompt"),
+        "priority": req.get("priority") or "normal",
     }
 
+
+@app.post("/ai/chatgpt")
+async def chatgpt_proxy(req: dict):
+    """
+    Proxy requests to ChatGPT bridge.
+    Input: {message/user_message, context?, conversation_id?, system_prompt?, priority?}
+    """
+    payload = bridge_payload(req)
+    if payload is None:
+        return {"error": "message is required"}
+
     try:
-        async with httpx.AsyncClient(timeout=CHATGPT_TIMEOUT) as c:
-            r = await c.post(CHATGPT_BRIDGE_URL, json=payload)
-            # don’t raise_for_status; pass through errors cleanly
-            if r.status_code >= 400:
-                return {"error": r.text, "status_code": r.status_code}
-            return r.json()
+        r = await chatgpt_upstream.post(payload)
+        # don’t raise_for_status; pass through errors cleanly
+        if r.status_code >= 400:
+            return {"error": r.text, "status_code": r.status_code}
+        return r.json()
+    except UpstreamUnavailable as e:
+        return {"error": f"Bridge unavailable ({e.reason})", "status_code": 503, "degraded": True}
     except httpx.RequestError as e:
         return {"error": f"Bridge unreachable: {str(e)}", "status_code": 502}
+
+
+def _sse_error(status_code: int, detail: str) -> bytes:
+    return f"event: error\ndata: {json.dumps({'status_code': status_code, 'detail': detail})}\n\n".encode()
+
+
+@app.post("/ai/chatgpt/stream")
+async def chatgpt_stream_proxy(req: dict):
+    """
+    Server-sent-events passthrough of the bridge's /respond/stream.
+    Token chunks are forwarded as they arrive; failures become an `error` event.
+    """
+    payload = bridge_payload(req)
+    if payload is None:
+        return JSONResponse(status_code=400, content={"error": "message is required"})
+
+    async def relay() -> AsyncIterator[bytes]:
+        try:
+            async with chatgpt_upstream.stream(payload, url=CHATGPT_BRIDGE_STREAM_URL) as r:
+                if r.status_code >= 400:
+                    body = await r.aread()
+                    yield _sse_error(r.status_code, body.decode(errors="replace"))
+                    return
+                async for chunk in r.aiter_raw():
+                    yield chunk
+        except UpstreamUnavailable as e:
+            yield _sse_error(503, f"Bridge unavailable ({e.reason})")
+        except httpx.HTTPError as e:
+            yield _sse_error(502, f"Bridge unreachable: {str(e)}")
+
+    return StreamingResponse(
+        relay(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
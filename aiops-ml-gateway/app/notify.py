@@ -0,0 +1,100 @@
+"""
+Fire-and-forget forwarding of anomaly results to the UI gateway.
+
+Scored results are buffered (bounded; oldest dropped first) and posted in
+batches by one background task, so scoring latency never depends on the UI
+gateway being up.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Optional
+
+import httpx
+
+
+class EventForwarder:
+    def __init__(self, url: str, token: str = "", flush_interval: float = 1.0, batch_size: int = 500,
+                 max_buffer: int = 5000, timeout: float = 3.0):
+        self.url = url
+        # sent as X-Events-Token; the UI gateway refuses events without it
+        self.token = token
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._buf: Deque[Dict[str, Any]] = deque(maxlen=max_buffer)
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self.sent = 0
+        self.failed_batches = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    def add(self, results: Iterable[Dict[str, Any]], items: Iterable[Dict[str, Any]]) -> None:
+        """Queue scored results; `items` are the matching requests (device/metric/value)."""
+        if not self.enabled:
+            return
+        for item, res in zip(items, results):
+            if not isinstance(res, dict) or res.get("risk_score") is None:
+                continue
+            self._buf.append({
+                "device": item.get("device"),
+                "metric": item.get("metric"),
+                "value": item.get("value"),
+                "alert_id": item.get("alert_id"),
+                "risk_score": res.get("risk_score"),
+                "risk_label": res.get("risk_label", "unknown"),
+            })
+        if len(self._buf) >= self.batch_size:
+            self._wake.set()
+
+    async def _flush(self) -> None:
+        while self._buf:
+            n = min(self.batch_size, len(self._buf))
+            batch = [self._buf.popleft() for _ in range(n)]
+            try:
+                resp = await self._client.post(self.url, json={"events": batch})
+                resp.raise_for_status()
+                self.sent += len(batch)
+            except httpx.HTTPError:
+                # UI gateway down: drop this batch rather than back up scoring
+                self.failed_batches += 1
+                return
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self._flush()
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            headers = {"X-Events-Token": self.token} if self.token else None
+            self._client = httpx.AsyncClient(timeout=self.timeout, headers=headers)
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "url": self.url,
+            "buffered": len(self._buf),
+            "sent": self.sent,
+            "failed_batches": self.failed_batches,
+        }
@@ -0,0 +1,381 @@
+"""
+Application-lifetime HTTP clients for the gateway's upstream "brains".
+
+One Upstream per backend service: a single httpx.AsyncClient with its own
+connection limits, keep-alive and timeouts, plus retries with jittered
+exponential backoff for transient failures. Each upstream also has a
+circuit breaker, a concurrency cap that rejects immediately when full, and
+optional request hedging for calls that are safe to duplicate.
+"""
+import asyncio
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+
+from tracing import annotate, span, trace_hooks
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+class UpstreamUnavailable(Exception):
+    """Raised without contacting the upstream (breaker open or overloaded)."""
+
+    def __init__(self, upstream: str, reason: str, retry_after: float = 1.0):
+        super().__init__(f"{upstream}: {reason}")
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker.
+    closed -> open after `failure_threshold` failures in a row;
+    open -> half_open after `reset_timeout` seconds, letting one probe through;
+    the probe closes the breaker on success or re-opens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 15.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+        # half_open: a single probe at a time
+        if self.probe_in_flight:
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.probe_in_flight = False
+        self.state = "closed"
+
+    def record_failure(self, probe: bool = False) -> None:
+        """`probe`: this call was the half-open probe (allow() let it through as such)."""
+        self.failures += 1
+        if probe:
+            self.probe_in_flight = False
+        if probe or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """The probe ended without an outcome (cancelled): let the next one through."""
+        self.probe_in_flight = False
+
+    def retry_after(self) -> float:
+        if self.state != "open":
+            return 1.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "retry_after": round(self.retry_after(), 3),
+        }
+
+
+class Upstream:
+    """Pooled, persistent client for one upstream service."""
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        timeout: float = 30.0,
+        connect_timeout: float = 2.0,
+        retries: int = 2,
+        retry_statuses: Tuple[int, ...] = (502, 503, 504),
+        retry_on_read: bool = True,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        backoff_base: float = 0.05,
+        backoff_max: float = 1.0,
+        http2: bool = False,
+        max_concurrent: int = 64,
+        breaker_failures: int = 5,
+        breaker_reset: float = 15.0,
+        hedge_after: float = 0.0,
+    ):
+        self.name = name
+        self.url = url
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.retries = max(0, retries)
+        self.retry_statuses = retry_statuses
+        # Read errors/timeouts mean the request may have reached the upstream;
+        # only retry them for calls that are safe to repeat.
+        self.retry_on_read = retry_on_read
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.http2 = http2
+        self.max_concurrent = max(1, max_concurrent)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        # Send a duplicate request if the first has not answered after this
+        # many seconds (0 = off). Only for idempotent upstreams.
+        self.hedge_after = hedge_after
+        self.client: Optional[httpx.AsyncClient] = None
+
+        self.requests = 0
+        self.retried = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.rejected_open = 0
+        self.rejected_busy = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, url: str, **defaults: Any) -> "Upstream":
+        """Build an Upstream whose settings can be overridden by <PREFIX>_* env vars."""
+        kw: Dict[str, Any] = dict(defaults)
+        kw["timeout"] = _env_float(f"{prefix}_TIMEOUT", kw.get("timeout", 30.0))
+        kw["connect_timeout"] = _env_float(f"{prefix}_CONNECT_TIMEOUT", kw.get("connect_timeout", 2.0))
+        kw["retries"] = _env_int(f"{prefix}_RETRIES", kw.get("retries", 2))
+        kw["max_connections"] = _env_int(f"{prefix}_MAX_CONNECTIONS", kw.get("max_connections", 100))
+        kw["max_keepalive"] = _env_int(f"{prefix}_MAX_KEEPALIVE", kw.get("max_keepalive", 20))
+        kw["keepalive_expiry"] = _env_float(f"{prefix}_KEEPALIVE_EXPIRY", kw.get("keepalive_expiry", 30.0))
+        kw["http2"] = os.getenv(f"{prefix}_HTTP2", "1" if kw.get("http2") else "0") == "1"
+        kw["max_concurrent"] = _env_int(f"{prefix}_MAX_CONCURRENT", kw.get("max_concurrent", 64))
+        kw["breaker_failures"] = _env_int(f"{prefix}_BREAKER_FAILURES", kw.get("breaker_failures", 5))
+        kw["breaker_reset"] = _env_float(f"{prefix}_BREAKER_RESET", kw.get("breaker_reset", 15.0))
+        kw["hedge_after"] = _env_float(f"{prefix}_HEDGE_AFTER", kw.get("hedge_after", 0.0))
+        return cls(name, url, **kw)
+
+    async def start(self) -> None:
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                event_hooks=trace_hooks(),
+            )
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter": uniform(0, min(cap, base * 2^attempt))
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retryable(self, exc: Exception) -> bool:
+        if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+            return True
+        if isinstance(exc, (httpx.ReadError, httpx.ReadTimeout, httpx.RemoteProtocolError)):
+            return self.retry_on_read
+        return False
+
+    async def _send(self, json: Any, timeout: Optional[float], url: Optional[str] = None) -> httpx.Response:
+        """One logical request, retrying transient errors with jittered backoff."""
+        attempt = 0
+        while True:
+            try:
+                kwargs: Dict[str, Any] = {"json": json}
+                if timeout is not None:
+                    kwargs["timeout"] = timeout
+                with span(f"{self.name} POST", kind="client", attempt=attempt, url=url or self.url) as s:
+                    resp = await self.client.post(url or self.url, **kwargs)
+                    s.set_attribute("http.response.status_code", resp.status_code)
+                if resp.status_code in self.retry_statuses and attempt < self.retries:
+                    attempt += 1
+                    self.retried += 1
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+                return resp
+            except httpx.HTTPError as e:
+                if attempt < self.retries and self._retryable(e):
+                    attempt += 1
+                    self.retried += 1
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+                raise
+
+    async def _send_hedged(self, json: Any, timeout: Optional[float], url: Optional[str] = None) -> httpx.Response:
+        """Fire a second copy if the first is slow; the first good answer wins."""
+        first = asyncio.ensure_future(self._send(json, timeout, url))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        self.hedges += 1
+        annotate(hedged=True)
+        second = asyncio.ensure_future(self._send(json, timeout, url))
+        pending = {first, second}
+        last_exc: Optional[BaseException] = None
+        last_resp: Optional[httpx.Response] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is not None:
+                        last_exc = t.exception()
+                        continue
+                    resp = t.result()
+                    if resp.status_code < 500:
+                        if t is second:
+                            self.hedge_wins += 1
+                        return resp
+                    last_resp = resp
+            if last_resp is not None:
+                return last_resp
+            raise last_exc  # type: ignore[misc]
+        finally:
+            for t in pending:
+                t.cancel()
+
+    async def _admit(self) -> bool:
+        """
+        Shed load before sending: concurrency cap first, then the breaker.
+        -> True if this call is the breaker's half-open probe.
+        """
+        if self.client is None:
+            await self.start()
+        if self.in_flight >= self.max_concurrent:
+            self.rejected_busy += 1
+            raise UpstreamUnavailable(self.name, "overloaded", retry_after=1.0)
+        if not self.breaker.allow():
+            self.rejected_open += 1
+            raise UpstreamUnavailable(self.name, "circuit_open", retry_after=self.breaker.retry_after())
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        # allow() only leaves the breaker half-open when it admitted the probe
+        return self.breaker.state == "half_open"
+
+    async def post(self, json: Any, timeout: Optional[float] = None, hedge: bool = True,
+                   url: Optional[str] = None) -> httpx.Response:
+        """
+        POST to the upstream (or another `url` on the same service) through
+        the breaker and concurrency cap.
+        Raises UpstreamUnavailable without sending anything when the breaker
+        is open or the upstream already has `max_concurrent` calls in flight.
+        """
+        probe = await self._admit()
+        try:
+            if hedge and self.hedge_after > 0:
+                resp = await self._send_hedged(json, timeout, url)
+            else:
+                resp = await self._send(json, timeout, url)
+        except httpx.HTTPError:
+            self.failures += 1
+            self.breaker.record_failure(probe)
+            raise
+        except BaseException:
+            # cancelled by the caller: neither success nor failure
+            if probe:
+                self.breaker.release_probe()
+            raise
+        finally:
+            self.in_flight -= 1
+
+        if resp.status_code >= 500:
+            self.failures += 1
+            self.breaker.record_failure(probe)
+        else:
+            self.breaker.record_success()
+        return resp
+
+    @asynccontextmanager
+    async def stream(self, json: Any, url: Optional[str] = None) -> AsyncIterator[httpx.Response]:
+        """Streaming POST (no retries or hedging) under the same breaker and cap."""
+        probe = await self._admit()
+        recorded = False
+        try:
+            with span(f"{self.name} POST stream", kind="client", url=url or self.url) as s:
+                async with self.client.stream("POST", url or self.url, json=json) as resp:
+                    s.set_attribute("http.response.status_code", resp.status_code)
+                    recorded = True
+                    if resp.status_code >= 500:
+                        self.failures += 1
+                        self.breaker.record_failure(probe)
+                    else:
+                        self.breaker.record_success()
+                    yield resp
+        except httpx.HTTPError:
+            self.failures += 1
+            # once the status is recorded the probe's outcome is settled
+            self.breaker.record_failure(probe and not recorded)
+            raise
+        except BaseException:
+            if probe and not recorded:
+                self.breaker.release_probe()
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Best-effort view of the underlying httpcore connection pool."""
+        info: Dict[str, Any] = {"open": None, "idle": None, "active": None}
+        try:
+            pool = self.client._transport._pool  # httpcore.AsyncConnectionPool
+            conns = list(pool.connections)
+            info["open"] = len(conns)
+            info["idle"] = sum(1 for c in conns if c.is_idle())
+            info["active"] = info["open"] - info["idle"]
+        except Exception:
+            pass
+        return info
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "started": self.client is not None,
+            "requests": self.requests,
+            "retried": self.retried,
+            "failures": self.failures,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "max_concurrent": self.max_concurrent,
+            "rejected": {"circuit_open": self.rejected_open, "overloaded": self.rejected_busy},
+            "breaker": self.breaker.stats(),
+            "hedging": {"after": self.hedge_after, "fired": self.hedges, "won": self.hedge_wins},
+            "limits": {
+                "max_connections": self.limits.max_connections,
+                "max_keepalive": self.limits.max_keepalive_connections,
+                "keepalive_expiry": self.limits.keepalive_expiry,
+            },
+            "timeout": {"read": self.timeout.read, "connect": self.timeout.connect},
+            "pool": self.pool_stats(),
+            "checked_at": time.time(),
+        }
+
+
+def error_detail(e: httpx.HTTPError) -> str:
+    """Upstream body for HTTP status errors, the exception text otherwise."""
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.text
+    return str(e)
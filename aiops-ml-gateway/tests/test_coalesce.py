@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+import pytest
+
+from coalesce import SingleFlight, TTLCache, normalize_text, payload_key
+
+
+def test_concurrent_callers_share_one_call():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"n": len(calls)}
+
+    async def run():
+        sf = SingleFlight()
+        results = await asyncio.gather(*(sf.do("k", fetch) for _ in range(10)))
+        assert results == [{"n": 1}] * 10
+        assert len(calls) == 1
+        assert sf.stats() == {"leaders": 1, "coalesced": 9, "in_flight_keys": 0}
+
+    asyncio.run(run())
+
+
+def test_different_keys_do_not_coalesce():
+    async def run():
+        sf = SingleFlight()
+
+        async def value(v):
+            await asyncio.sleep(0.01)
+            return v
+
+        a, b = await asyncio.gather(sf.do("a", lambda: value(1)), sf.do("b", lambda: value(2)))
+        assert (a, b) == (1, 2)
+        assert sf.leaders == 2
+
+    asyncio.run(run())
+
+
+def test_key_is_released_after_the_call():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    async def run():
+        sf = SingleFlight()
+        assert await sf.do("k", fetch) == 1
+        assert await sf.do("k", fetch) == 2
+
+    asyncio.run(run())
+
+
+def test_errors_reach_every_waiter():
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        sf = SingleFlight()
+        results = await asyncio.gather(*(sf.do("k", boom) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert sf.stats()["in_flight_keys"] == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_call():
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        sf = SingleFlight()
+        first = asyncio.ensure_future(sf.do("k", fetch))
+        second = asyncio.ensure_future(sf.do("k", fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(run())
+
+
+def test_ttl_cache_expires_and_evicts_lru():
+    cache = TTLCache(ttl=0.05, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == (True, 1)  # a is now most recent
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    time.sleep(0.06)
+    assert cache.get("a") == (False, None)
+
+
+def test_ttl_zero_disables_cache():
+    cache = TTLCache(ttl=0)
+    cache.set("a", 1)
+    assert cache.get("a") == (False, None)
+
+
+def test_keys_ignore_whitespace_case_and_key_order():
+    assert normalize_text("  CPU   high\n") == normalize_text("cpu high")
+    assert payload_key("rag", {"a": 1, "b": 2}) == payload_key("rag", {"b": 2, "a": 1})
+    assert payload_key("rag", {"a": 1}) != payload_key("anomaly", {"a": 1})
@@ -0,0 +1,202 @@
+import asyncio
+
+import httpx
+import pytest
+
+from upstream import CircuitBreaker, Upstream, UpstreamUnavailable
+
+URL = "http://upstream.test/query"
+
+
+def make_upstream(handler, **kw) -> Upstream:
+    kw.setdefault("retries", 0)
+    up = Upstream("test", URL, **kw)
+    up.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return up
+
+
+def ok(_request):
+    return httpx.Response(200, json={"ok": True})
+
+
+def fail(_request):
+    return httpx.Response(503)
+
+
+# --- CircuitBreaker -------------------------------------------------------------
+
+def test_breaker_opens_after_threshold():
+    b = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        b.record_failure()
+    assert b.state == "closed" and b.allow()
+    b.record_failure()
+    assert b.state == "open"
+    assert not b.allow()
+    assert b.times_opened == 1
+
+
+def test_breaker_half_open_admits_one_probe():
+    b = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    b.record_failure()
+    assert b.allow()  # the probe
+    assert b.state == "half_open"
+    assert not b.allow()  # everyone else waits for its outcome
+    b.record_success()
+    assert b.state == "closed" and b.allow()
+
+
+def test_breaker_failed_probe_reopens():
+    b = CircuitBreaker(failure_threshold=5, reset_timeout=0)
+    for _ in range(5):
+        b.record_failure()
+    assert b.allow()
+    b.record_failure(probe=True)
+    assert b.state == "open"
+    assert not b.probe_in_flight
+
+
+def test_breaker_non_probe_failure_keeps_probe_in_flight():
+    b = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    b.record_failure()
+    assert b.allow()
+    # a call admitted before the breaker opened fails late: the probe is still out
+    b.record_failure(probe=False)
+    assert b.probe_in_flight
+
+
+def test_post_rejects_while_open_and_probe_closes():
+    async def run():
+        up = make_upstream(fail, breaker_failures=2, breaker_reset=60)
+        for _ in range(2):
+            assert (await up.post({})).status_code == 503
+        with pytest.raises(UpstreamUnavailable) as e:
+            await up.post({})
+        assert e.value.reason == "circuit_open"
+
+        up.breaker.reset_timeout = 0
+        up.client = httpx.AsyncClient(transport=httpx.MockTransport(ok))
+        assert (await up.post({})).status_code == 200
+        assert up.breaker.state == "closed"
+
+    asyncio.run(run())
+
+
+def test_cancelled_probe_releases_the_slot():
+    async def slow(_request):
+        await asyncio.sleep(1)
+        return httpx.Response(200)
+
+    async def run():
+        up = make_upstream(slow, breaker_failures=1, breaker_reset=0)
+        up.breaker.record_failure()
+        probe = asyncio.ensure_future(up.post({}))
+        await asyncio.sleep(0.05)
+        with pytest.raises(UpstreamUnavailable):
+            await up.post({})
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert not up.breaker.probe_in_flight
+        assert up.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_post_sheds_load_over_max_concurrent():
+    async def slow(_request):
+        await asyncio.sleep(0.2)
+        return httpx.Response(200)
+
+    async def run():
+        up = make_upstream(slow, max_concurrent=2)
+        calls = [asyncio.ensure_future(up.post({})) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(UpstreamUnavailable) as e:
+            await up.post({})
+        assert e.value.reason == "overloaded"
+        await asyncio.gather(*calls)
+        assert up.rejected_busy == 1 and up.in_flight == 0
+
+    asyncio.run(run())
+
+
+# --- hedging --------------------------------------------------------------------
+
+def test_hedge_fires_and_second_copy_wins():
+    seen = []
+
+    async def first_slow(_request):
+        seen.append(len(seen))
+        if len(seen) == 1:
+            await asyncio.sleep(1)
+            return httpx.Response(200, json={"copy": 1})
+        return httpx.Response(200, json={"copy": 2})
+
+    async def run():
+        up = make_upstream(first_slow, hedge_after=0.05)
+        resp = await up.post({})
+        assert resp.json() == {"copy": 2}
+        assert up.hedges == 1 and up.hedge_wins == 1
+
+    asyncio.run(run())
+
+
+def test_no_hedge_when_first_answers_in_time():
+    async def run():
+        up = make_upstream(ok, hedge_after=0.5)
+        assert (await up.post({})).status_code == 200
+        assert up.hedges == 0
+
+    asyncio.run(run())
+
+
+def test_hedge_disabled_per_call():
+    calls = []
+
+    async def slow(_request):
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return httpx.Response(200)
+
+    async def run():
+        up = make_upstream(slow, hedge_after=0.01)
+        await up.post({}, hedge=False)
+        assert len(calls) == 1 and up.hedges == 0
+
+    asyncio.run(run())
+
+
+# --- retries --------------------------------------------------------------------
+
+def test_read_timeouts_not_retried_when_disabled():
+    calls = []
+
+    def timeout(request):
+        calls.append(1)
+        raise httpx.ReadTimeout("slow", request=request)
+
+    async def run():
+        up = make_upstream(timeout, retries=2, retry_on_read=False)
+        with pytest.raises(httpx.ReadTimeout):
+            await up.post({})
+        assert len(calls) == 1
+
+    asyncio.run(run())
+
+
+def test_connect_errors_retried():
+    calls = []
+
+    def flaky(request):
+        calls.append(1)
+        if len(calls) < 3:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200)
+
+    async def run():
+        up = make_upstream(flaky, retries=2, backoff_base=0.001)
+        assert (await up.post({})).status_code == 200
+        assert up.retried == 2
+
+    asyncio.run(run())
@@ -0,0 +1,31 @@
+"""
+Retrieval confidence calibration. Haystack scales cosine similarity to
+[0, 1] ((cos + 1) / 2), so unrelated text sits around 0.5. The best score
+is mapped linearly from [RAG_SCORE_FLOOR, RAG_SCORE_CEIL] onto [0, 1].
+"""
+import os
+from typing import Any, Dict, List
+
+RAG_SCORE_FLOOR = float(os.getenv("RAG_SCORE_FLOOR", "0.55"))
+RAG_SCORE_CEIL = float(os.getenv("RAG_SCORE_CEIL", "0.85"))
+
+
+def retrieval_confidence(scores: List[float]) -> Dict[str, Any]:
+    """
+    Summary of the retrieval scores, computed once at query time:
+    max/mean score, gap between the top two hits, and `score`, the calibrated
+    0..1 confidence callers compare against their fallback threshold.
+    """
+    if not scores:
+        return {"score": 0.0, "max": 0.0, "mean": 0.0, "gap": 0.0, "n": 0}
+    ordered = sorted(scores, reverse=True)
+    top = ordered[0]
+    width = max(1e-6, RAG_SCORE_CEIL - RAG_SCORE_FLOOR)
+    calibrated = min(1.0, max(0.0, (top - RAG_SCORE_FLOOR) / width))
+    return {
+        "score": round(calibrated, 4),
+        "max": round(top, 4),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "gap": round(top - ordered[1], 4) if len(ordered) > 1 else round(top, 4),
+        "n": len(ordered),
+    }
@@ -7,7 +7,11 @@ from pydantic import BaseModel
 from haystack.document_stores import InMemoryDocumentStore
 from haystack.nodes import EmbeddingRetriever
 from haystack import Document
-from haystack.pipelines import DocumentSearchPipeline
+
+from confidence import retrieval_confidence
+from metrics import counter, gauge, histogram, instrument, timed
+from profiling import enable_profiling
+from tracing import setup_tracing, span
 
 
 KB_PATH = os.getenv("KB_PATH", "/app/kb")
@@ -27,7 +31,8 @@ retriever = EmbeddingRetriever(
     use_gpu=False,
 )
 
-search_pipeline = DocumentSearchPipeline(retriever)
+# hits per query; confidence.py calibrates the best one (RAG_SCORE_FLOOR/CEIL)
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "3"))
 
 
 def load_kb_from_disk() -> Dict[str, Any]:
@@ -62,7 +67,10 @@ def load_kb_from_disk() -> Dict[str, Any]:
     document_store.delete_documents()
     if docs:
         document_store.write_documents(docs)
-        document_store.update_embeddings(retriever)
+        with timed(INDEX_SECONDS), span("rag.index", documents=len(docs)):
+            document_store.update_embeddings(retriever)
+        EMBEDDED_DOCS.inc(len(docs))
+    KB_DOCUMENTS.set(document_store.get_document_count())
 
     return {
         "documents": document_store.get_document_count(),
@@ -70,11 +78,24 @@ def load_kb_from_disk() -> Dict[str, Any]:
     }
 
 
+# --- Metrics ------------------------------------------------------------------
+
+EMBEDDED_DOCS = counter("rag_documents_embedded_total", "KB documents embedded at (re)index time")
+INDEX_SECONDS = histogram("rag_index_seconds", "Full KB load + embedding time",
+                          buckets=(1, 5, 10, 30, 60, 120, 300, 600))
+RETRIEVE_SECONDS = histogram("rag_retrieve_seconds", "Query embedding + retrieval time")
+KB_DOCUMENTS = gauge("rag_kb_documents", "Documents currently in the store")
+TOP_SCORE = histogram("rag_top_score", "Best retriever score per query",
+                      buckets=(0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0))
+
+
 # --- FastAPI models -----------------------------------------------------------
 
 class QueryRequest(BaseModel):
     question: str
     context: Optional[Dict[str, Any]] = None
+    # compact: matches carry only source + score (no document contents)
+    compact: bool = False
 
 
 class ReindexResponse(BaseModel):
@@ -84,12 +105,16 @@ class ReindexResponse(BaseModel):
 
 class QueryResponse(BaseModel):
     answer: str
+    confidence: Dict[str, Any]
     debug: Dict[str, Any]
 
 
 # --- FastAPI app --------------------------------------------------------------
 
 app = FastAPI(title="AIOps RAG Service (Haystack)")
+instrument(app, "aiops-rag-service")
+setup_tracing("aiops-rag-service", app)
+enable_profiling(app)
 
 
 @app.on_event("startup")
@@ -121,11 +146,14 @@ def query(req: QueryRequest):
     RAG-style query over the KB using Haystack retriever.
     Same shape as before so aiops-ml-gateway + Rasa do not need changes.
     """
-    result = search_pipeline.run(
-        query=req.question,
-        params={"Retriever": {"top_k": 3}},
-    )
-    docs: List[Document] = result.get("documents", [])
+    # What DocumentSearchPipeline.run() does, split so each step is its own span
+    with timed(RETRIEVE_SECONDS):
+        with span("rag.embed_query"):
+            query_emb = retriever.embed_queries([req.question])[0]
+        with span("rag.retrieve", top_k=RAG_TOP_K):
+            docs: List[Document] = document_store.query_by_embedding(
+                query_emb=query_emb, top_k=RAG_TOP_K, scale_score=retriever.scale_score,
+            )
 
     matches: List[Dict[str, Any]] = []
     answer_lines: List[str] = []
@@ -153,22 +181,25 @@ def query(req: QueryRequest):
                     f"- From {src}: {snippet}"
                 )
 
-            matches.append(
-                {
-                    "source": d.meta.get("source", "unknown"),
-                    "score": score,
-                    "content": d.content,
-                }
-            )
+            match = {
+                "source": d.meta.get("source", "unknown"),
+                "score": score,
+            }
+            if not req.compact:
+                match["content"] = d.content
+            matches.append(match)
 
     if req.context:
         answer_lines.append(f"\n(Context: {req.context})")
 
     answer = "\n".join(answer_lines)
+    confidence = retrieval_confidence([m["score"] for m in matches if m["score"] is not None])
+    if confidence["n"]:
+        TOP_SCORE.observe(confidence["max"])
 
     debug: Dict[str, Any] = {
         "question": req.question,
         "context": req.context,
         "matches": matches,
     }
-    return QueryResponse(answer=answer, debug=debug)
+    return QueryResponse(answer=answer, confidence=confidence, debug=debug)
@@ -0,0 +1,38 @@
+import pytest
+
+import confidence
+from confidence import retrieval_confidence
+
+
+@pytest.fixture(autouse=True)
+def calibration(monkeypatch):
+    monkeypatch.setattr(confidence, "RAG_SCORE_FLOOR", 0.5)
+    monkeypatch.setattr(confidence, "RAG_SCORE_CEIL", 0.9)
+
+
+def test_no_matches_is_zero_confidence():
+    assert retrieval_confidence([]) == {"score": 0.0, "max": 0.0, "mean": 0.0, "gap": 0.0, "n": 0}
+
+
+def test_score_maps_floor_to_ceil_onto_0_1():
+    assert retrieval_confidence([0.5])["score"] == 0.0
+    assert retrieval_confidence([0.7])["score"] == pytest.approx(0.5)
+    assert retrieval_confidence([0.9])["score"] == 1.0
+
+
+def test_score_is_clamped():
+    assert retrieval_confidence([0.2])["score"] == 0.0
+    assert retrieval_confidence([0.99])["score"] == 1.0
+
+
+def test_summary_uses_the_best_hit_regardless_of_order():
+    c = retrieval_confidence([0.6, 0.8, 0.7])
+    assert c["max"] == 0.8
+    assert c["mean"] == pytest.approx(0.7)
+    assert c["gap"] == pytest.approx(0.1)
+    assert c["n"] == 3
+    assert c["score"] == pytest.approx(0.75)
+
+
+def test_single_hit_gap_is_its_score():
+    assert retrieval_confidence([0.8])["gap"] == 0.8
@@ -0,0 +1,70 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# ======================================================
+# SHARED MODULE DRIFT CHECK (READ-ONLY unless --sync)
+# Each service builds from its own directory, so the observability helpers
+# are copied into every service. This fails when any copy differs.
+#
+#   ./aiops_shared_modules_check.sh                 # check, exit 1 on drift
+#   ./aiops_shared_modules_check.sh --sync <file>   # copy <file> over its siblings
+# ======================================================
+
+cd "$(dirname "$0")"
+
+declare -A COPIES=(
+  [metrics.py]="
+    ai/orchestrator/metrics.py
+    aiops-anomaly-service/app/metrics.py
+    aiops-chatgpt-bridge/metrics.py
+    aiops-ml-gateway/app/metrics.py
+    aiops-rag-service/app/metrics.py
+    fastapi_service/app/metrics.py
+    ui/ui-gateway/metrics.py"
+  [tracing.py]="
+    ai/orchestrator/tracing.py
+    aiops-anomaly-service/app/tracing.py
+    aiops-chatgpt-bridge/tracing.py
+    aiops-ml-gateway/app/tracing.py
+    aiops-rag-service/app/tracing.py
+    bot/actions/tracing.py"
+  [profiling.py]="
+    ai/orchestrator/profiling.py
+    aiops-anomaly-service/app/profiling.py
+    aiops-chatgpt-bridge/profiling.py
+    aiops-rag-service/app/profiling.py"
+)
+
+ok()  { printf "\033[0;32m✅ %s\033[0m\n" "$*"; }
+bad() { printf "\033[0;31m❌ %s\033[0m\n" "$*"; FAIL=1; }
+
+if [[ "${1:-}" == "--sync" ]]; then
+  SRC="${2:?usage: $0 --sync <file>}"
+  NAME="$(basename "$SRC")"
+  [[ -n "${COPIES[$NAME]:-}" ]] || { echo "not a shared module: $SRC" >&2; exit 2; }
+  for f in ${COPIES[$NAME]}; do
+    [[ "$f" == "$SRC" ]] || cp "$SRC" "$f"
+  done
+  echo "synced $NAME from $SRC"
+fi
+
+FAIL=0
+for name in "${!COPIES[@]}"; do
+  # shellcheck disable=SC2206
+  files=(${COPIES[$name]})
+  ref="${files[0]}"
+  drift=0
+  for f in "${files[@]}"; do
+    if [[ ! -f "$f" ]]; then
+      bad "$name: missing copy $f"
+      drift=1
+    elif ! cmp -s "$ref" "$f"; then
+      bad "$name: $f differs from $ref"
+      diff -u "$ref" "$f" | head -n 20 || true
+      drift=1
+    fi
+  done
+  [[ $drift -eq 0 ]] && ok "$name: ${#files[@]} copies identical"
+done
+
+exit "$FAIL"
@@ -0,0 +1,343 @@
+"""
+Load-test / benchmark harness for the AIOps stack.
+
+Drives a fixed load against one or more scenarios, reports throughput and
+p50/p95/p99 latency per scenario, stores results (and baselines) as JSON and
+exits non-zero when a run regresses against a baseline.
+
+    python bench.py --scenarios score,query --concurrency 16 --duration 30
+    python bench.py --scenarios ingest --rate 200 --duration 60 --save-baseline ingest
+    python bench.py --scenarios ingest --rate 200 --duration 60 --baseline ingest --threshold 0.15
+
+Load models:
+    --concurrency N          closed loop: N workers, each sends its next
+                             request when the previous one returns
+    --rate R                 open loop: R requests/s on a fixed schedule (at
+                             most --concurrency in flight). Latency is
+                             measured from the scheduled start, so a stalled
+                             service is not hidden by the load generator
+                             slowing down with it (coordinated omission).
+
+Targets are the in-network service names by default (run it from the
+`bench` container in docker-compose.bench.yml); override with
+BENCH_<TARGET>_URL, e.g. BENCH_GATEWAY_URL=http://127.0.0.1:9000.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.getenv("BENCH_RESULTS_DIR", os.path.join(HERE, "results"))
+BASELINES_DIR = os.getenv("BENCH_BASELINES_DIR", os.path.join(HERE, "baselines"))
+
+TARGETS = {
+    "ingest": os.getenv("BENCH_INGEST_URL", "http://fastapi_heartbeat:80"),
+    "anomaly": os.getenv("BENCH_ANOMALY_URL", "http://aiops-anomaly-service:8100"),
+    "rag": os.getenv("BENCH_RAG_URL", "http://aiops-rag-service:8000"),
+    "gateway": os.getenv("BENCH_GATEWAY_URL", "http://aiops-ml-gateway:9000"),
+    "ui": os.getenv("BENCH_UI_URL", "http://192.168.206.136:8089"),
+}
+
+# --- Workload -----------------------------------------------------------------
+
+DEVICES = [f"of:{i:016x}" for i in range(1, 201)] + ["core1", "core2", "rb1", "rb2", "jd1", "edge1"]
+METRICS = ["cpu_usage", "mem_usage", "disk_usage", "latency_ms", "packet_loss"]
+QUESTIONS = [
+    "How do I troubleshoot high CPU on a core switch?",
+    "What does an ONOS device going offline mean?",
+    "How do I restart the anomaly service?",
+    "What is the runbook for packet loss on an edge link?",
+    "How are risk scores calculated?",
+    "Why is the RAG confidence low?",
+    "How do I check Zabbix agent status?",
+    "What should I do when memory usage stays above 90%?",
+]
+BATCH_SIZE = int(os.getenv("BENCH_BATCH_SIZE", "20"))
+
+
+def _reading(r: random.Random) -> Dict[str, Any]:
+    return {"device": r.choice(DEVICES), "metric": r.choice(METRICS), "value": round(r.uniform(5, 100), 1)}
+
+
+@dataclass
+class Scenario:
+    target: str
+    path: str
+    body: Callable[[random.Random], Dict[str, Any]]
+    timeout: float = 30.0
+    # for endpoints that report failures inside a 200 response
+    check: Optional[Callable[[Any], bool]] = None
+
+    @property
+    def url(self) -> str:
+        return TARGETS[self.target].rstrip("/") + self.path
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    # datalake ingest (fastapi_service -> Postgres)
+    "ingest": Scenario("ingest", "/ingest/onos_metrics", lambda r: {
+        "device_id": r.choice(DEVICES), "metric": r.choice(METRICS), "value": round(r.uniform(0, 100), 2),
+    }),
+    # anomaly brain, direct
+    "score": Scenario("anomaly", "/score", _reading),
+    "score_batch": Scenario("anomaly", "/score_batch", lambda r: {
+        "items": [_reading(r) for _ in range(BATCH_SIZE)],
+    }),
+    # RAG brain, direct
+    "query": Scenario("rag", "/query", lambda r: {"question": r.choice(QUESTIONS), "compact": True}),
+    # the same through the ML gateway (pooling, coalescing, caching)
+    "gateway_score": Scenario("gateway", "/ai/anomaly/score", _reading),
+    "gateway_rag": Scenario("gateway", "/ai/rag/query", lambda r: {
+        "question": r.choice(QUESTIONS), "compact": True,
+    }),
+    # gateway -> bridge -> LLM (the OpenAI stub in docker-compose.bench.yml)
+    "gateway_chat": Scenario("gateway", "/ai/chatgpt", lambda r: {
+        "message": f"{r.choice(QUESTIONS)} (#{r.randrange(10**6)})", "priority": "normal",
+    }, timeout=60.0, check=lambda d: isinstance(d, dict) and bool(d.get("answer"))),
+    # full chat path: ui-gateway -> Rasa -> actions -> gateway -> RAG / bridge
+    "ui_chat": Scenario("ui", "/ui-api/chat", lambda r: {
+        "message": r.choice(QUESTIONS), "sender": f"bench-{r.randrange(1000)}",
+    }, timeout=60.0),
+}
+
+
+# --- Measurement ----------------------------------------------------------------
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def ok(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+
+    def error(self, kind: str, seconds: float) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+        self.latencies.append(seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        lat = sorted(self.latencies)
+        n = len(lat)
+        errors = sum(self.errors.values())
+        elapsed = max(1e-9, (self.finished or time.perf_counter()) - (self.started or 0.0))
+
+        def pct(p: float) -> Optional[float]:
+            if not lat:
+                return None
+            # nearest-rank percentile
+            return round(lat[max(0, math.ceil(p / 100.0 * n) - 1)] * 1000, 2)
+
+        return {
+            "requests": n,
+            "errors": errors,
+            "error_rate": round(errors / n, 4) if n else 0.0,
+            "error_kinds": dict(self.errors),
+            "throughput_rps": round((n - errors) / elapsed, 2),
+            "latency_ms": {
+                "mean": round(sum(lat) / n * 1000, 2) if n else None,
+                "p50": pct(50),
+                "p95": pct(95),
+                "p99": pct(99),
+                "max": round(lat[-1] * 1000, 2) if lat else None,
+            },
+            "elapsed_s": round(elapsed, 2),
+        }
+
+
+async def _one(client: httpx.AsyncClient, sc: Scenario, body: Dict[str, Any],
+               rec: Recorder, t0: float, record: bool) -> None:
+    try:
+        resp = await client.post(sc.url, json=body, timeout=sc.timeout)
+        await resp.aread()
+        kind = None if resp.status_code < 400 else f"http_{resp.status_code}"
+        if kind is None and sc.check is not None and not sc.check(resp.json()):
+            kind = "bad_response"
+    except (httpx.HTTPError, ValueError) as e:
+        kind = type(e).__name__
+    if not record:
+        return
+    dt = time.perf_counter() - t0
+    if kind is None:
+        rec.ok(dt)
+    else:
+        rec.error(kind, dt)
+
+
+async def closed_loop(client: httpx.AsyncClient, sc: Scenario, rec: Recorder, rnd: random.Random,
+                      concurrency: int, duration: float, warmup: float) -> None:
+    start = time.perf_counter()
+    measure_from = start + warmup
+    deadline = measure_from + duration
+
+    async def worker() -> None:
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= deadline:
+                return
+            await _one(client, sc, sc.body(rnd), rec, t0, t0 >= measure_from)
+
+    rec.started = measure_from
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    rec.finished = time.perf_counter()
+
+
+async def open_loop(client: httpx.AsyncClient, sc: Scenario, rec: Recorder, rnd: random.Random,
+                    rate: float, max_in_flight: int, duration: float, warmup: float) -> None:
+    slots = asyncio.Semaphore(max_in_flight)
+    interval = 1.0 / rate
+    start = time.perf_counter()
+    measure_from = start + warmup
+    total = int((warmup + duration) * rate)
+    tasks = []
+
+    async def fire(scheduled: float, body: Dict[str, Any]) -> None:
+        # waiting for a free slot counts towards latency: the request was due at `scheduled`
+        async with slots:
+            await _one(client, sc, body, rec, scheduled, scheduled >= measure_from)
+
+    rec.started = measure_from
+    for i in range(total):
+        scheduled = start + i * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(fire(scheduled, sc.body(rnd))))
+    await asyncio.gather(*tasks)
+    rec.finished = time.perf_counter()
+
+
+async def run_scenario(name: str, args: argparse.Namespace) -> Dict[str, Any]:
+    sc = SCENARIOS[name]
+    rec = Recorder()
+    rnd = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(limits=limits) as client:
+        if args.rate:
+            await open_loop(client, sc, rec, rnd, args.rate, args.concurrency, args.duration, args.warmup)
+        else:
+            await closed_loop(client, sc, rec, rnd, args.concurrency, args.duration, args.warmup)
+    return {"url": sc.url, **rec.summary()}
+
+
+# --- Baselines ------------------------------------------------------------------
+
+def load_json(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_json(path: str, data: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+            min_delta_ms: float) -> List[str]:
+    """Regressions of `current` vs `baseline` (relative change beyond `threshold`)."""
+    problems: List[str] = []
+    if current["load"] != baseline.get("load"):
+        problems.append(f"load differs from baseline ({baseline.get('load')}); not comparable")
+        return problems
+    for name, cur in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        for p in ("p50", "p95", "p99"):
+            b, c = base["latency_ms"].get(p), cur["latency_ms"].get(p)
+            # tiny absolute changes on fast endpoints are noise, not regressions
+            if b and c and c > b * (1 + threshold) and c - b >= min_delta_ms:
+                problems.append(f"{name}: {p} {b:.1f} -> {c:.1f} ms (+{(c / b - 1) * 100:.0f}%)")
+        b, c = base["throughput_rps"], cur["throughput_rps"]
+        if b and c < b * (1 - threshold):
+            problems.append(f"{name}: throughput {b:.1f} -> {c:.1f} req/s ({(c / b - 1) * 100:.0f}%)")
+        b, c = base["error_rate"], cur["error_rate"]
+        if c > b + 0.01:
+            problems.append(f"{name}: error rate {b:.2%} -> {c:.2%}")
+    return problems
+
+
+def print_table(result: Dict[str, Any]) -> None:
+    print(f"{'scenario':<14} {'reqs':>7} {'err%':>6} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for name, s in result["scenarios"].items():
+        lat = s["latency_ms"]
+        cols = [lat[k] if lat[k] is not None else float("nan") for k in ("p50", "p95", "p99", "max")]
+        print(f"{name:<14} {s['requests']:>7} {s['error_rate'] * 100:>5.1f}% {s['throughput_rps']:>9.1f} "
+              + " ".join(f"{v:>9.1f}" for v in cols))
+        if s["error_kinds"]:
+            print("    errors: " + ", ".join(f"{k}={v}" for k, v in sorted(s["error_kinds"].items())))
+    print("(latencies in ms)")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scenarios", default="score,query", help=f"comma-separated: {','.join(SCENARIOS)}")
+    ap.add_argument("--concurrency", type=int, default=8, help="workers (closed loop) / max in flight (open loop)")
+    ap.add_argument("--rate", type=float, default=0.0, help="open-loop arrival rate in req/s (0: closed loop)")
+    ap.add_argument("--duration", type=float, default=30.0, help="measured seconds per scenario")
+    ap.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before each scenario")
+    ap.add_argument("--seed", type=int, default=42, help="payload RNG seed (same seed, same request sequence)")
+    ap.add_argument("--name", default="run", help="label stored with the result")
+    ap.add_argument("--save-baseline", metavar="NAME", help="store this run as baselines/NAME.json")
+    ap.add_argument("--baseline", metavar="NAME", help="compare against baselines/NAME.json")
+    ap.add_argument("--threshold", type=float, default=0.15, help="allowed relative regression (0.15 = 15%%)")
+    ap.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore latency changes smaller than this")
+    args = ap.parse_args()
+
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        ap.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    result: Dict[str, Any] = {
+        "name": args.name,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "load": {
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "duration": args.duration,
+            "seed": args.seed,
+        },
+        "scenarios": {},
+    }
+    for name in names:
+        print(f"[bench] {name}: {SCENARIOS[name].url}", flush=True)
+        result["scenarios"][name] = asyncio.run(run_scenario(name, args))
+
+    print_table(result)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    save_json(os.path.join(RESULTS_DIR, f"{stamp}-{args.name}.json"), result)
+
+    status = 0
+    if args.baseline:
+        path = os.path.join(BASELINES_DIR, f"{args.baseline}.json")
+        problems = compare(result, load_json(path), args.threshold, args.min_delta_ms)
+        if problems:
+            print(f"[bench] REGRESSION vs baseline '{args.baseline}':")
+            for p in problems:
+                print(f"  - {p}")
+            status = 1
+        else:
+            print(f"[bench] within {args.threshold:.0%} of baseline '{args.baseline}'")
+    if args.save_baseline:
+        save_json(os.path.join(BASELINES_DIR, f"{args.save_baseline}.json"), result)
+        print(f"[bench] baseline '{args.save_baseline}' saved")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,330 @@
+"""
+Micro-benchmarks for the stack's hot functions, run in-process against the
+real service code (no HTTP, no load generator).
+
+    python micro.py --list
+    python micro.py 'anomaly.*' bridge.build_messages
+    python micro.py --save-baseline micro-lab
+    python micro.py --baseline micro-lab --threshold 0.2
+    python micro.py rag.query --profile                 # cProfile top functions per benchmark
+    python micro.py rag.query --profile-dir /tmp/prof   # + .prof files for snakeviz / pstats
+
+Each benchmark imports its service module from the repo (BENCH_REPO, default
+the parent of this directory), so run it where that service's dependencies
+are installed, e.g. inside its image:
+
+    docker run --rm -v "$PWD":/repo -w /repo/bench aiops-stack-aiops-anomaly-service python micro.py 'anomaly.*'
+
+Benchmarks whose dependencies (or database) are missing are reported as
+skipped, not failed. For live services use GET /debug/profile (profiling.py).
+"""
+import argparse
+import cProfile
+import fnmatch
+import importlib.util
+import io
+import math
+import os
+import pstats
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bench import BASELINES_DIR, QUESTIONS, RESULTS_DIR, load_json, save_json
+
+REPO = os.getenv("BENCH_REPO", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+KB_DOCS = int(os.getenv("BENCH_KB_DOCS", "50"))
+
+
+class Skip(Exception):
+    pass
+
+
+# setup() -> (fn, calls): fn() performs `calls` calls of the function under test
+BENCHMARKS: Dict[str, Callable[[], Tuple[Callable[[], Any], int]]] = {}
+
+
+def benchmark(name: str):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def load_service(name: str, path: str, module: str) -> Any:
+    """Import <repo>/<path>/<module>.py under a private name, with its directory on sys.path."""
+    key = f"svc_{name}"
+    if key in sys.modules:
+        return sys.modules[key]
+    directory = os.path.join(REPO, path)
+    sys.path.insert(0, directory)
+    spec = importlib.util.spec_from_file_location(key, os.path.join(directory, f"{module}.py"))
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[key] = mod
+    try:
+        spec.loader.exec_module(mod)
+    except BaseException:
+        del sys.modules[key]
+        raise
+    return mod
+
+
+def _text(r: random.Random, words: int) -> str:
+    vocab = ("interface link latency packet loss restart check runbook switch core controller "
+             "threshold alert metric cpu memory disk queue flow port device onos zabbix").split()
+    lines = []
+    for _ in range(max(1, words // 12)):
+        lines.append(" ".join(r.choice(vocab) for _ in range(12)) + ".")
+    return "\n\n".join("\n".join(lines[i:i + 6]) for i in range(0, len(lines), 6))
+
+
+# --- anomaly service --------------------------------------------------------------
+
+def _anomaly(trained: bool) -> Any:
+    svc = load_service("anomaly", "aiops-anomaly-service/app", "main")
+    if trained and svc._model is None:
+        import numpy as np
+        from sklearn.ensemble import IsolationForest
+        # same synthetic data as /train_dummy_model
+        X = np.vstack([np.random.normal(45.0, 10.0, (500, 1)), np.random.normal(95.0, 3.0, (20, 1))])
+        svc._model = IsolationForest(contamination=0.05, random_state=42).fit(X)
+    return svc
+
+
+@benchmark("anomaly.heuristic_risk")
+def _heuristic_risk():
+    svc = _anomaly(trained=False)
+    devices = [f"of:{i:016x}" for i in range(100)] + ["core1", "rb2", "jd3"]
+
+    def run():
+        for d in devices:
+            svc.heuristic_risk(d, "cpu_usage")
+    return run, len(devices)
+
+
+@benchmark("anomaly.score")
+def _score():
+    svc = _anomaly(trained=True)
+    payload = svc.ScorePayload(device="core1", metric="cpu_usage", value=93.5)
+    return (lambda: svc.score_items([payload])), 1
+
+
+@benchmark("anomaly.score_batch100")
+def _score_batch():
+    svc = _anomaly(trained=True)
+    r = random.Random(1)
+    items = [svc.ScorePayload(device=f"dev{i}", value=r.uniform(5, 100) if i % 4 else None) for i in range(100)]
+    return (lambda: svc.score_items(items)), 100
+
+
+# --- RAG service ------------------------------------------------------------------
+
+_kb_dir: Optional[str] = None
+
+
+def _rag() -> Any:
+    global _kb_dir
+    if _kb_dir is None:
+        _kb_dir = tempfile.mkdtemp(prefix="bench-kb-")
+        r = random.Random(2)
+        for i in range(KB_DOCS):
+            with open(os.path.join(_kb_dir, f"doc{i:03d}.md"), "w", encoding="utf-8") as f:
+                f.write(_text(r, 400))
+        os.environ["KB_PATH"] = _kb_dir  # read when the service module is imported
+    return load_service("rag", "aiops-rag-service/app", "main")
+
+
+@benchmark("rag.load_kb_from_disk")
+def _load_kb():
+    svc = _rag()
+    return svc.load_kb_from_disk, 1
+
+
+@benchmark("rag.query")
+def _rag_query():
+    svc = _rag()
+    if svc.document_store.get_document_count() == 0:
+        svc.load_kb_from_disk()
+    reqs = [svc.QueryRequest(question=q, compact=True) for q in QUESTIONS]
+
+    def run():
+        for req in reqs:
+            svc.query(req)
+    return run, len(reqs)
+
+
+# --- embedder (ingest.py) -----------------------------------------------------------
+
+@benchmark("embedder.chunk_rows")
+def _chunk_rows():
+    ingest = load_service("embedder", "ai/embedder", "ingest")
+    emb = ingest.TextEmbedding(model_name=ingest.MODEL_ID)
+    splitter = ingest.make_splitter()
+    raw = _text(random.Random(3), 3000)  # ~20 KB, about ten chunks
+    return (lambda: ingest.chunk_rows(emb, splitter, "bench", "runbooks", "runbooks/bench.md", raw)), 1
+
+
+# --- orchestrator -------------------------------------------------------------------
+
+@benchmark("orchestrator.embed_query")
+def _orch_embed():
+    svc = load_service("orchestrator", "ai/orchestrator", "app")
+    svc.embed(["warm up"])
+    return (lambda: svc.embed([QUESTIONS[0]])), 1
+
+
+@benchmark("orchestrator.search")
+def _orch_search():
+    svc = load_service("orchestrator", "ai/orchestrator", "app")
+    try:
+        conn = svc.connect()
+    except Exception as e:  # needs the pgvector database (POSTGRES_HOST etc.)
+        raise Skip(f"no database: {e}".splitlines()[0])
+    k = svc.TOPK
+
+    def run():
+        for q in QUESTIONS:
+            svc.search(conn, q, k)
+    return run, len(QUESTIONS)
+
+
+# --- ChatGPT bridge -----------------------------------------------------------------
+
+@benchmark("bridge.build_messages")
+def _build_messages():
+    os.environ.setdefault("OPENAI_API_KEY", "bench")  # the module refuses to import without one
+    svc = load_service("bridge", "aiops-chatgpt-bridge", "main")
+    r = random.Random(4)
+    store = svc.ConversationStore(max_conversations=10, max_turns=svc.BRIDGE_MEMORY_TURNS,
+                                  summary_tokens=svc.BRIDGE_MEMORY_SUMMARY_TOKENS)
+    for _ in range(svc.BRIDGE_MEMORY_TURNS * 2):  # enough to roll older turns into the summary
+        store.append("bench", _text(r, 40), _text(r, 150))
+    conv = store.get("bench")
+    context = _text(r, 800)
+    question = "Why is core1 dropping packets on port 3 since the last restart?"
+    return (lambda: svc.build_messages(None, question, context, conv)), 1
+
+
+# --- runner -------------------------------------------------------------------------
+
+def measure(fn: Callable[[], Any], calls: int, min_time: float, max_iter: int,
+            warmup: int, profiler: Optional[cProfile.Profile]) -> Dict[str, Any]:
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    end = time.perf_counter() + min_time
+    if profiler is not None:
+        profiler.enable()
+    try:
+        while len(samples) < max_iter and (time.perf_counter() < end or len(samples) < 5):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) / calls)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        "iterations": len(samples),
+        "calls_per_iteration": calls,
+        "us": {
+            "min": round(samples[0] * 1e6, 2),
+            "median": round(median * 1e6, 2),
+            "mean": round(statistics.fmean(samples) * 1e6, 2),
+            "p95": round(samples[max(0, math.ceil(0.95 * len(samples)) - 1)] * 1e6, 2),
+        },
+        "ops_per_s": round(1.0 / median, 1) if median > 0 else None,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    problems = []
+    for name, cur in current["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base or "us" not in base or "us" not in cur:
+            continue
+        for stat in ("median", "p95"):
+            b, c = base["us"][stat], cur["us"][stat]
+            if b and c > b * (1 + threshold):
+                problems.append(f"{name}: {stat} {b:.1f} -> {c:.1f} us (+{(c / b - 1) * 100:.0f}%)")
+    return problems
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("patterns", nargs="*", default=["*"], help="benchmark names or globs (default: all)")
+    ap.add_argument("--list", action="store_true", help="list benchmarks and exit")
+    ap.add_argument("--min-time", type=float, default=2.0, help="measured seconds per benchmark (at least 5 iterations)")
+    ap.add_argument("--max-iter", type=int, default=10000)
+    ap.add_argument("--warmup", type=int, default=2, help="unmeasured iterations first")
+    ap.add_argument("--profile", action="store_true", help="cProfile the measured loop and print the top functions")
+    ap.add_argument("--profile-top", type=int, default=15)
+    ap.add_argument("--profile-dir", help="also write <benchmark>.prof files here")
+    ap.add_argument("--save-baseline", metavar="NAME", help="store this run as baselines/NAME.json")
+    ap.add_argument("--baseline", metavar="NAME", help="compare against baselines/NAME.json")
+    ap.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown (0.2 = 20%%)")
+    args = ap.parse_args()
+
+    if args.save_baseline and (args.profile or args.profile_dir):
+        ap.error("profiled timings include cProfile overhead; save baselines without --profile")
+    if args.list:
+        for name in BENCHMARKS:
+            print(name)
+        return 0
+    names = [n for n in BENCHMARKS if any(fnmatch.fnmatch(n, p) for p in args.patterns)]
+    if not names:
+        ap.error("no benchmark matches " + " ".join(args.patterns))
+
+    result: Dict[str, Any] = {"kind": "micro", "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                              "python": sys.version.split()[0], "benchmarks": {}}
+    print(f"{'benchmark':<28} {'iters':>7} {'median':>12} {'p95':>12} {'ops/s':>12}")
+    for name in names:
+        try:
+            fn, calls = BENCHMARKS[name]()
+        except (ImportError, Skip) as e:
+            reason = f"missing module {e.name}" if isinstance(e, ImportError) and e.name else str(e)
+            result["benchmarks"][name] = {"skipped": reason}
+            print(f"{name:<28} skipped: {reason}")
+            continue
+        profiler = cProfile.Profile() if (args.profile or args.profile_dir) else None
+        stats = measure(fn, calls, args.min_time, args.max_iter, args.warmup, profiler)
+        result["benchmarks"][name] = stats
+        us = stats["us"]
+        print(f"{name:<28} {stats['iterations']:>7} {us['median']:>10.1f}us {us['p95']:>10.1f}us "
+              f"{stats['ops_per_s'] or 0:>12.1f}", flush=True)
+        if profiler is not None:
+            if args.profile_dir:
+                os.makedirs(args.profile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(args.profile_dir, f"{name}.prof"))
+            if args.profile:
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(args.profile_top)
+                print(out.getvalue())
+
+    if _kb_dir is not None:
+        shutil.rmtree(_kb_dir, ignore_errors=True)
+    save_json(os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-micro.json"), result)
+
+    status = 0
+    if args.baseline:
+        problems = compare(result, load_json(os.path.join(BASELINES_DIR, f"{args.baseline}.json")), args.threshold)
+        if problems:
+            print(f"[micro] REGRESSION vs baseline '{args.baseline}':")
+            for p in problems:
+                print(f"  - {p}")
+            status = 1
+        else:
+            print(f"[micro] within {args.threshold:.0%} of baseline '{args.baseline}'")
+    if args.save_baseline:
+        save_json(os.path.join(BASELINES_DIR, f"{args.save_baseline}.json"), result)
+        print(f"[micro] baseline '{args.save_baseline}' saved")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Local stand-ins for the external systems the stack talks to, so benchmarks
+are reproducible and cost nothing:
+
+    uvicorn stubs:onos_app   --port 8181    ONOS REST (/onos/v1/devices, /onos/v1/statistics/ports)
+    uvicorn stubs:openai_app --port 8300    OpenAI (/v1/chat/completions, /v1/embeddings)
+    uvicorn stubs:zabbix_app --port 8310    Zabbix JSON-RPC (/api_jsonrpc.php: host/item/history/trend.get)
+
+Point the services at them, e.g. OPENAI_BASE_URL=http://bench-openai-stub:8300/v1
+for the ChatGPT bridge and ONOS_URL=http://bench-onos-stub:8181/onos/v1/devices
+for the ONOS collector, ZABBIX_URL=http://bench-zabbix-stub:8310/api_jsonrpc.php
+for the Zabbix collector. Postgres-compatible storage is a throwaway postgres
+container (see docker-compose.bench.yml).
+
+Latency is simulated with asyncio.sleep, so one stub process easily outpaces
+the services under test:
+    STUB_LATENCY_MS        fixed delay per request (default 0 for ONOS, 300 for OpenAI)
+    STUB_JITTER_MS         + uniform(0, jitter) (default 0)
+    STUB_TOKENS_PER_SEC    OpenAI completion speed (default 200; streams pace chunks by it)
+    STUB_COMPLETION_TOKENS completion length in tokens (default 120)
+    STUB_ONOS_DEVICES      devices reported by ONOS (default 200)
+    STUB_ZABBIX_HOSTS      Zabbix hosts (default 1000), each with the items in ZABBIX_ITEMS
+    STUB_ZABBIX_DELAY      seconds between history values of an item (default 60)
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+JITTER_MS = _env_float("STUB_JITTER_MS", 0)
+TOKENS_PER_SEC = _env_float("STUB_TOKENS_PER_SEC", 200)
+COMPLETION_TOKENS = int(os.getenv("STUB_COMPLETION_TOKENS", "120"))
+ONOS_DEVICES = int(os.getenv("STUB_ONOS_DEVICES", "200"))
+ZABBIX_HOSTS = int(os.getenv("STUB_ZABBIX_HOSTS", "1000"))
+ZABBIX_DELAY = int(os.getenv("STUB_ZABBIX_DELAY", "60"))
+EMBED_DIM = 256
+
+
+async def _delay(default_ms: float) -> None:
+    ms = _env_float("STUB_LATENCY_MS", default_ms) + random.uniform(0, JITTER_MS)
+    if ms > 0:
+        await asyncio.sleep(ms / 1000.0)
+
+
+# --- ONOS ---------------------------------------------------------------------
+
+onos_app = FastAPI(title="ONOS stub")
+
+
+def _device_id(i: int) -> str:
+    return f"of:{i:016x}"
+
+
+@onos_app.get("/onos/v1/devices")
+async def onos_devices() -> Dict[str, Any]:
+    await _delay(0)
+    return {"devices": [
+        {"id": _device_id(i), "type": "SWITCH", "available": i % 50 != 0, "role": "MASTER",
+         "mfr": "Nicira, Inc.", "hw": "Open vSwitch", "sw": "2.13.8", "chassisId": f"{i:x}"}
+        for i in range(1, ONOS_DEVICES + 1)
+    ]}
+
+
+@onos_app.get("/onos/v1/statistics/ports")
+async def onos_port_stats() -> Dict[str, Any]:
+    await _delay(0)
+    now = int(time.time())
+    return {"statistics": [
+        {"device": _device_id(i), "ports": [
+            {"port": p, "packetsReceived": (now * (i + p)) % 10**9, "packetsSent": (now * (i + 2 * p)) % 10**9,
+             "bytesReceived": (now * 1500 * (i + p)) % 10**12, "bytesSent": (now * 1400 * (i + p)) % 10**12,
+             "packetsRxDropped": (now + i + p) % 7, "packetsTxDropped": 0, "durationSec": now % 86400}
+            for p in range(1, 5)
+        ]}
+        for i in range(1, ONOS_DEVICES + 1)
+    ]}
+
+
+@onos_app.get("/health")
+async def onos_health() -> Dict[str, str]:
+    return {"status": "ok", "service": "onos-stub"}
+
+
+# --- OpenAI -------------------------------------------------------------------
+
+openai_app = FastAPI(title="OpenAI stub")
+
+WORDS = ("the device interface link latency packet loss restart check runbook switch core "
+         "controller threshold alert metric cpu memory disk queue flow port").split()
+
+
+def _prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    # ~4 characters per token, like the bridge's own estimate
+    return sum(len(str(m.get("content") or "")) // 4 + 4 for m in messages)
+
+
+def _completion(n: int, seed: str) -> List[str]:
+    r = random.Random(seed)
+    return [r.choice(WORDS) + " " for _ in range(n)]
+
+
+def _usage(prompt: int, completion: int) -> Dict[str, int]:
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+@openai_app.post("/v1/chat/completions")
+async def chat_completions(body: Dict[str, Any]):
+    messages = body.get("messages") or []
+    model = body.get("model") or "stub"
+    prompt = _prompt_tokens(messages)
+    tokens = _completion(COMPLETION_TOKENS, json.dumps(messages, sort_keys=True))
+    created = int(time.time())
+    cid = "chatcmpl-stub-" + hashlib.sha1(str(random.random()).encode()).hexdigest()[:12]
+
+    if not body.get("stream"):
+        await _delay(300)
+        await asyncio.sleep(len(tokens) / TOKENS_PER_SEC)
+        return {
+            "id": cid, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "".join(tokens).strip()}}],
+            "usage": _usage(prompt, len(tokens)),
+        }
+
+    async def events() -> AsyncIterator[str]:
+        def chunk(delta: Dict[str, Any], finish: Any = None, usage: Any = None) -> str:
+            data = {"id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if delta is not None else []}
+            if usage is not None:
+                data["usage"] = usage
+            return f"data: {json.dumps(data)}\n\n"
+
+        await _delay(300)  # time to first token
+        yield chunk({"role": "assistant", "content": ""})
+        per_chunk = 4
+        for i in range(0, len(tokens), per_chunk):
+            await asyncio.sleep(per_chunk / TOKENS_PER_SEC)
+            yield chunk({"content": "".join(tokens[i:i + per_chunk])})
+        yield chunk({}, finish="stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield chunk(None, usage=_usage(prompt, len(tokens)))
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _embedding(text: str) -> List[float]:
+    # deterministic unit vector: the same text always embeds the same way
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    r = random.Random(digest)
+    v = [r.gauss(0.0, 1.0) for _ in range(EMBED_DIM)]
+    norm = math.sqrt(sum(x * x for x in v)) or 1.0
+    return [x / norm for x in v]
+
+
+@openai_app.post("/v1/embeddings")
+async def embeddings(body: Dict[str, Any]) -> Dict[str, Any]:
+    await _delay(30)
+    inputs = body.get("input")
+    texts = inputs if isinstance(inputs, list) else [inputs]
+    return {
+        "object": "list",
+        "model": body.get("model") or "stub-embedding",
+        "data": [{"object": "embedding", "index": i, "embedding": _embedding(str(t))}
+                 for i, t in enumerate(texts)],
+        "usage": {"prompt_tokens": sum(len(str(t)) // 4 for t in texts),
+                  "total_tokens": sum(len(str(t)) // 4 for t in texts)},
+    }
+
+
+@openai_app.get("/health")
+async def openai_health() -> Dict[str, str]:
+    return {"status": "ok", "service": "openai-stub"}
+
+
+# --- Zabbix -------------------------------------------------------------------
+
+zabbix_app = FastAPI(title="Zabbix JSON-RPC stub")
+
+# (key_, value_type) on every host; value_type 0 float, 1 char, 3 unsigned
+ZABBIX_ITEMS = [
+    ("system.cpu.util", 0),
+    ("vm.memory.utilization", 0),
+    ("net.if.in[eth0]", 3),
+    ("net.if.out[eth0]", 3),
+    ("agent.version", 1),
+]
+_ITEM_BASE = 100000
+
+
+def _zbx_item(itemid: int) -> Any:
+    """itemid -> (host index, key_, value_type), or None if unknown."""
+    n = itemid - _ITEM_BASE
+    host, j = divmod(n, len(ZABBIX_ITEMS))
+    if n < 0 or host >= ZABBIX_HOSTS:
+        return None
+    return (host,) + ZABBIX_ITEMS[j]
+
+
+def _zbx_value(itemid: int, clock: int, value_type: int) -> str:
+    if value_type == 1:
+        return "6.0.30"
+    x = (itemid * 2654435761 + clock * 40503) % 10007 / 10007.0
+    return f"{x * 100:.4f}" if value_type == 0 else str(int(x * 10**9))
+
+
+def _ids(value: Any) -> List[int]:
+    if value is None:
+        return []
+    return [int(v) for v in (value if isinstance(value, list) else [value])]
+
+
+def _history(params: Dict[str, Any]) -> List[Dict[str, str]]:
+    value_type = int(params.get("history", 3))
+    now = int(time.time())
+    start = int(params.get("time_from", now - ZABBIX_DELAY))
+    end = min(int(params.get("time_till", now)), now)
+    limit = int(params.get("limit") or 0)
+    first = -(-start // ZABBIX_DELAY) * ZABBIX_DELAY
+    rows = []
+    for itemid in _ids(params.get("itemids")):
+        item = _zbx_item(itemid)
+        if item is None or item[2] != value_type:
+            continue
+        for clock in range(first, end + 1, ZABBIX_DELAY):
+            rows.append({"itemid": str(itemid), "clock": str(clock), "ns": "0",
+                         "value": _zbx_value(itemid, clock, value_type)})
+    if params.get("sortfield") == "clock":
+        rows.sort(key=lambda r: int(r["clock"]), reverse=params.get("sortorder") == "DESC")
+    return rows[:limit] if limit else rows
+
+
+def _trends(params: Dict[str, Any]) -> List[Dict[str, str]]:
+    now = int(time.time())
+    start = int(params.get("time_from", now - 3600))
+    end = min(int(params.get("time_till", now)), now - 3600)  # only completed hours
+    rows = []
+    for itemid in _ids(params.get("itemids")):
+        item = _zbx_item(itemid)
+        if item is None or item[2] == 1:
+            continue
+        for clock in range(-(-start // 3600) * 3600, end + 1, 3600):
+            values = [float(_zbx_value(itemid, c, item[2])) for c in range(clock, clock + 3600, ZABBIX_DELAY)]
+            rows.append({"itemid": str(itemid), "clock": str(clock), "num": str(len(values)),
+                         "value_min": f"{min(values):.4f}", "value_avg": f"{sum(values) / len(values):.4f}",
+                         "value_max": f"{max(values):.4f}"})
+    return rows
+
+
+def _zbx_call(method: str, params: Dict[str, Any]) -> Any:
+    if method == "apiinfo.version":
+        return "6.0.30"
+    if method == "user.login":
+        return "stub-session-" + hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+    if method == "host.get":
+        wanted = set(_ids(params.get("hostids")))
+        return [{"hostid": str(10000 + i), "host": f"zbx-host-{i:04d}"}
+                for i in range(ZABBIX_HOSTS) if not wanted or 10000 + i in wanted]
+    if method == "item.get":
+        hosts = _ids(params.get("hostids")) or [10000 + i for i in range(ZABBIX_HOSTS)]
+        items = []
+        for hostid in hosts:
+            i = hostid - 10000
+            if not 0 <= i < ZABBIX_HOSTS:
+                continue
+            for j, (key, value_type) in enumerate(ZABBIX_ITEMS):
+                item = {"itemid": str(_ITEM_BASE + i * len(ZABBIX_ITEMS) + j), "hostid": str(hostid),
+                        "key_": key, "value_type": str(value_type)}
+                if "selectHosts" in params:
+                    item["hosts"] = [{"hostid": str(hostid), "host": f"zbx-host-{i:04d}"}]
+                items.append(item)
+        return items
+    if method == "history.get":
+        return _history(params)
+    if method == "trend.get":
+        return _trends(params)
+    raise KeyError(method)
+
+
+@zabbix_app.post("/api_jsonrpc.php")
+async def zabbix_rpc(request: Request) -> Dict[str, Any]:
+    body = await request.json()
+    await _delay(0)
+    rid = body.get("id")
+    method = body.get("method", "")
+    authed = body.get("auth") or request.headers.get("authorization", "").startswith("Bearer ")
+    if method not in ("apiinfo.version", "user.login") and not authed:
+        return {"jsonrpc": "2.0", "id": rid,
+                "error": {"code": -32602, "message": "Invalid params.", "data": "Not authorized."}}
+    try:
+        result = _zbx_call(method, body.get("params") or {})
+    except KeyError:
+        return {"jsonrpc": "2.0", "id": rid,
+                "error": {"code": -32601, "message": "Method not found.", "data": f"Incorrect method \"{method}\"."}}
+    return {"jsonrpc": "2.0", "id": rid, "result": result}
+
+
+@zabbix_app.get("/health")
+async def zabbix_health() -> Dict[str, str]:
+    return {"status": "ok", "service": "zabbix-stub"}
@@ -1,20 +1,95 @@
 from typing import Any, Text, Dict, List, Optional
+import asyncio
 import os
-import requests
+
+import httpx
 
 from rasa_sdk import Action, Tracker
 from rasa_sdk.executor import CollectingDispatcher
 
-# --- ChatGPT fallback (requests-based, no httpx) ---
+from .extraction import extract_metric_readings, extract_time_window, first_value
+from .tracing import annotate, setup_tracing, span, trace_hooks
+
 CHATGPT_FALLBACK_THRESHOLD = float(os.getenv("CHATGPT_FALLBACK_THRESHOLD", "0.70"))
 ML_GATEWAY_URL = os.getenv("ML_GATEWAY_URL", "http://aiops-ml-gateway:9000")
 CHATGPT_PROXY_URL = os.getenv("CHATGPT_PROXY_URL", f"{ML_GATEWAY_URL}/ai/chatgpt")
 CHATGPT_TIMEOUT = float(os.getenv("CHATGPT_TIMEOUT", "25"))
 
-def _call_chatgpt_via_gateway_sync(message: str, context: str = "", conversation_id: str | None = None):
-    payload = {"message": message, "context": context, "conversation_id": conversation_id}
+# URL of the ML gateway inside the Docker network
+AIOPS_ML_GATEWAY_URL = os.getenv(
+    "AIOPS_ML_GATEWAY_URL",
+    "http://aiops-ml-gateway:9000",
+)
+
+# Per-call deadlines (seconds)
+RAG_TIMEOUT = float(os.getenv("RAG_TIMEOUT", "15"))
+# Start the ChatGPT fallback in parallel once RAG has been silent this long
+RAG_SPECULATIVE_AFTER = float(os.getenv("RAG_SPECULATIVE_AFTER", "3"))
+ANOMALY_TIMEOUT = float(os.getenv("ANOMALY_TIMEOUT", "15"))
+
+# Every action call starts a trace (TRACE_SAMPLE_RATIO decides which are
+# recorded); the gateway and the brains behind it continue it.
+setup_tracing("rasa-actions")
+
+# --- Shared async HTTP client -------------------------------------------------
+# One keep-alive pool for every action call to the gateway. The action server
+# runs all actions on one event loop, so slow calls no longer block each other.
+HTTP_MAX_CONNECTIONS = int(os.getenv("ACTIONS_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("ACTIONS_HTTP_MAX_KEEPALIVE", "20"))
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def http_client() -> httpx.AsyncClient:
+    """Lazily create the shared client on the action server's event loop."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(CHATGPT_TIMEOUT, connect=3.0),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=30.0,
+            ),
+            event_hooks=trace_hooks(),
+        )
+        _client_loop = loop
+    return _client
+
+
+async def post_with_deadline(url: str, payload: Dict[str, Any], deadline: float) -> httpx.Response:
+    """POST on the shared client; `deadline` bounds the whole call, not each read."""
+    with span(f"POST {httpx.URL(url).path}", kind="client", url=url, deadline=deadline) as s:
+        resp = await asyncio.wait_for(http_client().post(url, json=payload, timeout=deadline), deadline)
+        s.set_attribute("http.response.status_code", resp.status_code)
+    return resp
+
+
+LLM_PRIORITIES = ("high", "normal", "low")
+
+
+def llm_priority(tracker: Tracker) -> str:
+    """
+    Bridge queue priority for this turn. The channel can set it in the message
+    metadata (the portal sends "normal"); otherwise a conversation about an
+    alert or a device is incident work and goes first.
+    """
+    metadata = tracker.latest_message.get("metadata") or {}
+    priority = metadata.get("priority") if isinstance(metadata, dict) else None
+    if priority in LLM_PRIORITIES:
+        return priority
+    if tracker.get_slot("alert_id") or tracker.get_slot("device_name"):
+        return "high"
+    return "normal"
+
+
+async def _call_chatgpt_via_gateway(message: str, context: str = "", conversation_id: str | None = None,
+                                    priority: str = "normal"):
+    payload = {"message": message, "context": context, "conversation_id": conversation_id, "priority": priority}
     try:
-        r = requests.post(CHATGPT_PROXY_URL, json=payload, timeout=CHATGPT_TIMEOUT)
+        r = await post_with_deadline(CHATGPT_PROXY_URL, payload, CHATGPT_TIMEOUT)
         # ml-gateway returns json even on errors
         try:
             data = r.json()
@@ -30,34 +105,137 @@ def _call_chatgpt_via_gateway_sync(message: str, context: str = "", conversation
         return None
 
 
-# URL of the ML gateway inside the Docker network
-AIOPS_ML_GATEWAY_URL = os.getenv(
-    "AIOPS_ML_GATEWAY_URL",
-    "http://aiops-ml-gateway:9000",
-)
-
-
-def call_rag_brain(question: str, context: Optional[Dict[str, Any]] = None) -> str:
-    """Call the RAG brain via the ML gateway."""
+def rag_relevance(data: Dict[str, Any]) -> float:
+    """
+    Calibrated retrieval confidence from the RAG response (0.0 when nothing
+    matched). Older RAG services without `confidence` fall back to the best
+    match score.
+    """
+    confidence = data.get("confidence")
+    if isinstance(confidence, dict) and confidence.get("score") is not None:
+        try:
+            return float(confidence["score"])
+        except (TypeError, ValueError):
+            pass
+    scores = []
+    for m in (data.get("debug") or {}).get("matches") or []:
+        try:
+            scores.append(float(m.get("score")))
+        except (TypeError, ValueError):
+            continue
+    return max(scores) if scores else 0.0
+
+
+async def call_rag_brain(question: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Call the RAG brain via the ML gateway.
+    Returns {"answer": str, "relevance": float, "ok": bool}; ok is False when
+    the call failed, relevance is the service's calibrated confidence.
+    """
     url = f"{AIOPS_ML_GATEWAY_URL}/ai/rag/query"
     payload: Dict[str, Any] = {
         "question": question,
         "context": context or {},
+        # only the answer and confidence are used here, skip document contents
+        "compact": True,
     }
 
     try:
-        resp = requests.post(url, json=payload, timeout=15)
+        resp = await post_with_deadline(url, payload, RAG_TIMEOUT)
         resp.raise_for_status()
         data = resp.json()
-        return data.get(
-            "answer",
-            "Sorry, I could not generate an answer from the AIOps RAG brain.",
-        )
     except Exception as e:
-        return f"[RAG ERROR] Could not reach RAG service: {e}"
+        return {"answer": f"[RAG ERROR] Could not reach RAG service: {e}", "relevance": 0.0, "ok": False}
+
+    answer = data.get("answer")
+    if not answer:
+        return {
+            "answer": "Sorry, I could not generate an answer from the AIOps RAG brain.",
+            "relevance": 0.0,
+            "ok": False,
+        }
+    relevance = rag_relevance(data)
+    annotate(rag_relevance=relevance)
+    return {"answer": answer, "relevance": relevance, "ok": True}
+
+
+def rag_acceptable(result: Optional[Dict[str, Any]]) -> bool:
+    return bool(result and result["ok"] and result["relevance"] >= CHATGPT_FALLBACK_THRESHOLD)
+
+
+async def answer_with_fallback(question: str, context: Dict[str, Any],
+                               conversation_id: Optional[str], priority: str = "normal") -> str:
+    """
+    RAG answer, falling back to ChatGPT when RAG fails or its relevance is
+    below CHATGPT_FALLBACK_THRESHOLD.
+
+    If RAG has not answered within RAG_SPECULATIVE_AFTER seconds the ChatGPT
+    call is started alongside it; the first acceptable answer wins and the
+    other call is cancelled, so the worst case is about one timeout rather
+    than RAG_TIMEOUT + CHATGPT_TIMEOUT. RAG_SPECULATIVE_AFTER <= 0 keeps the
+    sequential behaviour.
+    """
+    rag_task = asyncio.ensure_future(call_rag_brain(question, context))
+
+    def llm_call():
+        return asyncio.ensure_future(_call_chatgpt_via_gateway(
+            message=question, context=str(context), conversation_id=conversation_id,
+            priority=priority,
+        ))
+
+    if RAG_SPECULATIVE_AFTER <= 0:
+        rag = await rag_task
+        if rag_acceptable(rag):
+            return rag["answer"]
+        fb = await llm_call()
+        return fb or rag["answer"]
+
+    done, _ = await asyncio.wait({rag_task}, timeout=RAG_SPECULATIVE_AFTER)
+    if done:
+        rag = rag_task.result()
+        if rag_acceptable(rag):
+            return rag["answer"]
+        fb = await llm_call()
+        return fb or rag["answer"]
+
+    annotate(llm_speculative=True)
+    llm_task = llm_call()
+    pending = {rag_task, llm_task}
+    rag: Optional[Dict[str, Any]] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if rag_task in done:
+                rag = rag_task.result()
+                if rag_acceptable(rag):
+                    return rag["answer"]
+            if llm_task in done and llm_task.result():
+                return llm_task.result()
+        return rag["answer"] if rag else "Sorry, I could not generate an answer from the AIOps RAG brain."
+    finally:
+        for t in pending:
+            t.cancel()
+
+
+def format_anomaly(data: Optional[Dict[str, Any]], device: str, metric: str) -> str:
+    data = data if isinstance(data, dict) else {}
+    risk_score = data.get("risk_score", 0.0)
+    risk_label = data.get("risk_label", "unknown")
+    note = data.get("note", "")
+
+    # Be defensive about types here
+    try:
+        score_str = f"{float(risk_score):.2f}"
+    except Exception:
+        score_str = str(risk_score)
+
+    return (
+        f"Anomaly risk for device '{device}' on metric '{metric}' "
+        f"is **{risk_label}** (score={score_str}). {note}"
+    )
 
 
-def call_anomaly_brain(
+async def call_anomaly_brain(
     device: str,
     metric: str = "cpu_usage",
     alert_id: Optional[str] = None,
@@ -77,26 +255,44 @@ def call_anomaly_brain(
         payload["value"] = value
 
     try:
-        resp = requests.post(url, json=payload, timeout=15)
+        resp = await post_with_deadline(url, payload, ANOMALY_TIMEOUT)
         resp.raise_for_status()
         data = resp.json()
     except Exception as e:
         return f"[ANOMALY ERROR] Could not reach anomaly service: {e}"
 
-    risk_score = data.get("risk_score", 0.0)
-    risk_label = data.get("risk_label", "unknown")
-    note = data.get("note", "")
+    return format_anomaly(data, device, metric)
 
-    # Be defensive about types here
+
+async def call_anomaly_brain_batch(items: List[Dict[str, Any]]) -> str:
+    """Score all extracted readings with one gateway call and render one reply."""
+    if len(items) == 1:
+        return await call_anomaly_brain(**items[0])
+
+    url = f"{AIOPS_ML_GATEWAY_URL}/ai/anomaly/score_batch"
     try:
-        score_str = f"{float(risk_score):.2f}"
-    except Exception:
-        score_str = str(risk_score)
+        resp = await post_with_deadline(url, {"items": items}, ANOMALY_TIMEOUT)
+        resp.raise_for_status()
+        results = resp.json().get("results") or []
+    except Exception as e:
+        return f"[ANOMALY ERROR] Could not reach anomaly service: {e}"
+    # one result per item, even if the reply is short or has holes
+    missing = {"risk_label": "unknown", "note": "No score returned."}
+    results = [r if isinstance(r, dict) else missing for r in results[:len(items)]]
+    results += [missing] * (len(items) - len(results))
 
-    return (
-        f"Anomaly risk for device '{device}' on metric '{metric}' "
-        f"is **{risk_label}** (score={score_str}). {note}"
-    )
+    def risk(pair):
+        try:
+            return float(pair[1].get("risk_score") or 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    pairs = sorted(zip(items, results), key=risk, reverse=True)
+    lines = [f"Anomaly risk for {len(pairs)} readings (highest first):"]
+    for it, data in pairs:
+        value = f" at {it['value']:g}" if it.get("value") is not None else ""
+        lines.append(f"- {format_anomaly(data, it['device'], it['metric'] + value)}")
+    return "\n".join(lines)
 
 
 class ActionAIOpsRAGAnswer(Action):
@@ -106,7 +302,7 @@ class ActionAIOpsRAGAnswer(Action):
         return "action_aiops_rag_answer"
 
 
-    def run(
+    async def run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
@@ -126,27 +322,13 @@ class ActionAIOpsRAGAnswer(Action):
                 "alert_id": alert_id,
             }
 
-            # 1) RAG first
-            result_text = call_rag_brain(user_msg, context)
-
-            # 2) Fallback if RAG looks bad
-            rag_bad = (
-                (not result_text)
-                or (isinstance(result_text, str) and (
-                    result_text.startswith("[RAG ERROR]")
-                    or "could not generate an answer" in result_text.lower()
-                    or "sorry, i could not" in result_text.lower()
-                ))
-            )
-
-            if rag_bad:
-                fb = _call_chatgpt_via_gateway_sync(
-                    message=user_msg,
-                    context=str(context),
+            with span("action.aiops_rag_answer", kind="server", sender_id=tracker.sender_id):
+                result_text = await answer_with_fallback(
+                    user_msg,
+                    context,
                     conversation_id=getattr(tracker, "sender_id", None),
+                    priority=llm_priority(tracker),
                 )
-                if fb:
-                    result_text = fb
 
             dispatcher.utter_message(text=result_text)
             return []
@@ -163,7 +345,7 @@ class ActionAIOpsAnomalyScore(Action):
     def name(self) -> Text:
         return "action_aiops_anomaly_score"
 
-    def run(
+    async def run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
@@ -177,22 +359,23 @@ class ActionAIOpsAnomalyScore(Action):
             metric = tracker.get_slot("metric") or "cpu_usage"
             alert_id = tracker.get_slot("alert_id")
 
-            # Try to extract a numeric value from the text (e.g. "95%")
-            value: Optional[float] = None
-            for token in user_msg.replace("%", " ").split():
-                try:
-                    value = float(token)
-                    break
-                except ValueError:
-                    continue
-
-            result_text = call_anomaly_brain(
-                device=device,
-                metric=metric,
-                alert_id=alert_id,
-                time_window="15m",
-                value=value,
-            )
+            time_window = extract_time_window(user_msg)
+            readings = extract_metric_readings(user_msg, default_device=device)
+            if not readings:
+                # No metric keyword: slot metric + first number (e.g. "95%")
+                readings = [{
+                    "device": device,
+                    "metric": metric,
+                    "value": first_value(user_msg),
+                }]
+
+            items = [
+                {**r, "alert_id": alert_id, "time_window": time_window}
+                for r in readings
+            ]
+            with span("action.aiops_anomaly_score", kind="server",
+                      sender_id=tracker.sender_id, readings=len(items)):
+                result_text = await call_anomaly_brain_batch(items)
             dispatcher.utter_message(text=result_text)
             return []
 
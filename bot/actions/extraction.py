@@ -0,0 +1,88 @@
+"""
+Metric readings and time windows from a chat message.
+
+    "rb1 cpu 95%, core2 mem 80%" -> [(rb1, cpu_usage, 95), (core2, mem_usage, 80)]
+
+Kept free of rasa_sdk so it can be tested without the action server.
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+METRIC_ALIASES = {
+    "cpu_usage": "cpu_usage", "cpu": "cpu_usage", "processor": "cpu_usage",
+    "mem_usage": "mem_usage", "memory": "mem_usage", "mem": "mem_usage", "ram": "mem_usage",
+    "disk_usage": "disk_usage", "disk": "disk_usage", "storage": "disk_usage",
+    "temperature": "temperature", "temp": "temperature",
+    "latency": "latency_ms", "packet_loss": "packet_loss", "loss": "packet_loss",
+    "bandwidth": "bandwidth", "traffic": "bandwidth",
+}
+_METRIC_RE = re.compile(
+    r"\b(" + "|".join(sorted(map(re.escape, METRIC_ALIASES), key=len, reverse=True)) + r")\b",
+    re.IGNORECASE,
+)
+_UNITS = r"m|mins?|minutes?|h|hrs?|hours?|d|days?"
+# (?!\.?\d) keeps the engine from backing off a digit to dodge the unit check
+# ("15m" must not match as "1")
+_VALUE_RE = re.compile(r"(?<![\w.])(\d+(?:\.\d+)?)(?!\.?\d)(?!\s*(?:" + _UNITS + r")\b)\s*%?", re.IGNORECASE)
+_SEGMENT_RE = re.compile(r"[;,\n]|\band\b", re.IGNORECASE)
+_DEVICE_BEFORE_RE = re.compile(r"([A-Za-z][\w.-]*)\s+$")
+_DEVICE_ON_RE = re.compile(r"\b(?:on|for|at|device)\s+([A-Za-z][\w.-]*)", re.IGNORECASE)
+_WINDOW_RE = re.compile(
+    r"\b(?:(?:last|past|for|over(?: the)?(?: last)?)\s+(\d+)\s*(" + _UNITS + r")|(\d+)(" + _UNITS + r"))\b",
+    re.IGNORECASE,
+)
+_NOT_DEVICE = {
+    "is", "at", "on", "for", "the", "a", "an", "of", "with", "when", "what", "how",
+    "high", "low", "my", "its", "risky", "device", "score", "risk", "usage", "and",
+}
+
+
+def _device_word(word: Optional[str]) -> Optional[str]:
+    if not word or word.lower() in _NOT_DEVICE or word.lower() in METRIC_ALIASES:
+        return None
+    return word
+
+
+def extract_time_window(text: str, default: str = "15m") -> str:
+    m = _WINDOW_RE.search(text or "")
+    if not m:
+        return default
+    n = m.group(1) or m.group(3)
+    unit = (m.group(2) or m.group(4)).lower()[0]
+    return f"{int(n)}{unit}"
+
+
+def extract_metric_readings(text: str, default_device: str) -> List[Dict[str, Any]]:
+    """
+    All (device, metric, value) readings in a message. Each comma/"and"
+    separated segment contributes at most one reading; a segment without a
+    device inherits the previous one (then the slot value).
+    """
+    readings: List[Dict[str, Any]] = []
+    device = default_device
+    for seg in _SEGMENT_RE.split(text or ""):
+        m = _METRIC_RE.search(seg)
+        if not m:
+            continue
+        val = _VALUE_RE.search(seg, m.end()) or _VALUE_RE.search(seg)
+        if not val:
+            continue
+        before = _DEVICE_BEFORE_RE.search(seg[: m.start()])
+        on = _DEVICE_ON_RE.search(seg)
+        device = (
+            _device_word(before.group(1) if before else None)
+            or _device_word(on.group(1) if on else None)
+            or device
+        )
+        readings.append({
+            "device": device,
+            "metric": METRIC_ALIASES[m.group(1).lower()],
+            "value": float(val.group(1)),
+        })
+    return readings
+
+
+def first_value(text: str) -> Optional[float]:
+    """The first number in `text` that is not a time window, e.g. "95%"."""
+    m = _VALUE_RE.search(text or "")
+    return float(m.group(1)) if m else None
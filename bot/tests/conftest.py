@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the action server imports the `actions` package from bot/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
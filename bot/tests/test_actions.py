@@ -0,0 +1,9 @@
+import pytest
+
+pytest.importorskip("rasa_sdk")
+from actions.actions import format_anomaly  # noqa: E402
+
+
+def test_format_anomaly_tolerates_missing_results():
+    text = format_anomaly(None, "rb1", "cpu_usage")
+    assert "rb1" in text and "unknown" in text
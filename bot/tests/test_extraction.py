@@ -0,0 +1,65 @@
+from actions.extraction import extract_metric_readings, extract_time_window, first_value
+
+
+def test_one_reading_per_segment_with_its_device():
+    assert extract_metric_readings("rb1 cpu 95%, core2 mem 80%", "slot-dev") == [
+        {"device": "rb1", "metric": "cpu_usage", "value": 95.0},
+        {"device": "core2", "metric": "mem_usage", "value": 80.0},
+    ]
+
+
+def test_segment_without_device_inherits_previous():
+    readings = extract_metric_readings("rb1 cpu 95% and memory 70.5%", "slot-dev")
+    assert [(r["device"], r["metric"], r["value"]) for r in readings] == [
+        ("rb1", "cpu_usage", 95.0),
+        ("rb1", "mem_usage", 70.5),
+    ]
+
+
+def test_falls_back_to_the_slot_device():
+    assert extract_metric_readings("cpu is 91", "edge-7") == [
+        {"device": "edge-7", "metric": "cpu_usage", "value": 91.0},
+    ]
+
+
+def test_device_after_on():
+    readings = extract_metric_readings("disk at 88% on core-sw.2", "slot-dev")
+    assert readings == [{"device": "core-sw.2", "metric": "disk_usage", "value": 88.0}]
+
+
+def test_time_window_is_not_a_value():
+    readings = extract_metric_readings("cpu 90% over the last 15m on rb1", "slot-dev")
+    assert [r["value"] for r in readings] == [90.0]
+    assert extract_time_window("cpu 90% over the last 15 minutes") == "15m"
+    assert extract_time_window("cpu 90%", default="1h") == "1h"
+
+
+def test_segments_without_metric_or_value_are_skipped():
+    assert extract_metric_readings("hello there, how is rb1 cpu?", "slot-dev") == []
+    assert extract_metric_readings("", "slot-dev") == []
+
+
+def test_metric_aliases_are_normalised():
+    metrics = [r["metric"] for r in extract_metric_readings("ram 50; temp 70; loss 2", "d")]
+    assert metrics == ["mem_usage", "temperature", "packet_loss"]
+
+
+def test_time_window_without_reading_gives_no_value():
+    # the number must not be cut short to slip past the unit check ("15m" -> 1)
+    for text in ("cpu high last 15m", "cpu 15min", "cpu high for 10 mins", "memory over the last 2 hours"):
+        assert extract_metric_readings(text, "rb1") == [], text
+        assert first_value(text) is None, text
+
+
+def test_for_and_compact_windows():
+    assert extract_time_window("cpu 90% for 10 mins") == "10m"
+    assert extract_time_window("cpu 30min") == "30m"
+    assert extract_time_window("disk 80 over the last 2 hours") == "2h"
+    assert extract_metric_readings("cpu 90% for 10 mins on rb1", "d") == [
+        {"device": "rb1", "metric": "cpu_usage", "value": 90.0},
+    ]
+
+
+def test_first_value_skips_windows():
+    assert first_value("last 15m it hit 95%") == 95.0
+    assert first_value("score it please") is None
@@ -1,29 +1,60 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import logging
 import psycopg2
+from psycopg2.extras import execute_values
 from datetime import datetime
+from typing import Dict, List, Optional
 import os
+import threading
+
+from app.metrics import SIZE_BUCKETS, counter, histogram, instrument, timed
 
 app = FastAPI(title="AI-Ops Ecosystem API", version="1.0")
+instrument(app, "fastapi_service")
+
+ROWS_INGESTED = counter("ingest_rows_total", "Rows written to the datalake", ["table"])
+INGEST_ERRORS = counter("ingest_errors_total", "Failed datalake writes", ["table"])
+DB_CONNECT = histogram("ingest_db_connect_seconds", "Time to open a datalake connection")
+BULK_SIZE = histogram("ingest_bulk_rows", "Rows per bulk ingest request", ["table"],
+                      buckets=SIZE_BUCKETS + (2000, 5000))
+
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "5000"))
+
+# Same counts as ROWS_INGESTED/INGEST_ERRORS, kept here too so /ingest/stats
+# works without prometheus_client (the UI gateway derives ingest rates from it)
+_totals_lock = threading.Lock()
+_rows_total: Dict[str, int] = {}
+_errors_total: Dict[str, int] = {}
+
+def count_rows(table: str, n: int = 1) -> None:
+    ROWS_INGESTED.labels(table).inc(n)
+    with _totals_lock:
+        _rows_total[table] = _rows_total.get(table, 0) + n
+
+def count_error(table: str) -> None:
+    INGEST_ERRORS.labels(table).inc()
+    with _totals_lock:
+        _errors_total[table] = _errors_total.get(table, 0) + 1
 
 logging.basicConfig(level=logging.INFO)
 
 # --- Database Connection Details ---
-DB_HOST = "datalake_db"
-DB_NAME = "aiops_data"
-DB_USER = "aiops_user"
-DB_PASS = "password"
+DB_HOST = os.getenv("DB_HOST", "datalake_db")
+DB_NAME = os.getenv("DB_NAME", "aiops_data")
+DB_USER = os.getenv("DB_USER", "aiops_user")
+DB_PASS = os.getenv("DB_PASS", "password")
 
 def get_db_connection():
     """Establishes and returns a database connection."""
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASS
-        )
+        with timed(DB_CONNECT):
+            conn = psycopg2.connect(
+                host=DB_HOST,
+                database=DB_NAME,
+                user=DB_USER,
+                password=DB_PASS
+            )
         return conn
     except Exception as error:
         logging.error(f"Database connection error: {error}")
@@ -91,6 +122,11 @@ class ZabbixData(BaseModel):
     host: str
     item_key: str
     value: str
+    # when the value was collected (Zabbix item clock); defaults to insert time
+    timestamp: Optional[datetime] = None
+
+class ZabbixBatch(BaseModel):
+    events: List[ZabbixData] = Field(..., max_length=BULK_MAX_ROWS)
 
 class LibrenmsData(BaseModel):
     hostname: str
@@ -110,10 +146,12 @@ async def ingest_onos_metrics(data: OnosData):
             (data.device_id, data.metric, data.value)
         )
         conn.commit()
+        count_rows("onos_metrics")
         logging.info(f"ONOS Data written to DB: {data.device_id}")
     except Exception as error:
         conn.rollback()
         logging.error(f"DB insertion error (ONOS): {error}")
+        count_error("onos_metrics")
         raise HTTPException(status_code=500, detail="DB insertion failed")
     finally:
         cur.close()
@@ -127,20 +165,56 @@ async def ingest_zabbix_events(data: ZabbixData):
     cur = conn.cursor()
     try:
         cur.execute(
-            "INSERT INTO zabbix_events (host, item_key, value) VALUES (%s, %s, %s)",
-            (data.host, data.item_key, data.value)
+            "INSERT INTO zabbix_events (timestamp, host, item_key, value) "
+            "VALUES (COALESCE(%s, CURRENT_TIMESTAMP), %s, %s, %s)",
+            (data.timestamp, data.host, data.item_key, data.value)
         )
         conn.commit()
+        count_rows("zabbix_events")
         logging.info(f"Zabbix Event written to DB: {data.host} - {data.item_key}")
     except Exception as error:
         conn.rollback()
         logging.error(f"DB insertion error (Zabbix): {error}")
+        count_error("zabbix_events")
         raise HTTPException(status_code=500, detail="DB insertion failed")
     finally:
         cur.close()
         conn.close()
     return {"status": "received_and_stored", "data": data.dict()}
 
+@app.post("/ingest/zabbix_events/bulk")
+def ingest_zabbix_events_bulk(batch: ZabbixBatch):
+    """
+    Many events in one transaction (the Zabbix collector posts history this way).
+    Plain def: psycopg2 blocks, so this runs in the threadpool, not on the event loop.
+    """
+    if not batch.events:
+        return {"status": "received_and_stored", "rows": 0}
+    conn = get_db_connection()
+    if not conn: raise HTTPException(status_code=500, detail="Database connection failed")
+    cur = conn.cursor()
+    try:
+        execute_values(
+            cur,
+            "INSERT INTO zabbix_events (timestamp, host, item_key, value) VALUES %s",
+            [(e.timestamp, e.host, e.item_key, e.value) for e in batch.events],
+            template="(COALESCE(%s, CURRENT_TIMESTAMP), %s, %s, %s)",
+            page_size=1000,
+        )
+        conn.commit()
+        count_rows("zabbix_events", len(batch.events))
+        BULK_SIZE.labels("zabbix_events").observe(len(batch.events))
+        logging.info(f"Zabbix bulk: {len(batch.events)} events written to DB")
+    except Exception as error:
+        conn.rollback()
+        logging.error(f"DB insertion error (Zabbix bulk): {error}")
+        count_error("zabbix_events")
+        raise HTTPException(status_code=500, detail="DB insertion failed")
+    finally:
+        cur.close()
+        conn.close()
+    return {"status": "received_and_stored", "rows": len(batch.events)}
+
 @app.post("/ingest/librenms_data")
 async def ingest_librenms_data(data: LibrenmsData):
     conn = get_db_connection()
@@ -152,10 +226,12 @@ async def ingest_librenms_data(data: LibrenmsData):
             (data.hostname, data.mib, data.value)
         )
         conn.commit()
+        count_rows("librenms_data")
         logging.info(f"LibreNMS Data written to DB: {data.hostname}")
     except Exception as error:
         conn.rollback()
         logging.error(f"DB insertion error (LibreNMS): {error}")
+        count_error("librenms_data")
         raise HTTPException(status_code=500, detail="DB insertion failed")
     finally:
         cur.close()
@@ -165,3 +241,9 @@ async def ingest_librenms_data(data: LibrenmsData):
 @app.get("/status")
 async def get_status():
     return {"status": "ok", "service": "FastAPI Heartbeat (DB Integrated)"}
+
+@app.get("/ingest/stats")
+def ingest_stats():
+    """Rows written / failed writes per table since this process started."""
+    with _totals_lock:
+        return {"ingest_rows_total": dict(_rows_total), "ingest_errors_total": dict(_errors_total)}
@@ -0,0 +1,197 @@
+"""
+Prometheus instrumentation shared by the AIOps FastAPI services.
+
+Each service builds from its own directory, so this file is copied verbatim
+into every service; aiops_shared_modules_check.sh fails if the copies drift.
+
+    from metrics import instrument, counter, histogram, gauge, expose_stats
+
+    instrument(app, "aiops-ml-gateway")          # per-route RED metrics + GET /metrics
+    EMBEDDED = counter("embeddings_total", "Texts embedded")
+    EMBEDDED.inc(len(texts))
+    expose_stats("gateway_cache", anomaly_cache.stats)   # existing stats() dicts as gauges
+
+prometheus_client is optional: without it every helper is a no-op and
+/metrics answers 503, so a service never fails to start over metrics.
+"""
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, Sequence, Tuple
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        REGISTRY,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+    )
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # optional: metrics are simply not collected
+    REGISTRY = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+_metrics: Dict[str, Any] = {}
+
+
+class _Noop:
+    def labels(self, *args: Any, **kwargs: Any) -> "_Noop":
+        return self
+
+    def inc(self, *args: Any) -> None:
+        pass
+
+    def dec(self, *args: Any) -> None:
+        pass
+
+    def set(self, *args: Any) -> None:
+        pass
+
+    def observe(self, *args: Any) -> None:
+        pass
+
+
+_NOOP = _Noop()
+
+
+def _get(name: str, make: Callable[[], Any]) -> Any:
+    if REGISTRY is None:
+        return _NOOP
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = _metrics[name] = make()
+    return metric
+
+
+def counter(name: str, doc: str, labels: Sequence[str] = ()) -> Any:
+    return _get(name, lambda: Counter(name, doc, list(labels)))
+
+
+def gauge(name: str, doc: str, labels: Sequence[str] = ()) -> Any:
+    return _get(name, lambda: Gauge(name, doc, list(labels)))
+
+
+def histogram(name: str, doc: str, labels: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Any:
+    return _get(name, lambda: Histogram(name, doc, list(labels), buckets=tuple(buckets)))
+
+
+# -- existing stats() dicts as gauges --------------------------------------
+
+def _flatten(prefix: str, value: Any) -> Iterable[Tuple[str, float]]:
+    if isinstance(value, bool):
+        yield prefix, float(value)
+    elif isinstance(value, (int, float)):
+        yield prefix, float(value)
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            yield from _flatten(f"{prefix}_{_NAME_RE.sub('_', str(k))}", v)
+
+
+class _StatsCollector:
+    def __init__(self, namespace: str, fn: Callable[[], Dict[str, Any]]):
+        self.namespace = namespace
+        self.fn = fn
+
+    def collect(self):
+        try:
+            stats = self.fn()
+        except Exception:
+            return
+        for name, value in _flatten(self.namespace, stats):
+            if value != value:  # NaN
+                continue
+            yield GaugeMetricFamily(name, f"{self.namespace} stats", value=value)
+
+
+def expose_stats(namespace: str, fn: Callable[[], Dict[str, Any]]) -> None:
+    """Publish every numeric leaf of fn() as a gauge named <namespace>_<path>, read at scrape time."""
+    if REGISTRY is not None:
+        REGISTRY.register(_StatsCollector(_NAME_RE.sub("_", namespace), fn))
+
+
+# -- per-route HTTP metrics --------------------------------------------------
+
+class _MetricsMiddleware:
+    """
+    Pure ASGI middleware (streaming responses are timed until the last byte
+    without buffering). Routes are labelled by their template, e.g.
+    /items/{id}, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app: Any, service: str):
+        self.app = app
+        self.service = service
+        labels = ("service", "method", "route")
+        self.requests = counter("http_requests_total", "HTTP requests", labels + ("status",))
+        self.errors = counter("http_request_errors_total", "HTTP 5xx responses and unhandled errors", labels)
+        self.latency = histogram("http_request_duration_seconds", "HTTP request latency", labels)
+        self.in_flight = gauge("http_requests_in_flight", "HTTP requests being served", ("service", "method"))
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or scope.get("path") == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "GET")
+        status = {"code": 500}
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_flight = self.in_flight.labels(self.service, method)
+        in_flight.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status["code"] = 500
+            raise
+        finally:
+            in_flight.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "<unmatched>"
+            self.latency.labels(self.service, method, path).observe(time.perf_counter() - t0)
+            self.requests.labels(self.service, method, path, str(status["code"])).inc()
+            if status["code"] >= 500:
+                self.errors.labels(self.service, method, path).inc()
+
+
+def instrument(app: Any, service: str) -> None:
+    """Add per-route request/latency/in-flight/error metrics and a GET /metrics endpoint."""
+    from fastapi import Response
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics_endpoint() -> Response:
+        if REGISTRY is None:
+            return Response("prometheus_client not installed\n", status_code=503, media_type="text/plain")
+        return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+    if REGISTRY is not None:
+        app.add_middleware(_MetricsMiddleware, service=service)
+
+
+def timed(metric: Any, *labels: str) -> "_Timer":
+    """with timed(HIST, "label"): ...  -- observe the block's duration."""
+    return _Timer(metric.labels(*labels) if labels else metric)
+
+
+class _Timer:
+    __slots__ = ("metric", "t0")
+
+    def __init__(self, metric: Any):
+        self.metric = metric
+        self.t0 = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.metric.observe(time.perf_counter() - self.t0)
@@ -2,14 +2,15 @@ import requests
 import time
 import json
 import logging
+import os
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- Configuration ---
-ONOS_URL = "http://192.168.206.136:8181/onos/v1/devices"
-FASTAPI_URL = "http://192.168.206.136:8080/ingest/onos_metrics"
+ONOS_URL = os.getenv("ONOS_URL", "http://192.168.206.136:8181/onos/v1/devices")
+FASTAPI_URL = os.getenv("FASTAPI_URL", "http://192.168.206.136:8080/ingest/onos_metrics")
 ONOS_AUTH = ('karaf', 'karaf')  # Default ONOS credentials
-POLL_INTERVAL = 30 # Poll every 30 seconds
+POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", "30")) # Poll every 30 seconds
 
 def get_onos_device_count():
     """Pulls device data from ONOS and returns the count."""
@@ -5,7 +5,13 @@ function submitQuiz(moduleId) {
     return;
   }
 
+  let user = null;
+  try {
+    user = (JSON.parse(localStorage.getItem("lb_portal_profile")) || {}).user || null;
+  } catch (e) { /* anonymous submission */ }
+
   const payload = {
+    user: user,
     module: moduleId,
     score: selected.value,
     timestamp: new Date().toISOString()
@@ -1,9 +1,101 @@
-from fastapi import FastAPI
-import subprocess
+from fastapi import FastAPI, HTTPException
+import asyncio
 import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+from health_probe import HealthProber, parse_targets
 
 app = FastAPI()
 
+# Background refresh intervals (seconds); handlers only read the cached snapshots
+STATUS_PROBE_INTERVAL = float(os.environ.get("STATUS_PROBE_INTERVAL", "15"))
+STATUS_PROBE_TIMEOUT = float(os.environ.get("STATUS_PROBE_TIMEOUT", "2"))
+STATUS_INVENTORY_INTERVAL = float(os.environ.get("STATUS_INVENTORY_INTERVAL", "60"))
+INVENTORY_SCRIPT = os.environ.get(
+    "STATUS_INVENTORY_SCRIPT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "inventory.sh")
+)
+
+DEFAULT_TARGETS = {
+    "ui-gateway": "http://host.docker.internal:8089/status/ecosystem/status",
+    "chatgpt-bridge": "http://aiops-chatgpt-bridge:9100/health",
+    "ml-gateway": "http://aiops-ml-gateway:9000/health",
+    "rag-service": "http://aiops-rag-service:8000/health",
+    "anomaly-service": "http://aiops-anomaly-service:8100/health",
+    "rasa-actions": "http://aiops-rasa-actions:5055/health",
+}
+
+
+HEALTH_TARGETS = parse_targets(os.environ.get("STATUS_TARGETS", "")) or DEFAULT_TARGETS
+
+
+class Snapshot:
+    """Last value produced by a background job, with its age."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.value: Any = None
+        self.error: Optional[str] = None
+        self.updated: Optional[float] = None
+
+    def set(self, value: Any) -> None:
+        self.value, self.error, self.updated = value, None, time.time()
+
+    def fail(self, error: str) -> None:
+        # keep serving the previous value; the age tells clients it is old
+        self.error = error
+
+    def meta(self) -> Dict[str, Any]:
+        age = (time.time() - self.updated) if self.updated else None
+        return {
+            "checked_at": self.updated,
+            "age_seconds": round(age, 1) if age is not None else None,
+            "stale": age is None or age > 2 * self.interval + STATUS_PROBE_TIMEOUT,
+            "error": self.error,
+        }
+
+
+health_prober = HealthProber(HEALTH_TARGETS, interval=STATUS_PROBE_INTERVAL, timeout=STATUS_PROBE_TIMEOUT)
+inventory_snapshot = Snapshot(STATUS_INVENTORY_INTERVAL)
+_tasks = []
+
+
+async def run_inventory() -> Dict[str, Any]:
+    proc = await asyncio.create_subprocess_exec(
+        "bash", INVENTORY_SCRIPT,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    out, _ = await asyncio.wait_for(proc.communicate(), timeout=max(10.0, STATUS_INVENTORY_INTERVAL))
+    if proc.returncode != 0:
+        raise RuntimeError(f"inventory.sh exited with {proc.returncode}")
+    return json.loads(out.decode())
+
+
+async def inventory_loop() -> None:
+    while True:
+        try:
+            inventory_snapshot.set(await run_inventory())
+        except Exception as e:
+            inventory_snapshot.fail(f"{type(e).__name__}: {e}")
+        await asyncio.sleep(STATUS_INVENTORY_INTERVAL)
+
+
+@app.on_event("startup")
+async def start_background_jobs():
+    health_prober.start()
+    _tasks.append(asyncio.create_task(inventory_loop()))
+
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    for t in _tasks:
+        t.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    await health_prober.stop()
+
 
 @app.get("/health")
 async def health():
@@ -21,18 +113,26 @@ async def ecosystem_status():
     }
 
 
+@app.get("/ecosystem/health")
+async def ecosystem_health():
+    """Last concurrent /health probe of every target (refreshed in the background)."""
+    snap = health_prober.snapshot()
+    services = snap.pop("services")
+    return {**snap, "services": [{"name": name, **result} for name, result in services.items()]}
+
+
 @app.get("/ecosystem/inventory")
 async def ecosystem_inventory():
     """
-    Returns the JSON from inventory.sh:
+    Returns the JSON from inventory.sh (cached, refreshed in the background):
     {
       "services": [
         { "name": "...", "image": "...", ... },
         ...
-      ]
+      ],
+      "checked_at": ..., "age_seconds": ..., "stale": ..., "error": ...
     }
     """
-    out = subprocess.check_output(
-        ["bash", "inventory.sh"], stderr=subprocess.DEVNULL
-    ).decode()
-    return json.loads(out)
+    if inventory_snapshot.value is None:
+        raise HTTPException(status_code=503, detail=inventory_snapshot.error or "inventory_not_ready")
+    return {**inventory_snapshot.value, **inventory_snapshot.meta()}
@@ -0,0 +1,227 @@
+"""
+Incrementally maintained AIOps aggregates for /aiops/summary.
+
+Every scored sample updates a few dict entries, two lazy top-k heaps and a
+per-second ring of counters; reading the summary only walks the top of the
+heaps and the few entries that expired since the last read, never the whole
+fleet. Ingest rates come from the datalake API's row counters
+(fastapi_service /ingest/stats), polled in the background.
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+ELEVATED = {"medium", "high"}
+
+
+class RateWindow:
+    """Events per second over the last `seconds` seconds (one bucket per second)."""
+
+    def __init__(self, seconds: int = 60):
+        self.seconds = seconds
+        self._counts = [0] * seconds
+        self._stamp = [0] * seconds
+        self.total = 0
+
+    def add(self, n: int = 1, now: Optional[float] = None) -> None:
+        sec = int(now if now is not None else time.time())
+        i = sec % self.seconds
+        if self._stamp[i] != sec:
+            self._stamp[i], self._counts[i] = sec, 0
+        self._counts[i] += n
+        self.total += n
+
+    def rate(self, now: Optional[float] = None) -> float:
+        sec = int(now if now is not None else time.time())
+        live = sum(c for c, s in zip(self._counts, self._stamp) if sec - s < self.seconds)
+        return live / float(self.seconds)
+
+
+class TopK:
+    """
+    Scores by key with a lazy max-heap: set/discard are O(log n) pushes and
+    top(k) pops only the stale entries it meets. The heap is compacted when
+    stale entries outnumber live ones.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._version: Dict[Hashable, int] = {}
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._version)
+
+    def set(self, key: Hashable, score: float) -> None:
+        v = next(self._seq)
+        self._version[key] = v
+        heapq.heappush(self._heap, (-score, v, key))
+        if len(self._heap) > 2 * len(self._version) + 64:
+            self._heap = [e for e in self._heap if self._version.get(e[2]) == e[1]]
+            heapq.heapify(self._heap)
+
+    def discard(self, key: Hashable) -> None:
+        self._version.pop(key, None)
+
+    def top(self, k: int) -> List[Hashable]:
+        keep: List[Tuple[float, int, Hashable]] = []
+        while self._heap and len(keep) < k:
+            entry = heapq.heappop(self._heap)
+            if self._version.get(entry[2]) == entry[1]:
+                keep.append(entry)
+        for entry in keep:
+            heapq.heappush(self._heap, entry)
+        return [e[2] for e in keep]
+
+
+class IngestRates:
+    """Rows/s per datalake table, from successive readings of monotonic row counters."""
+
+    def __init__(self):
+        self._last: Optional[Tuple[float, Dict[str, int]]] = None
+        self.totals: Dict[str, int] = {}
+        self.per_sec: Dict[str, float] = {}
+        self.errors: Dict[str, int] = {}
+        self.checked_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def update(self, stats: Dict[str, Any], now: Optional[float] = None) -> None:
+        now = now if now is not None else time.time()
+        totals = {t: int(n) for t, n in (stats.get("ingest_rows_total") or {}).items()}
+        if self._last is not None and now > self._last[0]:
+            dt = now - self._last[0]
+            previous = self._last[1]
+            per_sec = {}
+            for t, n in totals.items():
+                before = previous.get(t, 0)
+                # a counter that went down means the service restarted: count from zero
+                per_sec[t] = round((n - before if n >= before else n) / dt, 3)
+            self.per_sec = per_sec
+        self._last = (now, totals)
+        self.totals = totals
+        self.errors = {t: int(n) for t, n in (stats.get("ingest_errors_total") or {}).items()}
+        self.checked_at, self.error = now, None
+
+    def fail(self, error: str) -> None:
+        # keep the last readings; checked_at tells clients how old they are
+        self.error = error
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "rows_total": sum(self.totals.values()),
+            "rows_per_sec": round(sum(self.per_sec.values()), 3),
+            "errors_total": sum(self.errors.values()),
+            "tables": {
+                t: {"rows_total": n, "rows_per_sec": self.per_sec.get(t, 0.0), "errors_total": self.errors.get(t, 0)}
+                for t, n in self.totals.items()
+            },
+            "checked_at": self.checked_at,
+            "error": self.error,
+        }
+
+
+class AIOpsAggregator:
+    def __init__(self, top_k: int = 10, active_ttl: float = 1800.0, refresh: float = 1.0):
+        self.top_k = top_k
+        self.active_ttl = active_ttl
+        # snapshots are reused for up to `refresh` seconds
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        # (device, metric) -> latest scored sample
+        self._latest: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._devices: Dict[str, int] = {}
+        # samples currently at an elevated risk level, least recently seen first
+        self._active: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._active_top = TopK()
+        # device -> {metric: score} of its elevated metrics; the device ranks by the max
+        self._device_scores: Dict[str, Dict[str, float]] = {}
+        self._device_top = TopK()
+        self._samples = RateWindow(60)
+        self._elevated = RateWindow(60)
+        self.ingest = IngestRates()
+        self._built_at = 0.0
+        self._snapshot: Dict[str, Any] = {}
+
+    def observe(self, ev: Dict[str, Any]) -> Optional[str]:
+        """Fold one scored sample in; returns the previous risk label for its device/metric."""
+        key = (ev["device"], ev.get("metric") or "cpu_usage")
+        now = time.time()
+        sample = {**ev, "seen_at": now}
+        with self._lock:
+            previous = self._latest.get(key)
+            self._latest[key] = sample
+            if previous is None:
+                self._devices[key[0]] = self._devices.get(key[0], 0) + 1
+            if ev.get("risk_label") in ELEVATED:
+                first = self._active.get(key, {}).get("since", now)
+                self._active[key] = {**sample, "since": first}
+                self._active.move_to_end(key)
+                self._set_active_score(key, ev.get("risk_score") or 0.0)
+                self._elevated.add(1, now)
+            else:
+                self._deactivate(key)
+            self._samples.add(1, now)
+        return previous.get("risk_label") if previous else None
+
+    def _set_active_score(self, key: Tuple[str, str], score: float) -> None:
+        self._active_top.set(key, score)
+        device, metric = key
+        scores = self._device_scores.setdefault(device, {})
+        scores[metric] = score
+        self._device_top.set(device, max(scores.values()))
+
+    def _deactivate(self, key: Tuple[str, str]) -> None:
+        if self._active.pop(key, None) is None:
+            return
+        self._active_top.discard(key)
+        device, metric = key
+        scores = self._device_scores.get(device, {})
+        scores.pop(metric, None)
+        if scores:
+            self._device_top.set(device, max(scores.values()))
+        else:
+            self._device_scores.pop(device, None)
+            self._device_top.discard(device)
+
+    def _expire(self, now: float) -> None:
+        # _active is in last-seen order, so only the expired head is visited
+        while self._active:
+            key, v = next(iter(self._active.items()))
+            if now - v["seen_at"] <= self.active_ttl:
+                break
+            self._deactivate(key)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            if self._snapshot and now - self._built_at < self.refresh:
+                return self._snapshot
+            self._expire(now)
+            top = []
+            for device in self._device_top.top(self.top_k):
+                metric, score = max(self._device_scores[device].items(), key=lambda ms: ms[1])
+                top.append({"device": device, "risk_score": score, "metric": metric,
+                            "risk_label": self._active[(device, metric)].get("risk_label")})
+            active = [self._active[k] for k in self._active_top.top(self.top_k)]
+            self._snapshot = {
+                "generated_at": now,
+                "active_anomalies": len(self._active),
+                "active": [
+                    {k: v.get(k) for k in ("device", "metric", "value", "risk_score",
+                                           "risk_label", "alert_id", "since", "seen_at")}
+                    for v in active
+                ],
+                "top_risky_devices": top,
+                "devices_tracked": len(self._devices),
+                "ingest": self.ingest.snapshot(),
+                "scoring": {
+                    "samples_total": self._samples.total,
+                    "samples_per_sec": round(self._samples.rate(now), 3),
+                    "elevated_per_sec": round(self._elevated.rate(now), 3),
+                },
+            }
+            self._built_at = now
+            return self._snapshot
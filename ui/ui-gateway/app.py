@@ -1,12 +1,20 @@
 from fastapi import FastAPI, Form, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+import asyncio
+import hmac
 import os
 from datetime import datetime, timedelta
 
+import httpx
 import jwt  # PyJWT
 
+from metrics import expose_stats, instrument
+from aiops_summary import AIOpsAggregator
+from events import Broadcaster
+from health_probe import HealthProber, parse_targets
+
 # --------------------------------------------------
 # Roles
 # --------------------------------------------------
@@ -42,6 +50,8 @@ app = FastAPI(
     openapi_url=None,
 )
 
+instrument(app, "ui-gateway")
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -66,9 +76,14 @@ class MeResponse(BaseModel):
 class EcosystemService(BaseModel):
     name: str
     port: int
+    status: Optional[str] = None        # up / degraded / down (None = not probed yet)
+    latency_ms: Optional[float] = None
+    checked_at: Optional[float] = None
 
 class EcosystemStatus(BaseModel):
     services: List[EcosystemService]
+    checked_at: Optional[float] = None
+    stale: bool = False
 
 class AwarenessSummary(BaseModel):
     status: str
@@ -79,6 +94,22 @@ class AIOpsSummary(BaseModel):
     status: str
     message: str
     alerts: List[str]
+    generated_at: Optional[float] = None
+    active_anomalies: int = 0
+    active: List[dict] = []
+    top_risky_devices: List[dict] = []
+    devices_tracked: int = 0
+    ingest: dict = {}
+    scoring: dict = {}
+
+# --------------------------------------------------
+# Push channel (see events.py; endpoints at the end of this file)
+# --------------------------------------------------
+broadcaster = Broadcaster(queue_size=int(os.environ.get("UI_EVENTS_QUEUE_SIZE", "100")))
+
+@app.on_event("startup")
+async def _bind_broadcaster():
+    broadcaster.bind(asyncio.get_running_loop())
 
 # --------------------------------------------------
 # Helpers
@@ -146,37 +177,118 @@ def get_me_legacy(authorization: str = Header(None)):
 # --------------------------------------------------
 # Ecosystem status
 # --------------------------------------------------
+ECOSYSTEM_PORTS = {
+    "ui-gateway": UI_GATEWAY_PORT,
+    "ai_orchestrator": AI_ORCHESTRATOR_PORT,
+    "fastapi_heartbeat": FASTAPI_HEARTBEAT_PORT,
+    "aiops-rag-service": AIOPS_RAG_PORT,
+    "aiops-anomaly-service": AIOPS_ANOMALY_PORT,
+}
+
+# fastapi_service has no /health; its /status is the liveness check
+ECOSYSTEM_HEALTH_PATHS = {"fastapi_heartbeat": "/status"}
+
+# Probed in the background; override with "name=url,..." in UI_STATUS_TARGETS
+status_prober = HealthProber(
+    parse_targets(os.environ.get("UI_STATUS_TARGETS", "")) or {
+        name: f"http://127.0.0.1:{port}{ECOSYSTEM_HEALTH_PATHS.get(name, '/health')}"
+        for name, port in ECOSYSTEM_PORTS.items() if name != "ui-gateway"
+    },
+    interval=float(os.environ.get("UI_STATUS_INTERVAL", "15")),
+    timeout=float(os.environ.get("UI_STATUS_TIMEOUT", "2")),
+    on_change=lambda name, previous, result: broadcaster.publish("health", {
+        "service": name,
+        "previous": previous,
+        "status": result["status"],
+        "latency_ms": result.get("latency_ms"),
+    }),
+)
+
+@app.on_event("startup")
+async def _start_status_prober():
+    status_prober.start()
+
+@app.on_event("shutdown")
+async def _stop_status_prober():
+    await status_prober.stop()
+
 @app.get("/status/ecosystem/status", response_model=EcosystemStatus)
 def ecosystem_status():
-    services = [
-        EcosystemService(name="ui-gateway", port=UI_GATEWAY_PORT),
-        EcosystemService(name="ai_orchestrator", port=AI_ORCHESTRATOR_PORT),
-        EcosystemService(name="fastapi_heartbeat", port=FASTAPI_HEARTBEAT_PORT),
-        EcosystemService(name="aiops-rag-service", port=AIOPS_RAG_PORT),
-        EcosystemService(name="aiops-anomaly-service", port=AIOPS_ANOMALY_PORT),
-    ]
-    return EcosystemStatus(services=services)
+    """Last background probe results; never contacts the services itself."""
+    snap = status_prober.snapshot()
+    services = []
+    for name, port in ECOSYSTEM_PORTS.items():
+        probe = status_prober.get(name) or {}
+        if name == "ui-gateway":
+            probe = {"status": "up", "checked_at": snap["checked_at"]}
+        services.append(EcosystemService(
+            name=name,
+            port=port,
+            status=probe.get("status"),
+            latency_ms=probe.get("latency_ms"),
+            checked_at=probe.get("checked_at"),
+        ))
+    return EcosystemStatus(services=services, checked_at=snap["checked_at"], stale=snap["stale"])
 
 # --------------------------------------------------
 # Awareness & AIOps summaries
 # --------------------------------------------------
+# Fed by POST /aiops/events (scored anomaly samples from the ML gateway);
+# ingest rates come from the datalake API's row counters
+aiops_aggregator = AIOpsAggregator(
+    top_k=int(os.environ.get("AIOPS_SUMMARY_TOP_K", "10")),
+    active_ttl=float(os.environ.get("AIOPS_ACTIVE_TTL", "1800")),
+    refresh=float(os.environ.get("AIOPS_SUMMARY_REFRESH", "1")),
+)
+AIOPS_INGEST_STATS_URL = os.environ.get(
+    "AIOPS_INGEST_STATS_URL", f"http://127.0.0.1:{FASTAPI_HEARTBEAT_PORT}/ingest/stats"
+)
+AIOPS_INGEST_POLL = float(os.environ.get("AIOPS_INGEST_POLL", "10"))
+
+@app.on_event("startup")
+async def _start_ingest_poller():
+    async def poll_loop():
+        async with httpx.AsyncClient(timeout=2.0) as client:
+            while True:
+                try:
+                    resp = await client.get(AIOPS_INGEST_STATS_URL)
+                    resp.raise_for_status()
+                    aiops_aggregator.ingest.update(resp.json())
+                except (httpx.HTTPError, ValueError) as e:
+                    aiops_aggregator.ingest.fail(type(e).__name__)
+                await asyncio.sleep(AIOPS_INGEST_POLL)
+
+    if AIOPS_INGEST_STATS_URL:
+        asyncio.get_running_loop().create_task(poll_loop())
+
 @app.get("/awareness/summary", response_model=AwarenessSummary)
 def awareness_summary():
+    totals = score_store.totals()
+    submissions = sum(m["submissions"] for m in totals)
+    correct = sum(m["correct"] for m in totals)
+    ratio = f"{100.0 * correct / submissions:.0f}%" if submissions else "n/a"
     return AwarenessSummary(
         status="ok",
-        message="Cybersecurity awareness summary placeholder (MVP).",
-        campaigns=[],
+        message=f"{submissions} quiz submissions, {ratio} correct.",
+        campaigns=[f"module {m['module']}" for m in totals],
     )
 
 @app.get("/aiops/summary", response_model=AIOpsSummary)
 def aiops_summary():
+    """Served from the pre-built aggregate snapshot; no per-request datalake work."""
+    snap = aiops_aggregator.snapshot()
+    alerts = [
+        f"{a['device']} {a['metric']}: {a['risk_label']} (score={a['risk_score']:.2f})"
+        for a in snap["active"] if a.get("risk_score") is not None
+    ]
+    n = snap["active_anomalies"]
     return AIOpsSummary(
-        status="ok",
-        message="AIOps summary placeholder (MVP).",
-        alerts=[],
+        status="alert" if n else "ok",
+        message=f"{n} active anomalies across {snap['devices_tracked']} tracked devices.",
+        alerts=alerts,
+        **snap,
     )
 
-
 # --------------------------------------------------
 # Alias: /api/auth/login → /auth/login
 # --------------------------------------------------
@@ -197,48 +309,125 @@ PORTAL_DIR = "/home/lesiba/aiops-stack/ui/portal"
 app.mount("/portal", StaticFiles(directory=PORTAL_DIR, html=True), name="portal")
 # --- End portal static mount ---
 
-# --- LesiBytes UI score APIs (demo storage in /tmp) ---
+# --- LesiBytes UI score APIs (SQLite/WAL, see score_store.py) ---
+from fastapi import Query, Response
 from pydantic import BaseModel
 from typing import Optional, List
 
+from score_store import ScoreStore
+
+UI_SCORES_DB = os.environ.get(
+    "UI_SCORES_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ui_scores.db")
+)
+LEGACY_SCORES_LOG = "/tmp/user_scores.log"
+
+score_store = ScoreStore(UI_SCORES_DB)
+score_store.import_log(LEGACY_SCORES_LOG)
+
 class ScorePayload(BaseModel):
     module: int
     score: str
     timestamp: Optional[str] = None
+    user: Optional[str] = None
 
 @app.post("/ui-api/save_score")
 def save_score(payload: ScorePayload):
-    import json, os
-    os.makedirs("/tmp", exist_ok=True)
-    with open("/tmp/user_scores.log", "a") as f:
-        f.write(payload.json() + "\n")
-    return {"status": "ok"}
+    score_id = score_store.add(
+        module=payload.module,
+        score=payload.score,
+        timestamp=payload.timestamp,
+        user=payload.user,
+    )
+    broadcaster.publish_threadsafe("score", {"id": score_id, **payload.dict()})
+    return {"status": "ok", "id": score_id}
 
 @app.get("/ui-api/get_scores")
-def get_scores() -> List[dict]:
-    import os, json
-    path = "/tmp/user_scores.log"
-    if not os.path.exists(path):
-        return []
-    data = []
-    with open(path) as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                data.append(json.loads(line))
-            except Exception:
-                continue
-    return data
+def get_scores(
+    response: Response,
+    user: Optional[str] = None,
+    module: Optional[int] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(200, ge=1, le=1000),
+) -> List[dict]:
+    """
+    Newest scores first, as a plain list (what the dashboards expect).
+    The next page's cursor is returned in the X-Next-Cursor header.
+    """
+    items, next_cursor = score_store.page(user=user, module=module, cursor=cursor, limit=limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return items
+
+@app.get("/ui-api/scores")
+def list_scores(
+    user: Optional[str] = None,
+    module: Optional[int] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Cursor-paginated scores; since/until are ISO timestamps (until is exclusive)."""
+    items, next_cursor = score_store.page(
+        user=user, module=module, since=since, until=until, cursor=cursor, limit=limit
+    )
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/ui-api/scores/summary")
+def scores_summary(user: Optional[str] = None, module: Optional[int] = None):
+    """Per-module submissions, correct answers and best score (all users unless `user`)."""
+    modules = score_store.totals(user=user, module=module)
+    total = sum(m["submissions"] for m in modules)
+    correct = sum(m["correct"] for m in modules)
+    return {
+        "total_submissions": total,
+        "correct_answers": correct,
+        "correct_ratio": round(correct / total, 4) if total else 0.0,
+        "modules": modules,
+    }
+
+@app.get("/ui-api/scores/best")
+def scores_best(user: Optional[str] = None):
+    """Best score per module."""
+    return {m["module"]: m["best"] for m in score_store.totals(user=user)}
 # --- End UI score APIs ---
 
 # --- LesiBytes UI auth + chat proxies (login + /auth/me + chat passthrough) ---
+from contextlib import AsyncExitStack
+
+import httpx
 from fastapi import HTTPException, Header
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 
+from proxy import Backend
+
+# One keep-alive pool + concurrency limit per backend; a slow Rasa cannot
+# starve logins. Override with UI_AUTH_* / UI_RASA_* (see Backend.from_env).
+auth_backend = Backend.from_env(
+    "auth", "UI_AUTH", "http://127.0.0.1:8088",
+    timeout=8.0, max_concurrent=64,
+)
+rasa_backend = Backend.from_env(
+    "rasa", "UI_RASA", "http://127.0.0.1:5005",
+    timeout=10.0, max_connections=200, max_keepalive=50, max_concurrent=256,
+)
+BACKENDS = {b.name: b for b in (auth_backend, rasa_backend)}
+
+
+@app.on_event("startup")
+async def _start_backends():
+    for b in BACKENDS.values():
+        await b.start()
+
+
+@app.on_event("shutdown")
+async def _close_backends():
+    for b in BACKENDS.values():
+        await b.close()
+
+
 class LoginPayload(BaseModel):
     username: str
     password: str
@@ -247,97 +436,263 @@ class ChatPayload(BaseModel):
     message: str
     sender: Optional[str] = None
 
+def _passthrough(resp: httpx.Response, error_detail: str) -> JSONResponse:
+    if resp.status_code >= 400:
+        return JSONResponse(status_code=resp.status_code, content={"detail": error_detail})
+    try:
+        return JSONResponse(content=resp.json())
+    except ValueError:
+        raise HTTPException(status_code=502, detail="auth_service_bad_response")
+
 @app.post("/ui-api/login")
-def ui_login(payload: LoginPayload):
+async def ui_login(payload: LoginPayload):
     """
     Forward username/password to the real auth service (ai_orchestrator on :8088),
     which talks to aiops-auth-db and returns a real JWT.
     """
-    import json
-    from urllib import request as urlrequest, error as urlerror
-
-    data = json.dumps({
-        "username": payload.username,
-        "password": payload.password
-    }).encode("utf-8")
-
-    req = urlrequest.Request(
-        "http://127.0.0.1:8088/auth/login",
-        data=data,
-        headers={"Content-Type": "application/json"},
-    )
-
     try:
-        with urlrequest.urlopen(req, timeout=8) as resp:
-            body = resp.read()
-    except urlerror.HTTPError as e:
-        # auth service reachable but credentials wrong
-        return JSONResponse(status_code=e.code, content={"detail": "login_failed"})
-    except Exception:
+        resp = await auth_backend.request(
+            "POST", "/auth/login",
+            json={"username": payload.username, "password": payload.password},
+        )
+    except httpx.HTTPError:
         # auth service not reachable
         raise HTTPException(status_code=502, detail="auth_service_unreachable")
 
-    return JSONResponse(content=json.loads(body))
+    # auth service reachable but credentials wrong -> login_failed
+    return _passthrough(resp, "login_failed")
 
 @app.get("/ui-api/me")
-def ui_me(authorization: str = Header(None)):
+async def ui_me(authorization: str = Header(None)):
     """
     Forward Authorization: Bearer <JWT> to /auth/me to discover the user role.
     """
-    import json
-    from urllib import request as urlrequest, error as urlerror
-
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
 
-    req = urlrequest.Request(
-        "http://127.0.0.1:8088/auth/me",
-        headers={"Authorization": authorization},
-    )
-
     try:
-        with urlrequest.urlopen(req, timeout=8) as resp:
-            body = resp.read()
-    except urlerror.HTTPError as e:
-        return JSONResponse(status_code=e.code, content={"detail": "auth_failed"})
-    except Exception:
+        resp = await auth_backend.request(
+            "GET", "/auth/me", headers={"Authorization": authorization},
+        )
+    except httpx.HTTPError:
         raise HTTPException(status_code=502, detail="auth_service_unreachable")
 
-    return JSONResponse(content=json.loads(body))
-
-@app.post("/ui-api/chat")
-def ui_chat(payload: ChatPayload):
-    """
-    Forward chat messages to Rasa REST webhook and return a simple text reply.
-    """
-    import json
-    from urllib import request as urlrequest, error as urlerror
+    return _passthrough(resp, "auth_failed")
 
+def _rasa_payload(payload: ChatPayload) -> dict:
     if not payload.message:
         raise HTTPException(status_code=400, detail="Empty message")
-
-    rasa_payload = {
+    return {
         "sender": payload.sender or "portal-user",
         "message": payload.message,
+        # read by the Rasa actions to queue portal questions behind incident work
+        "metadata": {"channel": "portal", "priority": "normal"},
     }
 
-    req = urlrequest.Request(
-        "http://127.0.0.1:5005/webhooks/rest/webhook",
-        data=json.dumps(rasa_payload).encode("utf-8"),
-        headers={"Content-Type": "application/json"},
-    )
-
+@app.post("/ui-api/chat")
+async def ui_chat(payload: ChatPayload):
+    """
+    Forward chat messages to Rasa REST webhook and return a simple text reply.
+    """
     try:
-        with urlrequest.urlopen(req, timeout=10) as resp:
-            body = resp.read()
-    except urlerror.URLError:
+        resp = await rasa_backend.request(
+            "POST", "/webhooks/rest/webhook", json=_rasa_payload(payload),
+        )
+    except httpx.HTTPError:
         raise HTTPException(status_code=502, detail="chat_backend_unreachable")
 
+    if resp.status_code >= 400:
+        raise HTTPException(status_code=502, detail=f"chat_backend_error_{resp.status_code}")
     try:
-        msgs = json.loads(body)
-    except Exception:
+        msgs = resp.json()
+    except ValueError:
         return {"reply": "(could not parse reply)", "raw": []}
+    if not isinstance(msgs, list):
+        raise HTTPException(status_code=502, detail="chat_backend_bad_response")
 
-    texts = " ".join([m.get("text", "") for m in msgs]) or "(no reply)"
+    texts = " ".join([m["text"] for m in msgs if isinstance(m, dict) and m.get("text")]) or "(no reply)"
     return {"reply": texts, "raw": msgs}
+
+class RelayResponse(StreamingResponse):
+    """
+    StreamingResponse that closes `stack` once the response is done, even if
+    its body iterator never started (client gone before the first chunk), which
+    a finally inside the iterator cannot guarantee.
+    """
+
+    def __init__(self, content, stack: AsyncExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self.stack = stack
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # releases the connection and the rasa concurrency slot
+            await self.stack.aclose()
+
+@app.post("/ui-api/chat/stream")
+async def ui_chat_stream(payload: ChatPayload):
+    """
+    Same as /ui-api/chat, but Rasa's response body is relayed to the client
+    as it arrives (status and content type preserved) without buffering or
+    re-encoding it in the gateway.
+    """
+    body = _rasa_payload(payload)
+    stack = AsyncExitStack()
+    try:
+        resp = await stack.enter_async_context(
+            rasa_backend.stream("POST", "/webhooks/rest/webhook", json=body)
+        )
+    except httpx.HTTPError:
+        await stack.aclose()
+        raise HTTPException(status_code=502, detail="chat_backend_unreachable")
+    except BaseException:
+        await stack.aclose()
+        raise
+
+    async def relay():
+        try:
+            async for chunk in resp.aiter_raw():
+                yield chunk
+        except httpx.HTTPError:
+            rasa_backend.errors += 1
+
+    return RelayResponse(
+        relay(),
+        stack,
+        status_code=resp.status_code,
+        media_type=resp.headers.get("content-type", "application/json"),
+    )
+
+expose_stats("ui_proxy", lambda: {name: b.stats() for name, b in BACKENDS.items()})
+
+@app.get("/ui-api/proxy/stats")
+def ui_proxy_stats():
+    return {name: b.stats() for name, b in BACKENDS.items()}
 # --- End LesiBytes UI auth + chat proxies ---
+
+
+# --- Push channel: /ui-api/events (SSE) and /ui-api/ws (WebSocket) ---
+from fastapi import WebSocket, WebSocketDisconnect
+
+from events import sse_frame
+
+UI_EVENTS_HEARTBEAT = float(os.environ.get("UI_EVENTS_HEARTBEAT", "15"))
+# Shared with the ML gateway (same variable there); /aiops/events is refused without it
+UI_EVENTS_TOKEN = os.environ.get("UI_EVENTS_TOKEN", "")
+ELEVATED_RISK = {"medium", "high"}
+
+class AnomalyEvent(BaseModel):
+    device: str
+    metric: str = "cpu_usage"
+    value: Optional[float] = None
+    risk_score: Optional[float] = None
+    risk_label: str = "unknown"
+    alert_id: Optional[str] = None
+
+class AnomalyEventBatch(BaseModel):
+    events: List[AnomalyEvent]
+
+@app.post("/aiops/events")
+def aiops_events(batch: AnomalyEventBatch, x_events_token: str = Header(None)):
+    """
+    Scored anomaly results pushed by the ML gateway (UI_EVENTS_URL there).
+    A device/metric entering, changing or leaving an elevated risk level is
+    broadcast on the "anomaly" topic.
+    """
+    if not UI_EVENTS_TOKEN:
+        raise HTTPException(status_code=503, detail="events_token_not_configured")
+    if not x_events_token or not hmac.compare_digest(x_events_token, UI_EVENTS_TOKEN):
+        raise HTTPException(status_code=403, detail="invalid_events_token")
+    pushed = 0
+    for ev in batch.events:
+        # also feeds the /aiops/summary aggregates
+        previous = aiops_aggregator.observe(ev.dict())
+        if previous != ev.risk_label and (ev.risk_label in ELEVATED_RISK or previous in ELEVATED_RISK):
+            broadcaster.publish_threadsafe("anomaly", {**ev.dict(), "previous": previous})
+            pushed += 1
+    return {"status": "ok", "received": len(batch.events), "pushed": pushed}
+
+def _initial_events(topics) -> List[dict]:
+    """Current state sent on connect, so clients never need an initial poll."""
+    if "health" not in topics:
+        return []
+    snap = status_prober.snapshot()
+    return [{"seq": 0, "topic": "health", "ts": snap["checked_at"],
+             "data": {"snapshot": snap["services"], "stale": snap["stale"]}}]
+
+def _topics(spec: Optional[str]):
+    return [t.strip() for t in spec.split(",")] if spec else None
+
+@app.get("/ui-api/events")
+async def ui_events(topics: Optional[str] = None):
+    """Server-sent events; ?topics=health,anomaly,score (default: all)."""
+    sub = broadcaster.subscribe(_topics(topics))
+
+    async def stream():
+        try:
+            for ev in _initial_events(sub.topics):
+                yield sse_frame(ev)
+            while True:
+                try:
+                    ev = await asyncio.wait_for(sub.get(), timeout=UI_EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if ev is None:
+                    yield f"event: close\ndata: {sub.reason or 'closed'}\n\n".encode()
+                    return
+                yield sse_frame(ev)
+        finally:
+            broadcaster.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/ui-api/ws")
+async def ui_ws(websocket: WebSocket, topics: Optional[str] = None):
+    """Same events as /ui-api/events, as JSON WebSocket messages."""
+    await websocket.accept()
+    sub = broadcaster.subscribe(_topics(topics))
+
+    async def pump():
+        for ev in _initial_events(sub.topics):
+            await websocket.send_json(ev)
+        while True:
+            ev = await sub.get()
+            if ev is None:
+                # 1013 = try again later: the client fell too far behind
+                await websocket.close(code=1013, reason=sub.reason or "closed")
+                return
+            await websocket.send_json(ev)
+
+    async def drain():
+        # nothing is expected from the client; this only notices disconnects
+        while True:
+            await websocket.receive_text()
+
+    tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(drain())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        broadcaster.unsubscribe(sub)
+
+@app.get("/ui-api/events/stats")
+def ui_events_stats():
+    return broadcaster.stats()
+
+expose_stats("ui_events", broadcaster.stats)
+expose_stats("ui_aiops", lambda: {
+    k: v for k, v in aiops_aggregator.snapshot().items()
+    if k in ("active_anomalies", "devices_tracked", "ingest", "scoring")
+})
+# --- End push channel ---
@@ -1,14 +1,23 @@
 import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 import bcrypt
 import pymysql
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 from jose import JWTError, jwt
 from pydantic import BaseModel
 
+from login_guard import HashPool, LoginThrottle, PoolBusy
+from metrics import expose_stats, histogram, timed
+
 router = APIRouter()
 
 # ---- DB settings ----
@@ -17,6 +26,18 @@ AUTH_DB_PORT = int(os.getenv("AUTH_DB_PORT", "3307"))
 AUTH_DB_USER = os.getenv("AUTH_DB_USER", "aiops")
 AUTH_DB_PASS = os.getenv("AUTH_DB_PASS", "password")
 AUTH_DB_NAME = os.getenv("AUTH_DB_NAME", "aiops_auth")
+AUTH_DB_POOL_SIZE = int(os.getenv("AUTH_DB_POOL_SIZE", "8"))
+
+# ---- login protection ----
+AUTH_BCRYPT_WORKERS = int(os.getenv("AUTH_BCRYPT_WORKERS", "4"))
+AUTH_BCRYPT_MAX_PENDING = int(os.getenv("AUTH_BCRYPT_MAX_PENDING", "64"))
+AUTH_LOGIN_MAX_PER_USER = int(os.getenv("AUTH_LOGIN_MAX_PER_USER", "5"))   # failures / window
+AUTH_LOGIN_MAX_PER_IP = int(os.getenv("AUTH_LOGIN_MAX_PER_IP", "30"))      # attempts / window
+AUTH_LOGIN_WINDOW = float(os.getenv("AUTH_LOGIN_WINDOW", "60"))
+
+# ---- user cache (hot users skip the DB entirely) ----
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "30"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "4096"))
 
 # ---- JWT settings ----
 SECRET_KEY = os.getenv("AUTH_SECRET_KEY", "aiops-ui-dev-secret")
@@ -57,6 +78,130 @@ def get_db_conn():
     )
 
 
+DB_POOL_WAIT = histogram("auth2_db_pool_wait_seconds", "Time to check out an auth DB connection")
+
+
+class ConnectionPool:
+    """
+    Small pool of long-lived MariaDB connections.
+
+    Connections are created lazily up to `size`; a checkout pings the
+    connection (reconnecting if the server dropped it) instead of paying a
+    new TCP + auth handshake per query.
+    """
+
+    def __init__(self, size: int = 8, timeout: float = 5.0):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return get_db_conn()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get(timeout=self.timeout)
+
+    def _discard(self, conn) -> None:
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        with timed(DB_POOL_WAIT):
+            conn = self._checkout()
+        try:
+            conn.ping(reconnect=True)
+            yield conn
+        except Exception:
+            self._discard(conn)
+            raise
+        else:
+            self._idle.put(conn)
+
+
+db_pool = ConnectionPool(AUTH_DB_POOL_SIZE)
+
+
+class UserCache:
+    """
+    Username -> UserInDB, size-bounded LRU with a short TTL.
+
+    The TTL bounds how long a role or is_active change made directly in the
+    DB can go unnoticed; code that changes a user should call
+    invalidate_user() so the change applies immediately.
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = max(1, maxsize)
+        self._data: "OrderedDict[str, Tuple[float, UserInDB]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username: str) -> Optional["UserInDB"]:
+        with self._lock:
+            item = self._data.get(username)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[username]
+                self.misses += 1
+                return None
+            self._data.move_to_end(username)
+            self.hits += 1
+            return item[1]
+
+    def set(self, username: str, user: "UserInDB") -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[username] = (time.monotonic() + self.ttl, user)
+            self._data.move_to_end(username)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, username: Optional[str] = None) -> None:
+        with self._lock:
+            if username is None:
+                self._data.clear()
+            else:
+                self._data.pop(username, None)
+
+    def stats(self) -> Dict[str, object]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+user_cache = UserCache(AUTH_USER_CACHE_TTL, AUTH_USER_CACHE_SIZE)
+
+
+def invalidate_user(username: Optional[str] = None) -> None:
+    """Drop a cached user record (all of them if username is None)."""
+    user_cache.invalidate(username)
+
+
 def verify_password(plain_password: str, password_hash: str) -> bool:
     """
     Compare plain text password with bcrypt hash from DB.
@@ -74,8 +219,7 @@ def verify_password(plain_password: str, password_hash: str) -> bool:
 
 
 def get_user(username: str) -> Optional[UserInDB]:
-    conn = get_db_conn()
-    try:
+    with db_pool.connection() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 "SELECT id, username, role, password_hash, is_active "
@@ -83,8 +227,6 @@ def get_user(username: str) -> Optional[UserInDB]:
                 (username,),
             )
             row = cur.fetchone()
-    finally:
-        conn.close()
 
     if not row:
         return None
@@ -108,6 +250,45 @@ def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
     return user
 
 
+hash_pool = HashPool(AUTH_BCRYPT_WORKERS, AUTH_BCRYPT_MAX_PENDING)
+login_throttle = LoginThrottle(AUTH_LOGIN_MAX_PER_USER, AUTH_LOGIN_MAX_PER_IP, AUTH_LOGIN_WINDOW)
+LOGIN_OUTCOMES = ("ok", "failed", "rejected")
+LOGIN_SECONDS = histogram("auth2_login_seconds", "Login latency", ["outcome"])
+for _outcome in LOGIN_OUTCOMES:
+    LOGIN_SECONDS.labels(_outcome)  # export every outcome from the start
+
+
+def observe_login(outcome: str, seconds: float) -> None:
+    LOGIN_SECONDS.labels(outcome).observe(seconds)
+
+
+def login_latency() -> Dict[str, Dict[str, object]]:
+    """auth2_login_seconds per outcome as {"count", "sum", "buckets"}; {} without prometheus_client."""
+    out: Dict[str, Dict[str, object]] = {}
+    for family in getattr(LOGIN_SECONDS, "collect", list)():
+        for sample in family.samples:
+            h = out.setdefault(sample.labels["outcome"], {"count": 0, "sum": 0.0, "buckets": {}})
+            if sample.name.endswith("_bucket"):
+                h["buckets"][sample.labels["le"]] = int(sample.value)
+            elif sample.name.endswith("_count"):
+                h["count"] = int(sample.value)
+            elif sample.name.endswith("_sum"):
+                h["sum"] = sample.value
+    return out
+
+# Unknown usernames are checked against this so they cost the same as real ones
+_DUMMY_HASH = bcrypt.hashpw(b"auth2-dummy", bcrypt.gensalt()).decode("utf-8")
+
+
+async def authenticate_user_async(username: str, password: str) -> Optional[UserInDB]:
+    """authenticate_user() without blocking the event loop (DB + bcrypt off-loop)."""
+    user = await run_in_threadpool(get_user, username)
+    ok = await hash_pool.run(
+        verify_password, password, user.password_hash if user else _DUMMY_HASH
+    )
+    return user if (user and ok) else None
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (
@@ -132,9 +313,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
     except JWTError:
         raise credentials_exception
 
-    user = get_user(username)
+    # Hot path: signature check above + an in-memory lookup, no DB round-trip
+    user = user_cache.get(username)
     if user is None:
-        raise credentials_exception
+        user = await run_in_threadpool(get_user, username)
+        if user is None:
+            raise credentials_exception
+        user_cache.set(username, user)
     return user
 
 
@@ -150,20 +335,47 @@ async def get_current_active_user(
 
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Form-encoded login:
       username=admin&password=password
     Returns JWT access_token if OK.
     """
-    user = authenticate_user(form_data.username, form_data.password)
+    t0 = time.perf_counter()
+    ip = request.client.host if request.client else None
+
+    limited = login_throttle.check(form_data.username, ip)
+    if limited is not None:
+        observe_login("rejected", time.perf_counter() - t0)
+        scope, retry_after = limited
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many login attempts for this {scope} (auth2)",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.5)))},
+        )
+
+    try:
+        user = await authenticate_user_async(form_data.username, form_data.password)
+    except PoolBusy:
+        observe_login("rejected", time.perf_counter() - t0)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Login busy, retry shortly (auth2)",
+            headers={"Retry-After": "1"},
+        )
     if not user:
+        login_throttle.failed(form_data.username)
+        observe_login("failed", time.perf_counter() - t0)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password (auth2)",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    login_throttle.succeeded(form_data.username)
+    observe_login("ok", time.perf_counter() - t0)
+    # fresh row from the DB: seed the cache so the first API call is a hit
+    user_cache.set(user.username, user)
     access_token = create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -179,3 +391,37 @@ async def read_users_me(current_user: UserInDB = Depends(get_current_active_user
         "role": current_user.role,
         "is_active": current_user.is_active,
     }
+
+
+@router.post("/cache/invalidate")
+async def invalidate_user_cache(
+    username: Optional[str] = None,
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    """
+    Admin only: forget cached user records after a role / is_active change.
+    Without `username` the whole cache is cleared.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only (auth2)")
+    invalidate_user(username)
+    return {"status": "ok", "cache": user_cache.stats()}
+
+
+@router.get("/stats/login")
+async def login_stats():
+    """Login latency histograms (seconds), hash pool and throttle counters."""
+    return {
+        "latency_seconds": login_latency(),
+        "hash_pool": hash_pool.stats(),
+        "throttle": login_throttle.stats(),
+        "user_cache": user_cache.stats(),
+    }
+
+
+# pool/throttle/cache counters, read at scrape time (login latency is auth2_login_seconds)
+expose_stats("auth2", lambda: {
+    "hash_pool": {k: v for k, v in hash_pool.stats().items() if not k.endswith("_seconds")},
+    "throttle": login_throttle.stats(),
+    "user_cache": user_cache.stats(),
+})
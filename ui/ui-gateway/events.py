@@ -0,0 +1,102 @@
+"""
+In-process pub/sub for the portal push channel.
+
+Producers (health prober transitions, anomaly events, score saves) publish
+once; every subscriber has its own bounded queue. A subscriber whose queue
+fills up is disconnected instead of slowing the producer down or growing
+memory without bound, so cost scales with the event rate, not with
+clients x poll rate.
+"""
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, Dict, Iterable, Optional, Set
+
+TOPICS = ("health", "anomaly", "score")
+
+
+class Subscriber:
+    __slots__ = ("id", "topics", "queue", "closed", "reason")
+
+    def __init__(self, sid: int, topics: Set[str], maxsize: int):
+        self.id = sid
+        self.topics = topics
+        self.queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize)
+        self.closed = False
+        self.reason: Optional[str] = None
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        """Next event, or None once the subscriber has been closed."""
+        if self.closed and self.queue.empty():
+            return None
+        return await self.queue.get()
+
+
+class Broadcaster:
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subs: Dict[int, Subscriber] = {}
+        self._ids = itertools.count(1)
+        self._seq = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.delivered = 0
+        self.slow_disconnects = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Remember the serving loop so sync handlers can publish from worker threads."""
+        self._loop = loop
+
+    def subscribe(self, topics: Optional[Iterable[str]] = None) -> Subscriber:
+        wanted = {t for t in (topics or TOPICS) if t in TOPICS} or set(TOPICS)
+        sub = Subscriber(next(self._ids), wanted, self.queue_size)
+        self._subs[sub.id] = sub
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        sub.closed = True
+        self._subs.pop(sub.id, None)
+
+    def _close(self, sub: Subscriber, reason: str) -> None:
+        self.unsubscribe(sub)
+        sub.reason = reason
+        # make room for the sentinel so the consumer wakes up and exits
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)
+
+    def publish(self, topic: str, data: Dict[str, Any]) -> None:
+        """Fan one event out to every matching subscriber (event-loop thread only)."""
+        event = {"seq": next(self._seq), "topic": topic, "ts": time.time(), "data": data}
+        self.published += 1
+        for sub in list(self._subs.values()):
+            if topic not in sub.topics:
+                continue
+            try:
+                sub.queue.put_nowait(event)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self.slow_disconnects += 1
+                self._close(sub, "slow_consumer")
+
+    def publish_threadsafe(self, topic: str, data: Dict[str, Any]) -> None:
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self.publish, topic, data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subs),
+            "queue_size": self.queue_size,
+            "published": self.published,
+            "delivered": self.delivered,
+            "slow_disconnects": self.slow_disconnects,
+        }
+
+
+def sse_frame(event: Dict[str, Any]) -> bytes:
+    return (
+        f"id: {event['seq']}\nevent: {event['topic']}\n"
+        f"data: {json.dumps(event['data'], separators=(',', ':'))}\n\n"
+    ).encode("utf-8")
@@ -0,0 +1,99 @@
+"""
+Background health prober.
+
+All targets are probed concurrently every `interval` seconds by one task;
+handlers read the last snapshot from memory, so dashboards polling status
+never fan out to the services themselves.
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+
+def parse_targets(spec: str) -> Dict[str, str]:
+    """"name=url,name=url" -> {name: url}."""
+    targets = {}
+    for part in (spec or "").split(","):
+        name, sep, url = part.strip().partition("=")
+        if sep and name and url:
+            targets[name.strip()] = url.strip()
+    return targets
+
+
+class HealthProber:
+    def __init__(self, targets: Dict[str, str], interval: float = 15.0, timeout: float = 2.0,
+                 on_change: Optional[Callable[[str, Optional[str], Dict[str, Any]], None]] = None):
+        self.targets = dict(targets)
+        self.interval = interval
+        self.timeout = timeout
+        # called as on_change(name, previous_status, result) when a status flips
+        self.on_change = on_change
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.checked_at: Optional[float] = None
+        self.rounds = 0
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def _probe(self, name: str, url: str) -> None:
+        t0 = time.perf_counter()
+        result: Dict[str, Any] = {"url": url}
+        try:
+            resp = await self._client.get(url)
+            result["http_status"] = resp.status_code
+            result["status"] = "up" if resp.status_code < 400 else "degraded"
+        except httpx.HTTPError as e:
+            result["status"] = "down"
+            result["error"] = type(e).__name__
+        result["latency_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        result["checked_at"] = time.time()
+        previous = (self.results.get(name) or {}).get("status")
+        self.results[name] = result
+        if self.on_change is not None and previous != result["status"]:
+            self.on_change(name, previous, result)
+
+    async def probe_once(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        await asyncio.gather(*(self._probe(n, u) for n, u in self.targets.items()))
+        self.checked_at = time.time()
+        self.rounds += 1
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.probe_once()
+            except Exception as e:  # keep probing; a bad round must not kill the loop
+                print("health prober round failed:", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.results.get(name)
+
+    def snapshot(self) -> Dict[str, Any]:
+        age = (time.time() - self.checked_at) if self.checked_at else None
+        return {
+            "checked_at": self.checked_at,
+            "age_seconds": round(age, 1) if age is not None else None,
+            # missed two rounds in a row -> the prober itself is in trouble
+            "stale": age is None or age > 2 * self.interval + self.timeout,
+            "interval": self.interval,
+            "services": dict(self.results),
+        }
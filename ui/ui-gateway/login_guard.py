@@ -0,0 +1,148 @@
+"""
+Login protection for auth2.
+
+- HashPool runs bcrypt checks on a bounded worker pool so a login burst
+  cannot freeze the event loop; beyond `max_pending` checks new logins are
+  refused instead of queueing without bound.
+- LoginThrottle counts attempts per username and per client IP in a sliding
+  window and rejects floods before any hash work is done.
+- Histogram keeps cumulative buckets (Prometheus style) for the pool's
+  queue wait and hash time.
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class PoolBusy(Exception):
+    """Too many password checks already pending."""
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._counts[bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cumulative, running = {}, 0
+            for le, n in zip(self.buckets + (float("inf"),), self._counts):
+                running += n
+                cumulative["+Inf" if le == float("inf") else f"{le:g}"] = running
+            return {"count": self.count, "sum": self.sum, "buckets": cumulative}
+
+
+class HashPool:
+    def __init__(self, workers: int = 4, max_pending: int = 64):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self.pending = 0
+        self.rejected = 0
+        self.queue_wait = Histogram()
+        self.run_time = Histogram()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PoolBusy()
+        self.pending += 1
+        submitted = time.perf_counter()
+
+        def timed() -> Any:
+            started = time.perf_counter()
+            self.queue_wait.observe(started - submitted)
+            try:
+                return fn(*args)
+            finally:
+                self.run_time.observe(time.perf_counter() - started)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "hash_seconds": self.run_time.snapshot(),
+        }
+
+
+class LoginThrottle:
+    """
+    Sliding-window limits: at most `per_ip` attempts per client IP and
+    `per_user` failed attempts per username within `window` seconds.
+    A successful login clears the username's failures.
+    """
+
+    def __init__(self, per_user: int = 5, per_ip: int = 30, window: float = 60.0,
+                 max_keys: int = 100000):
+        self.per_user = per_user
+        self.per_ip = per_ip
+        self.window = window
+        self.max_keys = max_keys
+        self._ip: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self._user: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self.rejected = {"ip": 0, "user": 0}
+
+    def _hits(self, table: "OrderedDict[str, Deque[float]]", key: str, now: float) -> Deque[float]:
+        q = table.get(key)
+        if q is None:
+            q = table[key] = deque()
+            while len(table) > self.max_keys:
+                table.popitem(last=False)
+        table.move_to_end(key)
+        while q and q[0] <= now - self.window:
+            q.popleft()
+        return q
+
+    def check(self, username: str, ip: Optional[str]) -> Optional[Tuple[str, float]]:
+        """Record an attempt; return (scope, retry_after) if it must be rejected."""
+        now = time.monotonic()
+        user_q = self._hits(self._user, username.lower(), now)
+        if self.per_user > 0 and len(user_q) >= self.per_user:
+            self.rejected["user"] += 1
+            return "user", user_q[0] + self.window - now
+        if ip:
+            ip_q = self._hits(self._ip, ip, now)
+            if self.per_ip > 0 and len(ip_q) >= self.per_ip:
+                self.rejected["ip"] += 1
+                return "ip", ip_q[0] + self.window - now
+            ip_q.append(now)
+        return None
+
+    def failed(self, username: str) -> None:
+        self._hits(self._user, username.lower(), time.monotonic()).append(time.monotonic())
+
+    def succeeded(self, username: str) -> None:
+        self._user.pop(username.lower(), None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "per_user": self.per_user,
+            "per_ip": self.per_ip,
+            "window": self.window,
+            "tracked_users": len(self._user),
+            "tracked_ips": len(self._ip),
+            "rejected": dict(self.rejected),
+        }
@@ -0,0 +1,127 @@
+"""
+Pooled async HTTP clients for the backends the UI gateway proxies to.
+
+Each Backend owns one httpx.AsyncClient (keep-alive pool sized per backend)
+and a semaphore bounding in-flight calls, so a slow Rasa cannot starve the
+auth passthrough and no request ever blocks a worker thread.
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+from fastapi import HTTPException
+
+
+def _env(prefix: str, name: str, default: str) -> str:
+    return os.environ.get(f"{prefix}_{name}", default)
+
+
+class Backend:
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        timeout: float = 10.0,
+        connect_timeout: float = 2.0,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        max_concurrent: int = 64,
+        queue_timeout: float = 2.0,
+    ):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=30.0,
+        )
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self._sem = asyncio.Semaphore(max_concurrent)
+        self.client: Optional[httpx.AsyncClient] = None
+
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, base_url: str, **defaults: Any) -> "Backend":
+        """<PREFIX>_URL, _TIMEOUT, _MAX_CONNECTIONS, _MAX_KEEPALIVE, _MAX_CONCURRENT, _QUEUE_TIMEOUT."""
+        return cls(
+            name,
+            _env(prefix, "URL", base_url),
+            timeout=float(_env(prefix, "TIMEOUT", str(defaults.get("timeout", 10.0)))),
+            connect_timeout=float(_env(prefix, "CONNECT_TIMEOUT", str(defaults.get("connect_timeout", 2.0)))),
+            max_connections=int(_env(prefix, "MAX_CONNECTIONS", str(defaults.get("max_connections", 100)))),
+            max_keepalive=int(_env(prefix, "MAX_KEEPALIVE", str(defaults.get("max_keepalive", 20)))),
+            max_concurrent=int(_env(prefix, "MAX_CONCURRENT", str(defaults.get("max_concurrent", 64)))),
+            queue_timeout=float(_env(prefix, "QUEUE_TIMEOUT", str(defaults.get("queue_timeout", 2.0)))),
+        )
+
+    async def start(self) -> None:
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url, timeout=self.timeout, limits=self.limits
+            )
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of this backend's concurrency slots (503 if none frees up in time)."""
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail=f"{self.name}_busy",
+                headers={"Retry-After": "1"},
+            )
+        self.in_flight += 1
+        self.requests += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._sem.release()
+
+    async def request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        await self.start()
+        async with self.slot():
+            try:
+                return await self.client.request(method, path, **kwargs)
+            except httpx.HTTPError:
+                self.errors += 1
+                raise
+
+    @asynccontextmanager
+    async def stream(self, method: str, path: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """Like request(), but the body is left unread; the slot is held until the caller is done."""
+        await self.start()
+        async with self.slot():
+            try:
+                async with self.client.stream(method, path, **kwargs) as resp:
+                    yield resp
+            except httpx.HTTPError:
+                self.errors += 1
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+        }
@@ -0,0 +1,204 @@
+"""
+SQLite (WAL) storage for portal quiz scores.
+
+Rows live in `scores` (indexed by user/module/timestamp, keyset-paginated on
+id); `score_totals` (per user and module) and `module_totals` (all users) are
+maintained in the same transaction as each insert, so aggregates are
+primary-key lookups regardless of how much history has accumulated.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores(
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    user      TEXT    NOT NULL DEFAULT '',
+    module    INTEGER NOT NULL,
+    score     TEXT    NOT NULL,
+    score_num REAL,
+    ts        TEXT    NOT NULL,
+    created   REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scores_user        ON scores(user, id);
+CREATE INDEX IF NOT EXISTS idx_scores_user_module ON scores(user, module, id);
+CREATE INDEX IF NOT EXISTS idx_scores_module      ON scores(module, id);
+CREATE INDEX IF NOT EXISTS idx_scores_ts          ON scores(ts);
+
+CREATE TABLE IF NOT EXISTS score_totals(
+    user        TEXT    NOT NULL,
+    module      INTEGER NOT NULL,
+    submissions INTEGER NOT NULL,
+    correct     INTEGER NOT NULL,
+    best        REAL,
+    last_ts     TEXT,
+    PRIMARY KEY(user, module)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS module_totals(
+    module      INTEGER PRIMARY KEY,
+    submissions INTEGER NOT NULL,
+    correct     INTEGER NOT NULL,
+    best        REAL,
+    last_ts     TEXT
+);
+"""
+
+_UPSERT_TOTALS = (
+    " VALUES ({keys}1,?,?,?)"
+    " ON CONFLICT({conflict}) DO UPDATE SET"
+    "  submissions = submissions + 1,"
+    "  correct = correct + excluded.correct,"
+    "  best = CASE WHEN best IS NULL OR excluded.best > best"
+    "              THEN excluded.best ELSE best END,"
+    "  last_ts = CASE WHEN last_ts IS NULL OR excluded.last_ts > last_ts"
+    "                 THEN excluded.last_ts ELSE last_ts END"
+)
+_UPSERT_USER = (
+    "INSERT INTO score_totals(user, module, submissions, correct, best, last_ts)"
+    + _UPSERT_TOTALS.format(keys="?,?,", conflict="user, module")
+)
+_UPSERT_MODULE = (
+    "INSERT INTO module_totals(module, submissions, correct, best, last_ts)"
+    + _UPSERT_TOTALS.format(keys="?,", conflict="module")
+)
+
+# The quiz submits the selected option's value; "1" marks the right answer.
+CORRECT = "1"
+
+
+def _num(score: str) -> Optional[float]:
+    try:
+        return float(score)
+    except (TypeError, ValueError):
+        return None
+
+
+def _row(r: Tuple) -> Dict[str, Any]:
+    rid, user, module, score, ts = r
+    return {"id": rid, "user": user or None, "module": module, "score": score, "timestamp": ts}
+
+
+class ScoreStore:
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per worker thread; WAL lets readers run alongside the writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # -- writes -----------------------------------------------------------
+
+    def add(self, module: int, score: str, timestamp: Optional[str] = None,
+            user: Optional[str] = None) -> int:
+        return self.add_many([(user, module, score, timestamp)])[-1]
+
+    def add_many(self, rows: List[Tuple[Optional[str], int, str, Optional[str]]]) -> List[int]:
+        conn = self._conn()
+        now = time.time()
+        ids = []
+        with conn:
+            for user, module, score, ts in rows:
+                user = user or ""
+                ts = ts or time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now))
+                num = _num(score)
+                cur = conn.execute(
+                    "INSERT INTO scores(user, module, score, score_num, ts, created)"
+                    " VALUES (?,?,?,?,?,?)",
+                    (user, module, score, num, ts, now),
+                )
+                ids.append(cur.lastrowid)
+                correct = int(score == CORRECT)
+                conn.execute(_UPSERT_USER, (user, module, correct, num, ts))
+                conn.execute(_UPSERT_MODULE, (module, correct, num, ts))
+        return ids
+
+    def import_log(self, path: str) -> int:
+        """One-time import of the old JSON-lines log; skipped once any rows exist."""
+        if not os.path.exists(path):
+            return 0
+        if self._conn().execute("SELECT 1 FROM scores LIMIT 1").fetchone():
+            return 0
+        rows = []
+        with open(path) as f:
+            for line in f:
+                try:
+                    d = json.loads(line)
+                    rows.append((d.get("user"), int(d["module"]), str(d["score"]), d.get("timestamp")))
+                except Exception:
+                    continue
+        if rows:
+            self.add_many(rows)
+        return len(rows)
+
+    # -- reads ------------------------------------------------------------
+
+    def page(self, user: Optional[str] = None, module: Optional[int] = None,
+             since: Optional[str] = None, until: Optional[str] = None,
+             cursor: Optional[int] = None, limit: int = 100) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Newest first. Pass the returned cursor back to get the next (older) page."""
+        where, args = [], []
+        if user is not None:
+            where.append("user = ?")
+            args.append(user)
+        if module is not None:
+            where.append("module = ?")
+            args.append(module)
+        if since:
+            where.append("ts >= ?")
+            args.append(since)
+        if until:
+            where.append("ts < ?")
+            args.append(until)
+        if cursor is not None:
+            where.append("id < ?")
+            args.append(cursor)
+        sql = "SELECT id, user, module, score, ts FROM scores"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ?"
+        rows = self._conn().execute(sql, args + [limit + 1]).fetchall()
+        items = [_row(r) for r in rows[:limit]]
+        next_cursor = items[-1]["id"] if len(rows) > limit else None
+        return items, next_cursor
+
+    def totals(self, user: Optional[str] = None,
+               module: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Per-module submissions / correct / best, for one user or across all users."""
+        table = "score_totals" if user is not None else "module_totals"
+        where, args = [], []
+        if user is not None:
+            where.append("user = ?")
+            args.append(user)
+        if module is not None:
+            where.append("module = ?")
+            args.append(module)
+        sql = f"SELECT module, submissions, correct, best, last_ts FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY module"
+        return [
+            {
+                "module": m,
+                "submissions": n,
+                "correct": c,
+                "correct_ratio": round(c / n, 4) if n else 0.0,
+                "best": best,
+                "last_timestamp": last,
+            }
+            for m, n, c, best, last in self._conn().execute(sql, args).fetchall()
+        ]
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from score_store import ScoreStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = ScoreStore(str(tmp_path / "scores.db"))
+    s.add_many([
+        (f"user{i % 3}", i % 2 + 1, "1" if i % 4 == 0 else "0", f"2026-01-01T00:{i:02d}:00Z")
+        for i in range(25)
+    ])
+    return s
+
+
+def all_pages(store, **filters):
+    pages, cursor = [], None
+    while True:
+        items, cursor = store.page(cursor=cursor, **filters)
+        pages.append(items)
+        if cursor is None:
+            return pages
+
+
+def test_pages_walk_every_row_newest_first_without_overlap(store):
+    pages = all_pages(store, limit=10)
+    assert [len(p) for p in pages] == [10, 10, 5]
+    ids = [r["id"] for p in pages for r in p]
+    assert ids == sorted(ids, reverse=True)
+    assert len(set(ids)) == 25
+
+
+def test_exact_multiple_of_limit_has_no_empty_last_page(store):
+    items, cursor = store.page(limit=25)
+    assert len(items) == 25 and cursor is None
+
+
+def test_cursor_is_stable_when_new_rows_arrive(store):
+    first, cursor = store.page(limit=10)
+    store.add(1, "1", user="late")  # newer than everything: must not shift older pages
+    second, _ = store.page(cursor=cursor, limit=10)
+    assert second[0]["id"] == first[-1]["id"] - 1
+
+
+def test_filters_apply_to_every_page(store):
+    pages = all_pages(store, user="user1", module=2, limit=2)
+    rows = [r for p in pages for r in p]
+    assert rows and all(r["user"] == "user1" and r["module"] == 2 for r in rows)
+    since = [r for p in all_pages(store, since="2026-01-01T00:20:00Z", limit=3) for r in p]
+    assert len(since) == 5
+
+
+def test_totals_match_the_rows(store):
+    totals = {t["module"]: t for t in store.totals()}
+    assert sum(t["submissions"] for t in totals.values()) == 25
+    assert sum(t["correct"] for t in totals.values()) == 7  # i = 0, 4, ..., 24
+    per_user = store.totals(user="user0")
+    assert sum(t["submissions"] for t in per_user) == 9
+
+
+def test_import_log_runs_once(tmp_path):
+    log = tmp_path / "scores.log"
+    log.write_text("\n".join(json.dumps({"module": 1, "score": "1", "user": "u"}) for _ in range(3)) + "\nnot json\n")
+    s = ScoreStore(str(tmp_path / "imported.db"))
+    assert s.import_log(str(log)) == 3
+    assert s.import_log(str(log)) == 0
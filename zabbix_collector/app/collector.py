@@ -0,0 +1,301 @@
+"""
+Zabbix -> datalake collector.
+
+Every POLL_INTERVAL seconds it pulls new item values from the Zabbix JSON-RPC
+API (history.get, or hourly trend.get with ZABBIX_MODE=trends) and posts them
+in bulk to fastapi_service's /ingest/zabbix_events/bulk.
+
+- Items are refreshed from host.get / item.get every ZABBIX_ITEM_REFRESH seconds
+  (ZABBIX_HOST_BATCH hosts per item.get call).
+- Each item has its own cursor (last clock collected). Items with the same
+  cursor and value type are fetched together, ZABBIX_ITEM_BATCH itemids per
+  call, up to ZABBIX_CONCURRENCY calls in flight.
+- A cursor only moves once that batch's rows are stored, and the cursors are
+  written to CHECKPOINT_FILE after every poll, so a restart resumes where it
+  stopped instead of re-reading history. Delivery is at-least-once: a crash
+  between posting and checkpointing re-posts that window.
+- New items start ZABBIX_BACKFILL seconds back. A window is at most
+  ZABBIX_MAX_WINDOW seconds; while behind, polls run back to back.
+
+    python collector.py            # run forever
+    python collector.py --once     # one poll, then exit (e.g. against bench/stubs.py:zabbix_app)
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per request otherwise
+
+# --- Configuration ---
+ZABBIX_URL = os.getenv("ZABBIX_URL", "http://zabbix-web:8080/api_jsonrpc.php")
+ZABBIX_TOKEN = os.getenv("ZABBIX_TOKEN", "")              # API token (Zabbix >= 5.4), preferred
+ZABBIX_USER = os.getenv("ZABBIX_USER", "Admin")            # else user.login with these
+ZABBIX_PASSWORD = os.getenv("ZABBIX_PASSWORD", "zabbix")
+ZABBIX_AUTH_HEADER = os.getenv("ZABBIX_AUTH_HEADER", "0") == "1"  # Authorization: Bearer (Zabbix >= 6.4)
+ZABBIX_GROUPIDS = [g for g in os.getenv("ZABBIX_GROUPIDS", "").split(",") if g.strip()]
+ZABBIX_MODE = os.getenv("ZABBIX_MODE", "history")          # history | trends
+FASTAPI_URL = os.getenv("FASTAPI_URL", "http://192.168.206.136:8080/ingest/zabbix_events/bulk")
+CHECKPOINT_FILE = os.getenv("CHECKPOINT_FILE", "/data/zabbix_checkpoint.json")
+
+POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", "60"))
+ITEM_REFRESH = float(os.getenv("ZABBIX_ITEM_REFRESH", "600"))
+HOST_BATCH = int(os.getenv("ZABBIX_HOST_BATCH", "200"))
+ITEM_BATCH = int(os.getenv("ZABBIX_ITEM_BATCH", "500"))
+CONCURRENCY = int(os.getenv("ZABBIX_CONCURRENCY", "8"))
+POST_BATCH = int(os.getenv("POST_BATCH", "2000"))          # <= fastapi_service BULK_MAX_ROWS
+BACKFILL = int(os.getenv("ZABBIX_BACKFILL", "3600"))
+MAX_WINDOW = int(os.getenv("ZABBIX_MAX_WINDOW", "3600"))
+# values can reach Zabbix late (proxies, agent buffers); stay this far behind now
+LAG = int(os.getenv("ZABBIX_LAG", "60"))
+TIMEOUT = float(os.getenv("ZABBIX_TIMEOUT", "30"))
+RETRIES = int(os.getenv("RETRIES", "3"))
+
+NUMERIC = {0, 3}  # float, unsigned: the only value types with trends
+TREND_PERIOD = 3600
+
+
+class ZabbixError(Exception):
+    pass
+
+
+class ZabbixAPI:
+    """Minimal async JSON-RPC client; one shared connection pool."""
+
+    def __init__(self, client: httpx.AsyncClient, url: str):
+        self.client = client
+        self.url = url
+        self.auth: Optional[str] = None
+        self._id = 0
+
+    async def call(self, method: str, params: Any, auth: bool = True) -> Any:
+        self._id += 1
+        body: Dict[str, Any] = {"jsonrpc": "2.0", "method": method, "params": params, "id": self._id}
+        headers = {}
+        if auth and self.auth:
+            if ZABBIX_AUTH_HEADER:
+                headers["Authorization"] = f"Bearer {self.auth}"
+            else:
+                body["auth"] = self.auth
+        resp = await self.client.post(self.url, json=body, headers=headers)
+        resp.raise_for_status()
+        data = resp.json()
+        if "error" in data:
+            err = data["error"]
+            raise ZabbixError(f"{method}: {err.get('message')} {err.get('data')}")
+        return data["result"]
+
+    async def login(self) -> None:
+        version = await self.call("apiinfo.version", {}, auth=False)
+        if ZABBIX_TOKEN:
+            self.auth = ZABBIX_TOKEN
+        else:
+            # Zabbix < 5.4 called the login field "user"
+            field = "username" if tuple(int(p) for p in version.split(".")[:2]) >= (5, 4) else "user"
+            self.auth = await self.call("user.login", {field: ZABBIX_USER, "password": ZABBIX_PASSWORD}, auth=False)
+        logging.info(f"Connected to Zabbix API {version} at {self.url}")
+
+
+async def with_retries(what: str, fn, *args):
+    for attempt in range(1, RETRIES + 1):
+        try:
+            return await fn(*args)
+        except (httpx.HTTPError, ZabbixError) as e:
+            if attempt == RETRIES:
+                raise
+            delay = min(10.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+            logging.warning(f"{what} failed ({e}); retry {attempt}/{RETRIES - 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+# --- Checkpoint ---
+
+def load_checkpoint(path: str) -> Dict[str, int]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.error(f"Unreadable checkpoint {path} ({e}); starting from ZABBIX_BACKFILL")
+        return {}
+    if data.get("mode") != ZABBIX_MODE:
+        logging.warning(f"Checkpoint is for mode {data.get('mode')!r}, not {ZABBIX_MODE!r}; ignoring it")
+        return {}
+    return {k: int(v) for k, v in data.get("cursors", {}).items()}
+
+
+def save_checkpoint(path: str, cursors: Dict[str, int]) -> None:
+    # write-then-rename so a crash never leaves a half-written checkpoint
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"mode": ZABBIX_MODE, "saved_at": int(time.time()), "cursors": cursors}, f)
+    os.replace(tmp, path)
+
+
+# --- Collection ---
+
+async def fetch_items(api: ZabbixAPI, sem: asyncio.Semaphore) -> Dict[str, Tuple[str, str, int]]:
+    """itemid -> (host, key_, value_type) for every monitored item."""
+    params: Dict[str, Any] = {"output": ["hostid", "host"], "monitored_hosts": True}
+    if ZABBIX_GROUPIDS:
+        params["groupids"] = ZABBIX_GROUPIDS
+    hosts = await with_retries("host.get", api.call, "host.get", params)
+    names = {h["hostid"]: h["host"] for h in hosts}
+    hostids = list(names)
+
+    async def chunk(ids: List[str]) -> List[Dict[str, Any]]:
+        async with sem:
+            return await with_retries("item.get", api.call, "item.get", {
+                "output": ["itemid", "hostid", "key_", "value_type"],
+                "hostids": ids, "monitored": True,
+                "filter": {"value_type": sorted(NUMERIC) if ZABBIX_MODE == "trends" else [0, 1, 3, 4]},
+            })
+
+    chunks = await asyncio.gather(*(chunk(hostids[i:i + HOST_BATCH]) for i in range(0, len(hostids), HOST_BATCH)))
+    items = {it["itemid"]: (names.get(it["hostid"], it["hostid"]), it["key_"], int(it["value_type"]))
+             for part in chunks for it in part}
+    logging.info(f"{len(items)} items on {len(hosts)} hosts")
+    return items
+
+
+def plan(items: Dict[str, Tuple[str, str, int]], cursors: Dict[str, int],
+         now: int) -> Tuple[List[Tuple[int, int, int, List[str]]], int]:
+    """
+    Group items by (value type, cursor) into batches.
+    -> ([(value_type, time_from, time_till, itemids)], latest time_till allowed now)
+    """
+    if ZABBIX_MODE == "trends":
+        # only completed hours; trend clocks are the start of the hour
+        till_cap = (now - LAG) // TREND_PERIOD * TREND_PERIOD - 1
+    else:
+        till_cap = now - LAG
+    groups: Dict[Tuple[int, int], List[str]] = {}
+    for itemid, (_, _, value_type) in items.items():
+        start = cursors.get(itemid, now - BACKFILL) + 1
+        if start <= till_cap:
+            groups.setdefault((value_type, start), []).append(itemid)
+    batches = []
+    for (value_type, start), ids in groups.items():
+        till = min(till_cap, start + MAX_WINDOW - 1)
+        for i in range(0, len(ids), ITEM_BATCH):
+            batches.append((value_type, start, till, ids[i:i + ITEM_BATCH]))
+    return batches, till_cap
+
+
+def to_events(rows: List[Dict[str, Any]], items: Dict[str, Tuple[str, str, int]]) -> List[Dict[str, Any]]:
+    events = []
+    for r in rows:
+        host, key, _ = items[r["itemid"]]
+        clock = int(r["clock"]) + int(r.get("ns", 0)) / 1e9
+        if ZABBIX_MODE == "trends":
+            value = json.dumps({"min": float(r["value_min"]), "avg": float(r["value_avg"]),
+                                "max": float(r["value_max"]), "num": int(r["num"])})
+        else:
+            value = str(r["value"])
+        events.append({"host": host, "item_key": key, "value": value,
+                       "timestamp": datetime.fromtimestamp(clock, tz=timezone.utc).isoformat()})
+    return events
+
+
+async def post_chunk(client: httpx.AsyncClient, events: List[Dict[str, Any]]) -> None:
+    resp = await client.post(FASTAPI_URL, json={"events": events})
+    resp.raise_for_status()
+
+
+async def collect_batch(api: ZabbixAPI, client: httpx.AsyncClient, sem: asyncio.Semaphore,
+                        items: Dict[str, Tuple[str, str, int]], batch: Tuple[int, int, int, List[str]]) -> int:
+    value_type, start, till, itemids = batch
+    if ZABBIX_MODE == "trends":
+        method = "trend.get"
+        params = {"output": ["itemid", "clock", "num", "value_min", "value_avg", "value_max"],
+                  "itemids": itemids, "time_from": start, "time_till": till}
+    else:
+        method = "history.get"
+        params = {"output": "extend", "history": value_type, "itemids": itemids,
+                  "time_from": start, "time_till": till, "sortfield": "clock", "sortorder": "ASC"}
+    async with sem:
+        rows = await with_retries(method, api.call, method, params)
+        events = to_events(rows, items)
+        for i in range(0, len(events), POST_BATCH):
+            await with_retries("bulk post", post_chunk, client, events[i:i + POST_BATCH])
+    return len(events)
+
+
+async def poll(api: ZabbixAPI, client: httpx.AsyncClient, sem: asyncio.Semaphore,
+               items: Dict[str, Tuple[str, str, int]], cursors: Dict[str, int]) -> bool:
+    """One pass over all items; updates `cursors` in place. -> True while still catching up."""
+    t0 = time.monotonic()
+    now = int(time.time())
+    batches, till_cap = plan(items, cursors, now)
+    results = await asyncio.gather(*(collect_batch(api, client, sem, items, b) for b in batches),
+                                   return_exceptions=True)
+    rows, errors = 0, []
+    for (_, _, till, itemids), result in zip(batches, results):
+        if isinstance(result, BaseException):
+            errors.append(result)
+            # a bad reply (KeyError/ValueError from to_events) is logged with its traceback
+            unexpected = not isinstance(result, (httpx.HTTPError, ZabbixError))
+            logging.error(f"Batch of {len(itemids)} items failed, will retry next poll: {result!r}",
+                          exc_info=result if unexpected else None)
+            continue
+        rows += result
+        for itemid in itemids:
+            cursors[itemid] = till
+    # forget items that no longer exist so the checkpoint doesn't grow forever
+    for itemid in set(cursors) - set(items):
+        del cursors[itemid]
+    save_checkpoint(CHECKPOINT_FILE, cursors)
+    transport = [e for e in errors if isinstance(e, (httpx.HTTPError, ZabbixError))]
+    if batches and len(transport) == len(batches):
+        raise transport[0]  # nothing got through: let run() reconnect
+    behind = any(till < till_cap for _, _, till, _ in batches)
+    logging.info(f"Poll: {rows} values from {len(batches) - len(errors)}/{len(batches)} batches "
+                 f"in {time.monotonic() - t0:.1f}s" + (" (catching up)" if behind else ""))
+    return behind and not errors
+
+
+async def run(once: bool) -> None:
+    limits = httpx.Limits(max_connections=CONCURRENCY * 2, max_keepalive_connections=CONCURRENCY * 2)
+    async with httpx.AsyncClient(timeout=TIMEOUT, limits=limits) as client:
+        api = ZabbixAPI(client, ZABBIX_URL)
+        sem = asyncio.Semaphore(CONCURRENCY)
+        cursors = load_checkpoint(CHECKPOINT_FILE)
+        items: Dict[str, Tuple[str, str, int]] = {}
+        items_at = 0.0
+        while True:
+            try:
+                if api.auth is None:
+                    await with_retries("login", api.login)
+                if time.monotonic() - items_at > ITEM_REFRESH or not items:
+                    items = await fetch_items(api, sem)
+                    items_at = time.monotonic()
+                catching_up = await poll(api, client, sem, items, cursors)
+            except (httpx.HTTPError, ZabbixError) as e:
+                logging.error(f"Poll failed: {e}")
+                api.auth = None  # the session may have expired; log in again
+                catching_up = False
+            except Exception:
+                # e.g. a malformed item.get reply; never let one bad poll stop the collector
+                logging.exception("Poll failed unexpectedly; retrying after the poll interval")
+                catching_up = False
+            if once:
+                return
+            if not catching_up:
+                logging.info(f"Sleeping for {POLL_INTERVAL} seconds.")
+                await asyncio.sleep(POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Zabbix -> datalake collector")
+    ap.add_argument("--once", action="store_true", help="run a single poll and exit")
+    asyncio.run(run(ap.parse_args().once))
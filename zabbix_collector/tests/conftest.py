@@ -0,0 +1,7 @@
+import os
+import sys
+
+HERE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(HERE, "..", "app"))
+# bench/stubs.py doubles as the fake Zabbix API
+sys.path.insert(0, os.path.join(HERE, "..", "..", "bench"))
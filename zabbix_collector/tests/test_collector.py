@@ -0,0 +1,163 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import collector as c
+
+NOW = 1_700_000_000
+
+
+def items(n, value_type=0):
+    return {str(i): (f"host-{i}", "system.cpu.util", value_type) for i in range(n)}
+
+
+# --- plan -----------------------------------------------------------------------
+
+def test_plan_groups_by_value_type_and_cursor(monkeypatch):
+    monkeypatch.setattr(c, "ZABBIX_MODE", "history")
+    its = {**items(2), "t1": ("h", "net.if.in", 3), "new": ("h", "cpu", 0)}
+    cursors = {"0": NOW - 600, "1": NOW - 600, "t1": NOW - 600}
+    batches, till_cap = c.plan(its, cursors, NOW)
+    assert till_cap == NOW - c.LAG
+    by_key = {(vt, start): sorted(ids) for vt, start, _, ids in batches}
+    assert by_key == {
+        (0, NOW - 599): ["0", "1"],
+        (3, NOW - 599): ["t1"],
+        (0, NOW - c.BACKFILL + 1): ["new"],
+    }
+
+
+def test_plan_caps_each_window(monkeypatch):
+    monkeypatch.setattr(c, "ZABBIX_MODE", "history")
+    monkeypatch.setattr(c, "MAX_WINDOW", 300)
+    (batch,), till_cap = c.plan(items(1), {"0": NOW - 86400}, NOW)
+    _, start, till, _ = batch
+    assert till - start + 1 == 300 and till < till_cap
+
+
+def test_plan_splits_large_groups(monkeypatch):
+    monkeypatch.setattr(c, "ZABBIX_MODE", "history")
+    monkeypatch.setattr(c, "ITEM_BATCH", 4)
+    batches, _ = c.plan(items(10), {}, NOW)
+    assert [len(b[3]) for b in batches] == [4, 4, 2]
+    assert sorted(i for b in batches for i in b[3]) == sorted(items(10))
+
+
+def test_plan_skips_items_already_at_the_cap(monkeypatch):
+    monkeypatch.setattr(c, "ZABBIX_MODE", "history")
+    batches, till_cap = c.plan(items(1), {"0": NOW - c.LAG}, NOW)
+    assert batches == []
+
+
+def test_plan_trends_stops_at_the_last_complete_hour(monkeypatch):
+    monkeypatch.setattr(c, "ZABBIX_MODE", "trends")
+    _, till_cap = c.plan(items(1), {}, NOW)
+    assert (till_cap + 1) % c.TREND_PERIOD == 0
+    assert till_cap < NOW - c.LAG
+
+
+# --- checkpoint -----------------------------------------------------------------
+
+def test_checkpoint_roundtrip(tmp_path):
+    path = str(tmp_path / "state" / "checkpoint.json")
+    c.save_checkpoint(path, {"1": 100, "2": 200})
+    assert c.load_checkpoint(path) == {"1": 100, "2": 200}
+
+
+def test_checkpoint_for_another_mode_is_ignored(tmp_path, monkeypatch):
+    path = str(tmp_path / "checkpoint.json")
+    monkeypatch.setattr(c, "ZABBIX_MODE", "history")
+    c.save_checkpoint(path, {"1": 100})
+    monkeypatch.setattr(c, "ZABBIX_MODE", "trends")
+    assert c.load_checkpoint(path) == {}
+
+
+def test_missing_or_unreadable_checkpoint_starts_over(tmp_path):
+    assert c.load_checkpoint(str(tmp_path / "none.json")) == {}
+    bad = tmp_path / "bad.json"
+    bad.write_text("{not json")
+    assert c.load_checkpoint(str(bad)) == {}
+
+
+# --- poll (bench/stubs.py as Zabbix) --------------------------------------------
+
+@pytest.fixture
+def zabbix(tmp_path, monkeypatch):
+    import stubs
+
+    monkeypatch.setattr(stubs, "ZABBIX_HOSTS", 3)
+    monkeypatch.setenv("STUB_LATENCY_MS", "0")
+    monkeypatch.setattr(c, "ZABBIX_MODE", "history")
+    monkeypatch.setattr(c, "ZABBIX_TOKEN", "")
+    monkeypatch.setattr(c, "CHECKPOINT_FILE", str(tmp_path / "checkpoint.json"))
+    monkeypatch.setattr(c, "BACKFILL", 600)
+    monkeypatch.setattr(c.random, "uniform", lambda a, b: 0.0)  # no retry backoff
+    posted = []
+
+    def sink(request):
+        posted.extend(json.loads(request.content)["events"])
+        return httpx.Response(200, json={"inserted": 0})
+
+    zbx = httpx.AsyncClient(transport=httpx.ASGITransport(app=stubs.zabbix_app))
+    api = c.ZabbixAPI(zbx, "http://zabbix-stub/api_jsonrpc.php")
+    return api, httpx.AsyncClient(transport=httpx.MockTransport(sink)), posted
+
+
+def test_poll_posts_values_and_checkpoints_cursors(zabbix):
+    api, client, posted = zabbix
+
+    async def run():
+        await api.login()
+        sem = asyncio.Semaphore(4)
+        its = await c.fetch_items(api, sem)
+        cursors = {}
+        await c.poll(api, client, sem, its, cursors)
+        return its, cursors
+
+    its, cursors = asyncio.run(run())
+    assert len(its) == 15
+    assert posted and {e["host"] for e in posted} == {"zbx-host-0000", "zbx-host-0001", "zbx-host-0002"}
+    assert set(cursors) == set(its)
+    assert c.load_checkpoint(c.CHECKPOINT_FILE) == cursors
+
+
+def test_bad_batch_is_logged_and_its_cursors_stay(zabbix, monkeypatch):
+    api, client, _ = zabbix
+    real = c.to_events
+
+    def to_events(rows, its):
+        if rows and its[rows[0]["itemid"]][2] == 3:
+            raise KeyError("value")
+        return real(rows, its)
+
+    monkeypatch.setattr(c, "to_events", to_events)
+
+    async def run():
+        await api.login()
+        sem = asyncio.Semaphore(4)
+        its = await c.fetch_items(api, sem)
+        cursors = {}
+        behind = await c.poll(api, client, sem, its, cursors)
+        return its, cursors, behind
+
+    its, cursors, behind = asyncio.run(run())
+    unsigned = {i for i, (_, _, vt) in its.items() if vt == 3}
+    assert unsigned and not unsigned & set(cursors)
+    assert set(its) - unsigned <= set(cursors)
+    assert behind is False
+
+
+def test_poll_raises_when_every_batch_hits_a_transport_error(zabbix):
+    api, _, _ = zabbix
+    down = httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(503)))
+
+    async def run():
+        await api.login()
+        sem = asyncio.Semaphore(4)
+        its = await c.fetch_items(api, sem)
+        await c.poll(api, down, sem, its, {})
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())